@@ -0,0 +1,191 @@
+"""
+常用操作的效能測試（可和之前存下的基準結果比較）
+
+用法（在專案根目錄執行）：
+    python benchmarks/bench_hot_paths.py --out 結果.json
+    python benchmarks/bench_hot_paths.py --rooms 40 --months 24 --out 新.json --baseline 基準.json
+    python benchmarks/bench_hot_paths.py --only is_conflict lock_room
+
+初學者註解：
+- 先用 make_dataset.py 在暫存資料夾產生一份指定大小的 meeting_schedule.xlsx，
+  再把每個操作各跑 --repeat 次，記錄最快 / 中位數 / 平均（毫秒）。
+- 「cold」開頭的項目每次都先丟掉快取，量的是重新讀檔的時間；其他查詢量的是平常
+  （快取已載入）的情況。
+- 原本的 add_booking 現在是 booking_core.commit_booking；暫時鎖定改存在 SQLite 租約檔；
+  本週總覽的「資料階段」是 booking_core.collect_weekly_bookings（畫表格的部分需要視窗，不列入）。
+- 寫入類（commit_booking、lock_room）每次用不同的日期 / token，不會互相衝突；
+  release_token_locks 依序釋放 lock_room 建立的 token。
+- 給了 --baseline 時，中位數比基準慢超過 --threshold 倍的項目會列出來，並以結束碼 1 結束，
+  可以放在 CI 或改版前後手動比較。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import booking_core  # noqa: E402
+from excel_manager import checkpoint, get_workbook, init_excel_file, invalidate_workbook  # noqa: E402
+from make_dataset import add_arguments, dataset_kwargs, make_dataset, room_ids  # noqa: E402
+
+WEEKDAY_NAMES = ["週一", "週二", "週三", "週四", "週五", "週六", "週日"]
+
+
+def next_weekday(start, offset_days):
+    """start 之後第 offset_days 天起算的第一個平日"""
+    day = start + timedelta(days=offset_days)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+
+def far_weekend(start, i):
+    """資料範圍之後的第 i 個週末日（週六、週日交替）：沒有一般預約，也沒有固定預約"""
+    day = start + timedelta(days=400)
+    saturday = day + timedelta(days=(5 - day.weekday()) % 7)
+    return (saturday + timedelta(days=7 * (i // 2) + i % 2)).strftime("%Y/%m/%d")
+
+
+def week_dates(day):
+    monday = day - timedelta(days=day.weekday())
+    return [(monday + timedelta(days=i)).strftime("%Y/%m/%d") for i in range(5)]
+
+
+def build_cases(filename, args):
+    """回傳 [(名稱, 每次要執行的函式)]；函式會收到第幾次（從 0 起算）"""
+    today = date.today()
+    query_day = next_weekday(today, 7)
+    query_date = query_day.strftime("%Y/%m/%d")
+    weekday = WEEKDAY_NAMES[query_day.weekday()]
+    slot_ids = [1, 2] if args.slots >= 2 else [1]
+    rids = room_ids(args.rooms)
+    room_id = rids[0]
+    dates = week_dates(query_day)
+
+    def cold_get_workbook(i):
+        invalidate_workbook(filename)
+        get_workbook(filename)
+
+    def commit(i):
+        # 每次換一個遠在資料範圍之後的週末日，保證不衝突（量的是真的寫入）
+        booking_core.commit_booking(far_weekend(today, i + 1), slot_ids, rids[i % len(rids)],
+                                    "bench", "效能測試", f"bench-commit-{i}", filename=filename)
+
+    def lock(i):
+        booking_core.lock_room(f"bench-lock-{i}", far_weekend(today, i + 1), slot_ids, rids[i % len(rids)],
+                               filename=filename)
+
+    return [
+        ("cold_get_workbook", cold_get_workbook),
+        ("load_time_slots", lambda i: booking_core.load_time_slots(filename)),
+        ("get_available_rooms",
+         lambda i: booking_core.get_available_rooms(query_date, slot_ids, filename=filename)),
+        ("get_day_availability",
+         lambda i: booking_core.get_day_availability(query_date, filename=filename)),
+        ("is_conflict", lambda i: booking_core.is_conflict(query_date, slot_ids, room_id, filename=filename)),
+        ("find_schedule_conflicts",
+         lambda i: booking_core.find_schedule_conflicts(weekday, slot_ids, room_id, filename=filename)),
+        ("find_schedule_conflicts_by_weekday",
+         lambda i: booking_core.find_schedule_conflicts_by_weekday(weekday, slot_ids, room_id, filename=filename)),
+        ("find_fixed_conflicts",
+         lambda i: booking_core.find_fixed_conflicts(weekday, slot_ids, room_id, filename=filename)),
+        ("collect_weekly_bookings", lambda i: booking_core.collect_weekly_bookings(dates, filename=filename)),
+        ("commit_booking", commit),
+        ("lock_room", lock),
+        ("release_token_locks", lambda i: booking_core.release_token_locks(f"bench-lock-{i}", filename)),
+        ("cleanup_expired_locks", lambda i: booking_core.cleanup_expired_locks(filename)),
+        ("checkpoint", lambda i: checkpoint(filename)),
+    ]
+
+
+def run_case(fn, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "min_ms": round(min(times), 3),
+        "median_ms": round(statistics.median(times), 3),
+        "mean_ms": round(statistics.fmean(times), 3),
+        "runs": repeat,
+    }
+
+
+def compare(results, baseline, threshold):
+    """回傳變慢超過 threshold 倍的項目 [(名稱, 基準, 現在, 倍數)]"""
+    regressions = []
+    for name, now in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before or before["median_ms"] <= 0:
+            continue
+        ratio = now["median_ms"] / before["median_ms"]
+        if ratio > threshold:
+            regressions.append((name, before["median_ms"], now["median_ms"], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=20, help="每個項目跑幾次")
+    parser.add_argument("--only", nargs="+", default=None, help="只跑這些項目")
+    parser.add_argument("--out", default=None, help="把結果寫成 JSON")
+    parser.add_argument("--baseline", default=None, help="要比較的基準結果 JSON")
+    parser.add_argument("--threshold", type=float, default=1.25, help="比基準慢幾倍算退步")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "meeting_schedule.xlsx")
+        counts = make_dataset(filename, **dataset_kwargs(args))
+        init_excel_file(filename)
+        print("資料量：" + "，".join(f"{k} {v}" for k, v in counts.items()))
+
+        results = {}
+        for name, fn in build_cases(filename, args):
+            if args.only and name not in args.only:
+                continue
+            if not name.startswith("cold"):
+                fn(-1)  # 先跑一次，把快取 / 索引建好
+            results[name] = run_case(fn, args.repeat)
+            r = results[name]
+            print(f"{name:<36} min {r['min_ms']:>9.2f} ms  median {r['median_ms']:>9.2f} ms"
+                  f"  mean {r['mean_ms']:>9.2f} ms")
+
+    report = {
+        "meta": {
+            "dataset": dataset_kwargs(args),
+            "counts": counts,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ 結果已寫入 {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("dataset") != report["meta"]["dataset"]:
+            print("⚠️ 基準結果的資料量設定不同，比較結果僅供參考")
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, now, ratio in regressions:
+            print(f"❌ {name} 變慢：{before:.2f} ms → {now:.2f} ms（{ratio:.2f} 倍）")
+        if regressions:
+            sys.exit(1)
+        print(f"✅ 沒有項目比基準慢超過 {args.threshold} 倍")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+讀取引擎效能比較：load_workbook（編輯模式） vs openpyxl read_only vs fast_xlsx
+
+用法（在專案根目錄執行）：
+    python benchmarks/bench_xlsx_reader.py                  # 10k、100k、1M 列
+    python benchmarks/bench_xlsx_reader.py --rows 10000 100000
+
+初學者註解：
+- 測試檔用 openpyxl 的 write_only 模式產生，欄位與 Schedule 工作表相同。
+- 1M 列時 load_workbook 需要數 GB 記憶體、跑好幾分鐘，可以用 --skip-full-above 跳過。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook, load_workbook  # noqa: E402
+
+import sheet_reader  # noqa: E402
+from excel_manager import REQUIRED_SHEETS  # noqa: E402
+
+
+def make_schedule_file(path, rows):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Schedule")
+    ws.append(REQUIRED_SHEETS["Schedule"])
+    for i in range(1, rows + 1):
+        day = 1 + i % 28
+        ws.append([i, f"2025/08/{day:02d}", f"{i % 8 + 1},{i % 8 + 2}", f"Z{i % 5 + 1}",
+                   f"user{i % 300}", "週會", i % 10 == 0])
+    wb.save(path)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--skip-full-above", type=int, default=None,
+                        help="列數超過這個值就不跑 load_workbook（編輯模式）")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'load_workbook':>14} {'read_only':>10} {'fast':>8} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, f"schedule_{rows}.xlsx")
+            make_schedule_file(path, rows)
+
+            if args.skip_full_above is not None and rows > args.skip_full_above:
+                full = None
+            else:
+                full = timed(lambda: load_workbook(path))
+            read_only = timed(lambda: sheet_reader.load_rowbook(path, engine="openpyxl"))
+            fast = timed(lambda: sheet_reader.load_rowbook(path, engine="fast"))
+
+            baseline = full if full is not None else read_only
+            full_text = f"{full:.2f}s" if full is not None else "skipped"
+            print(f"{rows:>10} {full_text:>14} {read_only:>9.2f}s {fast:>7.2f}s {baseline / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
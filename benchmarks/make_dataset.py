@@ -0,0 +1,159 @@
+"""
+產生測試用的 meeting_schedule.xlsx（大小可調）
+
+用法（在專案根目錄執行）：
+    python benchmarks/make_dataset.py 測試.xlsx
+    python benchmarks/make_dataset.py 測試.xlsx --rooms 40 --slots 12 --months 24 --fixed-density 0.2 --leases 200
+
+初學者註解：
+- 會議室、時段、一般預約（過去 N 個月到未來 1 個月的平日）、固定預約都寫進 Excel；
+  暫時鎖定現在存在 SQLite 租約檔（lease_store），所以「進行中的暫時鎖定」寫在那裡，
+  另外也放一些已過期的租約，讓清除過期鎖定有事可做。
+- 用 openpyxl 的 write_only 模式產生，幾十萬列也只要幾秒。
+- 同一個 --seed 產生的內容完全相同，方便前後比較。
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook  # noqa: E402
+
+import journal  # noqa: E402
+import lease_store  # noqa: E402
+from excel_manager import REQUIRED_SHEETS, backup_paths  # noqa: E402
+from workbook_lock import lock_path  # noqa: E402
+
+WEEKDAYS = ["週一", "週二", "週三", "週四", "週五"]
+
+
+def room_ids(rooms):
+    return [f"R{i:03d}" for i in range(1, rooms + 1)]
+
+
+def _remove_sidecars(path):
+    """刪掉同名的日誌、鎖檔、租約檔與備份，避免舊資料混進來"""
+    candidates = [journal.journal_path(path), lock_path(path), lease_store.store_path(path)]
+    for candidate in candidates + backup_paths(path):
+        if os.path.exists(candidate):
+            os.remove(candidate)
+
+
+def make_dataset(path, rooms=20, slots=10, months=12, occupancy=0.3, fixed_density=0.1,
+                 leases=50, expired_leases=None, seed=1):
+    """
+    產生資料集，回傳各工作表的列數 {"Schedule": n, ...}。
+    - occupancy：一般預約佔用的比例（每間房每個時段開始一筆預約的機率）
+    - fixed_density：平日 (星期, 時段, 會議室) 中有固定預約的比例
+    - leases / expired_leases：進行中 / 已過期的暫時鎖定數量
+    """
+    rng = random.Random(seed)
+    _remove_sidecars(path)
+    rids = room_ids(rooms)
+    today = date.today()
+
+    wb = Workbook(write_only=True)
+    sheets = {name: wb.create_sheet(name) for name in REQUIRED_SHEETS}
+    for name, headers in REQUIRED_SHEETS.items():
+        sheets[name].append(headers)
+    counts = {name: 0 for name in REQUIRED_SHEETS if name != "TempLock"}
+
+    for i, rid in enumerate(rids):
+        sheets["MeetingRooms"].append([rid, f"會議室{i + 1}", f"acct{i}", "pw", f"https://example.invalid/{rid}",
+                                       "會議", "FALSE", "TRUE" if i % 5 else "FALSE"])
+        counts["MeetingRooms"] += 1
+    for sid in range(1, slots + 1):
+        start = 8 + sid
+        sheets["TimeSlots"].append([sid, f"{start:02d}:00–{start + 1:02d}:00", "FALSE", ""])
+        counts["TimeSlots"] += 1
+
+    # 一般預約：過去 months 個月到未來 30 天的平日
+    booking_id = 0
+    day = today - timedelta(days=months * 30)
+    while day <= today + timedelta(days=30):
+        if day.weekday() < 5:
+            date_str = day.strftime("%Y/%m/%d")
+            for rid in rids:
+                sid = 1
+                while sid <= slots:
+                    if rng.random() < occupancy:
+                        length = min(rng.choice((1, 1, 2, 3)), slots - sid + 1)
+                        booking_id += 1
+                        slot_str = ",".join(str(s) for s in range(sid, sid + length))
+                        sheets["Schedule"].append([booking_id, date_str, slot_str, rid, f"user{rng.randrange(500)}",
+                                                   "週會", rng.random() < 0.1])
+                        sid += length
+                    else:
+                        sid += 1
+        day += timedelta(days=1)
+    counts["Schedule"] = booking_id
+
+    # 固定預約
+    fixed_id = 0
+    for wday in WEEKDAYS:
+        for sid in range(1, slots + 1):
+            for rid in rids:
+                if rng.random() < fixed_density:
+                    fixed_id += 1
+                    sheets["FixedBooking"].append([fixed_id, wday, sid, rid, f"user{rng.randrange(500)}",
+                                                   "MIS 例會" if rng.random() < 0.2 else "部門例會",
+                                                   rng.random() < 0.05])
+    counts["FixedBooking"] = fixed_id
+    wb.save(path)
+
+    # 暫時鎖定：進行中的 + 已過期的（一天前鎖的）；直接寫進租約檔，不經過衝突檢查
+    if expired_leases is None:
+        expired_leases = leases
+    lease_store.get_store(path)  # 建立資料表
+    now = time.time()
+    rows = []
+    for i in range(leases + expired_leases):
+        lease_date = (today + timedelta(days=rng.randrange(1, 30))).strftime("%Y/%m/%d")
+        locked_at = now - 86400 if i < expired_leases else now
+        rows.append((f"token{i}", lease_date, rng.randint(1, slots), rng.choice(rids), lease_store.LOCK_STATUS,
+                     locked_at))
+    conn = sqlite3.connect(lease_store.store_path(path))
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO leases VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.close()
+    counts["leases"] = leases
+    counts["expired_leases"] = expired_leases
+    return counts
+
+
+def add_arguments(parser):
+    """make_dataset 的參數（bench_hot_paths.py 也共用）"""
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--slots", type=int, default=10)
+    parser.add_argument("--months", type=int, default=12, help="一般預約往前幾個月")
+    parser.add_argument("--occupancy", type=float, default=0.3, help="一般預約佔用比例")
+    parser.add_argument("--fixed-density", type=float, default=0.1, help="固定預約比例")
+    parser.add_argument("--leases", type=int, default=50, help="進行中的暫時鎖定數量")
+    parser.add_argument("--expired-leases", type=int, default=None, help="已過期的暫時鎖定數量（預設同 --leases）")
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def dataset_kwargs(args):
+    return {
+        "rooms": args.rooms, "slots": args.slots, "months": args.months, "occupancy": args.occupancy,
+        "fixed_density": args.fixed_density, "leases": args.leases,
+        "expired_leases": args.expired_leases, "seed": args.seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    add_arguments(parser)
+    args = parser.parse_args()
+    counts = make_dataset(args.path, **dataset_kwargs(args))
+    print(f"✅ 已產生 {args.path}：" + "，".join(f"{k} {v}" for k, v in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
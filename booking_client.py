@@ -0,0 +1,139 @@
+"""
+預約伺服器的用戶端（給 kiosk 畫面用）
+
+初學者註解：
+- 方法名稱、參數、回傳值都和 booking_core 相同，畫面只要把 booking_core 換成
+  BookingClient("http://127.0.0.1:8765") 就改成向伺服器查詢 / 寫入（見 booking_server.py）。
+- filename 參數會被忽略：檔案由伺服器負責。
+- 伺服器沒開、回應錯誤時丟出 BookingServerError，由畫面顯示錯誤訊息。
+- JSON 沒有 tuple（也沒有 namedtuple），也不能用數字當 key，所以這裡把結果轉回 booking_core 的格式。
+"""
+import json
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+import tracing
+from excel_manager import FILENAME
+from storage import Room, Booking, FixedBooking
+
+REQUEST_TIMEOUT = 35  # 比伺服器等寫入的 WRITE_TIMEOUT 稍長
+
+
+class BookingServerError(Exception):
+    """連不上預約伺服器，或伺服器回報錯誤"""
+
+
+def _slot_str(slot_ids):
+    return ",".join(str(int(sid)) for sid in slot_ids)
+
+
+class BookingClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    # ----- HTTP -----
+
+    def _request(self, path, params=None, body=None):
+        url = self.base_url + path
+        if params:
+            url += "?" + urlencode(params)
+        data = None
+        headers = {}
+        if body is not None:
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            headers["Content-Type"] = "application/json; charset=utf-8"
+        try:
+            with tracing.span("http " + path, cat="rpc"):
+                with urlopen(Request(url, data=data, headers=headers), timeout=REQUEST_TIMEOUT) as resp:
+                    return json.loads(resp.read().decode("utf-8"))
+        except HTTPError as e:
+            try:
+                message = json.loads(e.read().decode("utf-8")).get("error", "")
+            except ValueError:
+                message = ""
+            raise BookingServerError(f"預約伺服器錯誤（{e.code}）：{message}")
+        except (URLError, OSError) as e:
+            raise BookingServerError(f"無法連線到預約伺服器 {self.base_url}：{e}")
+
+    def _get(self, path, **params):
+        return self._request(path, params=params)
+
+    def _post(self, path, **body):
+        return self._request(path, body=body)
+
+    # ----- 讀取 -----
+
+    def health(self):
+        return self._get("/health").get("ok", False)
+
+    def load_time_slots(self, filename=FILENAME):
+        return {int(sid): text for sid, text in self._get("/timeslots")["slots"].items()}
+
+    def load_slot_labels(self, filename=FILENAME):
+        return {int(sid): text for sid, text in self._get("/timeslot-labels")["slots"].items()}
+
+    def load_rooms(self, filename=FILENAME):
+        return [Room._make(row) for row in self._get("/rooms")["rooms"]]
+
+    def load_user_bookings(self, user_id, filename=FILENAME):
+        return [Booking._make(row) for row in self._get("/bookings", user=user_id)["bookings"]]
+
+    def load_user_fixed_bookings(self, user_id, filename=FILENAME):
+        return [FixedBooking._make(row) for row in self._get("/fixed-bookings", user=user_id)["bookings"]]
+
+    def collect_fixed_overview(self, filename=FILENAME):
+        cells = self._get("/fixed-overview")["cells"]
+        return {(wday, sid): [tuple(entry) for entry in entries] for wday, sid, entries in cells}
+
+    def get_day_availability(self, date, slot_ids, filename=FILENAME):
+        day = self._get("/availability", date=date, slots=_slot_str(slot_ids))["slots"]
+        return {int(sid): [tuple(room) for room in rooms] for sid, rooms in day.items()}
+
+    def load_day_availability(self, date, slot_ids, filename=FILENAME):
+        # 清過期鎖定是寫入：先送 POST 排進伺服器的寫入佇列，再查空房
+        self.cleanup_expired_locks()
+        return self.get_day_availability(date, slot_ids)
+
+    def is_conflict(self, date, slot_ids, room_id, filename=FILENAME):
+        return self._get("/conflict", date=date, slots=_slot_str(slot_ids), room=json.dumps(room_id))["conflict"]
+
+    def has_templock_conflict_for_fixed(self, weekday_str, slot_ids, room_id, filename=FILENAME):
+        result = self._get("/templock-fixed", weekday=weekday_str, slots=_slot_str(slot_ids),
+                           room=json.dumps(room_id))
+        return result["hit"], result["message"]
+
+    def collect_weekly_bookings(self, dates, filename=FILENAME):
+        result = self._get("/overview", dates=",".join(dates))
+        bookings = {(d, sid): rooms for d, sid, rooms in result["bookings"]}
+        details = {(d, sid): texts for d, sid, texts in result["details"]}
+        return result["room_ids"], bookings, details, result["has_records"]
+
+    # ----- 寫入 -----
+
+    def commit_booking(self, date, slot_ids, room_id, user_id, purpose, token, filename=FILENAME):
+        return self._post("/book", date=date, slot_ids=list(slot_ids), room_id=room_id,
+                          user_id=user_id, purpose=purpose, token=token)["result"]
+
+    def cancel_bookings(self, booking_ids, filename=FILENAME):
+        return self._post("/cancel", booking_ids=list(booking_ids))["result"]
+
+    def commit_fixed_booking(self, weekday, slot_ids, room_id, user_id, purpose, filename=FILENAME):
+        result = self._post("/fixed", weekday=weekday, slot_ids=list(slot_ids), room_id=room_id,
+                            user_id=user_id, purpose=purpose)
+        return result["result"], result["conflicts"]
+
+    def cancel_fixed_bookings(self, booking_ids, filename=FILENAME):
+        return self._post("/fixed/cancel", booking_ids=list(booking_ids))["result"]
+
+    def lock_room(self, token, date, slot_ids, room_id, filename=FILENAME):
+        return self._post("/lease", token=token, date=date, slot_ids=list(slot_ids), room_id=room_id)["result"]
+
+    def renew_lease(self, token, filename=FILENAME):
+        return self._post("/lease/renew", token=token)["result"]
+
+    def release_token_locks(self, token, filename=FILENAME):
+        return self._post("/lease/release", token=token)["result"]
+
+    def cleanup_expired_locks(self, filename=FILENAME):
+        self._post("/lease/cleanup")
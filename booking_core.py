@@ -0,0 +1,612 @@
+"""
+預約的核心邏輯（不含任何畫面）
+
+初學者註解：
+- 以前查空房、檢查衝突、寫入預約、暫時鎖定都寫在 zoom_excel.py，和 Tk 畫面混在一起：
+  一 import 就會初始化 Excel、檢查檔案鎖，錯誤時還會直接跳出 messagebox。
+- 這裡只放「純邏輯」：所有資料都由參數傳進來（日期、時段、會議室、檔名…），
+  結果用回傳值告訴呼叫端，不讀 app_state、不跳視窗。
+- 所以批次工作、效能測試、伺服器都可以直接呼叫，不需要螢幕。
+- 資料一律透過 storage 的 Repository 讀寫（get_repository），欄位用名稱取（b.date、r.room_id），
+  不再管背後是 Excel 還是 SQLite；filename 省略時用 BOOKING_STORE 設定的資料檔。
+- 寫入類函式的回傳值慣例（與 commit_if_unchanged 相同）：
+    True：成功
+    None：檢查不通過（例如時段已被預約、找不到資料），沒有寫入
+    False：寫入失敗（檔案被鎖、沒有權限…）
+- import 時不會做任何事；要用之前請自行呼叫 prepare()（Excel 會建立缺少的工作表）。
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+import occupancy
+import lease_store
+import tracing
+from storage import DEFAULT_STORE, get_repository, is_true
+
+# ✅ 鎖定狀態與時間（秒）；時間統一由 lease_store 設定，畫面會定時續約（見 renew_lease）
+LOCK_STATUS = "LOCKING"
+LOCK_EXPIRY_SECONDS = lease_store.LEASE_TTL
+HEARTBEAT_SECONDS = lease_store.HEARTBEAT_SECONDS
+
+
+# 啟動 / 結束：交給設定的後端（Excel 建立工作表、併回日誌；SQLite 不需要做什麼）
+def prepare(filename=DEFAULT_STORE):
+    get_repository(filename).prepare()
+
+def checkpoint(filename=DEFAULT_STORE):
+    return get_repository(filename).checkpoint()
+
+
+# 載入可用時段
+def load_time_slots(filename=DEFAULT_STORE):
+    time_slots = {}
+    for slot in get_repository(filename).time_slots():
+        if not is_true(slot.disabled):
+            time_slots[int(slot.slot_id)] = slot.time_range
+    return time_slots
+
+def _slot_time_map(repo):
+    """slot_id → 時間區間（含停用的時段，舊資料才查得到文字）"""
+    return {int(s.slot_id): s.time_range for s in repo.time_slots() if s.slot_id and s.time_range}
+
+# 顯示紀錄用的時段文字（含停用的時段）
+def load_slot_labels(filename=DEFAULT_STORE):
+    return _slot_time_map(get_repository(filename))
+
+# 啟用中的會議室（storage.Room，欄位同 MeetingRooms 工作表）
+def load_rooms(filename=DEFAULT_STORE):
+    return [r for r in get_repository(filename).rooms() if not is_true(r.disabled)]
+
+# 某人尚未取消的一般預約（storage.Booking）；日期篩選與排序交給畫面
+def load_user_bookings(user_id, filename=DEFAULT_STORE):
+    return [b for b in get_repository(filename).bookings(user_id=user_id) if not b.canceled]
+
+# 某人尚未取消的固定預約（storage.FixedBooking）
+def load_user_fixed_bookings(user_id, filename=DEFAULT_STORE):
+    return [f for f in get_repository(filename).fixed_bookings(user_id=user_id) if f.canceled is not True]
+
+def get_temp_locked_rooms_by_slot(date, slot_ids, filename=DEFAULT_STORE):
+    """回傳 {slot_id: {room_id, ...}}：指定日期各時段中，仍在鎖定期限內的會議室"""
+    locked_by_slot = {int(sid): set() for sid in slot_ids}
+    try:
+        leases = get_repository(filename).leases.list_active(LOCK_EXPIRY_SECONDS, date=date)
+    except sqlite3.Error:
+        return locked_by_slot
+
+    for lease in leases:
+        if lease.slot_id in locked_by_slot:
+            locked_by_slot[lease.slot_id].add(lease.room_id)
+
+    return locked_by_slot
+
+def get_temp_locked_rooms(date, slot_ids, filename=DEFAULT_STORE):
+    locked_rooms = set()
+    for rooms in get_temp_locked_rooms_by_slot(date, slot_ids, filename).values():
+        locked_rooms |= rooms
+    return locked_rooms
+
+def _scan_day(date, slot_ids, filename=DEFAULT_STORE):
+    """
+    初學者註解：
+    - 只讀一次快照，把某天「每個時段」被佔用 / 被暫鎖的會議室一次整理出來。
+    - 回傳 (可外借會議室清單, {時段: 已佔用房間}, {時段: 暫鎖房間})
+    """
+    repo = get_repository(filename)
+    index = repo.occupancy()
+    wanted = {int(sid) for sid in slot_ids}
+
+    # ✅ 只根據「可外借狀態」為 TRUE 的房間
+    rooms = []
+    for room in repo.rooms():
+        if not is_true(room.external):
+            continue  # ✅ 若不可外借，直接跳過
+        rooms.append((room.room_id, room.name, room.usage))
+
+    # 正式預約 + 固定預約佔用的房間：每間房只查一次 mask，不再掃 Schedule
+    taken_by_slot = {sid: set() for sid in wanted}
+    for room_id, _, _ in rooms:
+        mask = index.taken_mask(date, room_id)
+        for sid in wanted:
+            if mask >> sid & 1:
+                taken_by_slot[sid].add(room_id)
+
+    # 取得正在鎖定中的房間
+    locked_by_slot = get_temp_locked_rooms_by_slot(date, wanted, filename)
+
+    return rooms, taken_by_slot, locked_by_slot
+
+@tracing.traced(cat="query")
+def get_day_availability(date, slot_ids=None, filename=DEFAULT_STORE):
+    """
+    一次掃描算出某天「時段 × 會議室」的可用狀態。
+    - slot_ids 省略時，使用 TimeSlots 中所有啟用的時段
+    回傳 {slot_id: [(room_id, name, usage, is_locked), ...]}，每個時段的格式與 get_available_rooms 相同
+    """
+    if slot_ids is None:
+        slot_ids = load_time_slots(filename).keys()
+    rooms, taken_by_slot, locked_by_slot = _scan_day(date, slot_ids, filename)
+
+    availability = {}
+    for sid in taken_by_slot:
+        availability[sid] = [
+            (room_id, name, usage, room_id in locked_by_slot[sid])
+            for room_id, name, usage in rooms
+            if room_id not in taken_by_slot[sid]
+        ]
+    return availability
+
+@tracing.traced(cat="query")
+def load_day_availability(date, slot_ids, filename=DEFAULT_STORE):
+    """給背景執行緒用：先清掉過期的暫時鎖定，再算整天的可用會議室"""
+    cleanup_expired_locks(filename)
+    return get_day_availability(date, slot_ids, filename)
+
+def rooms_free_for_slots(day_availability, slot_ids):
+    """
+    把 get_day_availability 的結果合併成「所有 slot_ids 都可用」的會議室清單。
+    任一時段被暫鎖就標記 is_locked；順序沿用 MeetingRooms 工作表。
+    """
+    slot_ids = [int(sid) for sid in slot_ids]
+    if not slot_ids:
+        return []
+
+    rooms = day_availability.get(slot_ids[0], [])
+    for sid in slot_ids[1:]:
+        locked_here = {r[0]: r[3] for r in day_availability.get(sid, [])}
+        rooms = [
+            (room_id, name, usage, is_locked or locked_here[room_id])
+            for room_id, name, usage, is_locked in rooms
+            if room_id in locked_here
+        ]
+    return rooms
+
+@tracing.traced(cat="query")
+def get_available_rooms(date, slot_ids, filename=DEFAULT_STORE):
+    return rooms_free_for_slots(get_day_availability(date, slot_ids, filename), slot_ids)
+
+
+# 檢查某會議室在指定日期與時段是否已被預約，與excel做出比對
+@tracing.traced(cat="query")
+def is_conflict(date, slot_ids, room_id, filename=DEFAULT_STORE):
+    # 一般預約 + 固定預約都已併進佔用索引，一次 AND 就知道有沒有撞到
+    return get_repository(filename).occupancy().is_taken(date, slot_ids, room_id)
+
+def is_fixed_booked_on_date(date: str, slot_ids: list, room_id: str, filename=DEFAULT_STORE) -> bool:
+    # 將日期轉為對應的星期幾，再查固定預約的 mask
+    weekday_str = occupancy.weekday_of(date)
+    return get_repository(filename).occupancy().is_fixed_booked(weekday_str, slot_ids, room_id)
+
+@tracing.traced(cat="query")
+def find_schedule_conflicts_by_weekday(weekday_str, slot_ids, room_id, filename=DEFAULT_STORE):
+    weekday_map = {"週一": 0, "週二": 1, "週三": 2, "週四": 3, "週五": 4}
+    target_weekday = weekday_map.get(weekday_str)
+    today = datetime.today().date()
+    conflicts = []
+
+    repo = get_repository(filename)
+    # 建立 slot_id → 時間區間 的對照表
+    slot_time_map = _slot_time_map(repo)
+
+    for b in repo.bookings():
+        try:
+            record_date = datetime.strptime(b.date, "%Y/%m/%d").date()
+        except (TypeError, ValueError):
+            continue  # 資料異常，跳過
+
+        if record_date < today or b.canceled or b.room_id != room_id:
+            continue
+
+        if record_date.weekday() != target_weekday:
+            continue
+
+        booked_slots = set(occupancy.parse_slot_str(b.slot_str))
+        for sid in slot_ids:
+            if sid in booked_slots:
+                slot_time = slot_time_map.get(sid, "時間未知")
+                conflicts.append({
+                    "date": b.date,
+                    "slot": sid,
+                    "slot_time": slot_time,
+                    "room": room_id,
+                    "user": b.user_id,
+                    "purpose": b.purpose,
+                    "source": "Schedule"
+                })
+
+    return conflicts
+
+# === 新增：固定預約送出前，比對 TempLock（將日期→週幾） ===
+_ZH_WEEKDAYS = ["週一", "週二", "週三", "週四", "週五", "週六", "週日"]  # 與 UI 字面一致
+
+def _to_zh_weekday(dt):
+    """
+    初學者註解：
+    - datetime.weekday()：週一=0、週日=6
+    - 轉成中文字，方便和固定預約選單直接比對
+    """
+    return _ZH_WEEKDAYS[dt.weekday()]
+
+def _parse_date_cell(cell):
+    """
+    初學者註解：
+    - TempLock 的日期欄可能是字串或日期，統一轉成 datetime（只取日期）
+    """
+    if cell is None:
+        return None
+    if isinstance(cell, datetime):
+        return datetime(cell.year, cell.month, cell.day)
+    # 可能是 date
+    try:
+        from datetime import date as _date
+        if isinstance(cell, _date):
+            return datetime(cell.year, cell.month, cell.day)
+    except Exception:
+        pass
+    if isinstance(cell, str):
+        for fmt in ("%Y/%m/%d", "%Y-%m-%d"):
+            try:
+                d = datetime.strptime(cell.strip(), fmt)
+                return datetime(d.year, d.month, d.day)
+            except ValueError:
+                continue
+    return None
+
+def _normalize_slot_ids(slot_ids):
+    """
+    初學者註解：
+    - 讓時段 ID 變成 set[int]，方便交集比對
+    """
+    if slot_ids is None:
+        return set()
+    if isinstance(slot_ids, (list, tuple, set)):
+        try:
+            return {int(x) for x in slot_ids}
+        except Exception:
+            return set()
+    try:
+        return {int(slot_ids)}
+    except Exception:
+        return set()
+
+@tracing.traced(cat="query")
+def has_templock_conflict_for_fixed(weekday_str, slot_ids, room_id, filename=DEFAULT_STORE):
+    """
+    功能（給固定預約送出前用）：
+    - 從租約儲存區讀取暫時鎖定（原 TempLock），把每筆鎖的「Date」轉為「週幾」，
+      與固定預約的〈room_id, slot_ids, weekday_str〉做比對。
+    - 只讀檢查，不寫入任何資料。
+    回傳：
+    - (True, message) 代表命中（有人正在一般預約）；(False, "") 代表無命中。
+    """
+    # 正規化參數
+    try:
+        target_room_id_int = int(room_id)
+    except Exception:
+        target_room_id_int = None  # 若無法轉 int，後面改用字串比對
+    target_room_id_str = str(room_id).strip()
+    target_slots = _normalize_slot_ids(slot_ids)
+    if not target_slots:
+        return False, ""
+
+    # 租約儲存區打不開直接視為無衝突；list_active 只會回傳 TTL 內的租約
+    try:
+        leases = get_repository(filename).leases.list_active(LOCK_EXPIRY_SECONDS)
+    except sqlite3.Error:
+        return False, ""
+
+    # 欄位順序與舊 TempLock 相同：(token, Date, SlotID, RoomID, Status, Timestamp)
+    for lease in leases:
+        token, lock_date_cell, slot_id_cell, lock_room_cell, status_cell, ts_cell = lease
+
+        # 狀態欄位（若有值）必須等於 LOCK_STATUS
+        if status_cell and str(status_cell).strip().upper() != str(LOCK_STATUS).strip().upper():
+            continue
+
+        # 會議室比對（容錯：同時嘗試 int 與字串）
+        try:
+            lock_room_int = int(lock_room_cell)
+        except Exception:
+            lock_room_int = None
+        lock_room_str = str(lock_room_cell).strip()
+
+        same_room = (
+            (target_room_id_int is not None and lock_room_int == target_room_id_int)
+            or (lock_room_str == target_room_id_str)
+        )
+        if not same_room:
+            continue
+
+        # 時段比對
+        try:
+            lock_slot_id = int(slot_id_cell)
+        except Exception:
+            continue
+        if lock_slot_id not in target_slots:
+            continue
+
+        # 日期→週幾
+        lock_dt = _parse_date_cell(lock_date_cell)
+        if lock_dt is None:
+            continue
+        lock_wd = _to_zh_weekday(lock_dt)
+
+        # 週幾命中 → 擋
+        if str(lock_wd) == str(weekday_str):
+            return True, f"此時段有人正在一般預約中（{lock_wd} / 房 {lock_room_str} / 時段 {lock_slot_id}）。"
+
+    return False, ""
+
+
+# 寫入預約
+@tracing.traced(cat="write")
+def commit_booking(date, slot_ids, room_id, user_id, purpose, token, filename=DEFAULT_STORE):
+    """
+    一次完成一般預約：衝突檢查 → 寫入預約 → 釋放自己的暫時鎖定。
+    - 衝突檢查與寫入由後端在同一個寫入鎖 / 交易內完成，中間不會被別人插隊。
+    - 先寫預約、再釋放租約：任何時刻別人看到的不是「有租約」就是「已預約」，不會有空窗。
+    回傳 True：預約成功；None：時段已被別人預約（衝突）；False：寫入失敗
+    """
+    try:
+        booking_id = get_repository(filename).add_booking(date, list(slot_ids), room_id, user_id, purpose)
+    except (OSError, sqlite3.Error):
+        return False
+    if booking_id is None:
+        return None
+
+    release_token_locks(token, filename)
+    return True
+
+# 回傳與 FixedBooking 衝突的清單（根據 星期、時段、會議室）
+@tracing.traced(cat="query")
+def find_fixed_conflicts(weekday_str, slot_ids, room_id, filename=DEFAULT_STORE):
+    repo = get_repository(filename)
+    # 建立 slot_id → 時間區間 的對照表
+    slot_time_map = _slot_time_map(repo)
+
+    conflicts = []
+
+    # 固定預約索引依 星期 → 時段 → 會議室 分好，已取消的不在裡面；每個時段只查一次字典
+    index = repo.occupancy()
+    for sid in slot_ids:
+        for bid, (uid, purpose) in index.fixed_entries(weekday_str, sid, room_id).items():
+            conflicts.append({
+                "source": "FixedBooking",
+                "booking_id": bid,
+                "weekday": weekday_str,
+                "slot": sid,
+                "slot_time": slot_time_map.get(sid, "時間未知"),
+                "room": room_id,
+                "user": uid,
+                "purpose": purpose
+            })
+
+    return conflicts
+
+# 回傳與 Schedule 衝突的清單（檢查未來 N 週）
+@tracing.traced(cat="query")
+def find_schedule_conflicts(weekday_str, slot_ids, room_id, weeks_ahead=4, filename=DEFAULT_STORE):
+    weekday_map = {"週一": 0, "週二": 1, "週三": 2, "週四": 3, "週五": 4}
+    if weekday_str not in weekday_map:
+        return []
+
+    target_weekday = weekday_map[weekday_str]
+    today = datetime.today()
+    days_until_next = (target_weekday - today.weekday() + 7) % 7
+    base_date = today + timedelta(days=days_until_next)
+
+    repo = get_repository(filename)
+    conflicts = []
+
+    for i in range(weeks_ahead):
+        target_date = (base_date + timedelta(days=i * 7)).strftime("%Y/%m/%d")
+        for b in repo.bookings(date=target_date):
+            if b.room_id == room_id and not b.canceled:
+                booked_slots = set(occupancy.parse_slot_str(b.slot_str))
+                if any(slot in booked_slots for slot in slot_ids):
+                    intersect_slots = booked_slots.intersection(slot_ids)
+                    for sid in intersect_slots:
+                        conflicts.append({
+                            "source": "Schedule",
+                            "booking_id": b.booking_id,
+                            "date": b.date,
+                            "slot": sid,
+                            "room": b.room_id,
+                            "user": b.user_id,
+                            "purpose": b.purpose
+                        })
+    return conflicts
+
+
+# 本週總覽（畫表格的部分在 utils，這裡只整理資料）
+@tracing.traced(cat="query")
+def collect_weekly_bookings(dates, filename=DEFAULT_STORE):
+    """
+    本週總覽的資料階段：只掃一次一般預約，固定預約直接查佔用索引，依 (日期, 時段) 分組。
+    - dates: 週一～週五的日期字串
+    回傳 (all_room_ids, bookings_by_day_slot, details_by_day_slot, valid_records_exist)
+    - bookings_by_day_slot: {(date, slot_id): [room_id, ...]}，用來決定燈號顏色
+    - details_by_day_slot: {(date, slot_id): [tooltip 文字, ...]}，一般預約在前、固定預約在後
+    """
+    repo = get_repository(filename)
+    rooms = repo.rooms()
+
+    all_room_ids = [
+        r.room_id for r in rooms
+        if not is_true(r.disabled)  # ✅ 未停用
+        and is_true(r.external)  # ✅ 可外借
+    ]
+    lendable = set(all_room_ids)
+
+    room_name_map = {r.room_id: r.name for r in rooms}
+
+    week_dates = set(dates)
+    bookings_by_day_slot = {}
+    details_by_day_slot = {}
+    valid_records_exist = False  # ✅ 是否有有效預約資料
+
+    # === 一般預約：一次掃描，同時整理燈號與 Tooltip ===
+    for b in repo.bookings():
+        if b.canceled or not b.slot_str:
+            continue
+        booked_sids = occupancy.parse_slot_str(b.slot_str)
+        if not booked_sids:
+            continue
+        valid_records_exist = True
+        if b.date not in week_dates:
+            continue
+        for sid in booked_sids:
+            bookings_by_day_slot.setdefault((b.date, sid), []).append(b.room_id)
+            if b.room_id in lendable:  # ✅ 不在可外借房間清單就不列入 Tooltip
+                room_name = room_name_map.get(b.room_id, "")
+                details_by_day_slot.setdefault((b.date, sid), []).append(
+                    f"[一般] 會議室：{b.room_id}（{room_name}）\n預約人：{b.user_id}\n用途：{b.purpose}"
+                )
+
+    # === 固定預約：從索引取出每個星期的固定預約（已依 時段 → 會議室 分好），放到本週對應的日期 ===
+    index = repo.occupancy()
+    for wday, date in zip(["週一", "週二", "週三", "週四", "週五"], dates):
+        for sid, week_rooms in index.fixed_week(wday).items():
+            for rid, entries in week_rooms.items():
+                if rid not in lendable:
+                    continue  # ✅ 不可外借會議室，略過
+                for fuser, fpurpose in entries.values():
+                    valid_records_exist = True
+                    bookings_by_day_slot.setdefault((date, sid), []).append(rid)
+
+                    # ✅ 若用途中包含 MIS，加入提示
+                    tag = ""
+                    if "MIS" in str(fpurpose).upper():
+                        tag = "\n⚠️ 此固定預約涉及 MIS 支援"
+                    room_name = room_name_map.get(rid, "")
+                    details_by_day_slot.setdefault((date, sid), []).append(
+                        f"[固定] 會議室：{rid}（{room_name}）\n預約人：{fuser}\n用途：{fpurpose}{tag}"
+                    )
+
+    return all_room_ids, bookings_by_day_slot, details_by_day_slot, valid_records_exist
+
+# Boss 專區：不可外借會議室的固定預約
+@tracing.traced(cat="query")
+def collect_fixed_overview(filename=DEFAULT_STORE):
+    """回傳 {(星期, slot_id): [(room_id, user_id, purpose), ...]}，只含「不可外借」的會議室"""
+    repo = get_repository(filename)
+    non_external_rooms = {r.room_id for r in repo.rooms() if not is_true(r.external)}
+
+    fixed_map = {}
+    index = repo.occupancy()
+    for wday in occupancy.WEEKDAYS:
+        for sid, week_rooms in index.fixed_week(wday).items():
+            for rid, entries in week_rooms.items():
+                if not isinstance(rid, str) or rid not in non_external_rooms:
+                    continue
+                for uid, purpose in entries.values():
+                    fixed_map.setdefault((wday, sid), []).append((rid, uid, purpose))
+    return fixed_map
+
+# 啟動檢查：會議室與時段是否還是範例資料
+def has_real_data(filename=DEFAULT_STORE):
+    """確認會議室與時段中至少有一筆不是『範例』的正式資料"""
+    repo = get_repository(filename)
+    real_rooms = [r for r in repo.rooms() if "範例" not in str(r.usage)]  # 用途欄
+    real_slots = [s for s in repo.time_slots() if "範例" not in str(s.note)]  # 備註欄
+    return len(real_rooms) > 0 and len(real_slots) > 0
+
+
+# 取消一般預約
+@tracing.traced(cat="write")
+def cancel_bookings(booking_ids, filename=DEFAULT_STORE):
+    """
+    把 booking_ids 的一般預約標記為取消。
+    回傳 True：成功；None：沒有可取消的預約（找不到或早已取消）；False：寫入失敗
+    """
+    try:
+        canceled = get_repository(filename).cancel_bookings(booking_ids)
+    except (OSError, sqlite3.Error):
+        return False
+    return True if canceled else None
+
+
+# 寫入固定預約
+@tracing.traced(cat="write")
+def commit_fixed_booking(weekday, slot_ids, room_id, user_id, purpose, filename=DEFAULT_STORE):
+    """
+    每個時段寫一筆 FixedBooking。
+    回傳 (結果, 衝突)：
+    - 結果 True：成功；None：與既有預約衝突（見衝突）；False：寫入失敗
+    - 衝突 {"fixed": [...], "schedule": [...]}，格式同 find_fixed_conflicts / find_schedule_conflicts_by_weekday
+    """
+    slot_ids = list(slot_ids)
+
+    def find_conflicts():
+        return {
+            "fixed": find_fixed_conflicts(weekday, slot_ids, room_id, filename),
+            "schedule": find_schedule_conflicts_by_weekday(weekday, slot_ids, room_id, filename),
+        }
+
+    # 初學者註解：先查一次衝突，才有明細可以顯示；真正的把關在後端寫入時（同一把鎖內再檢查一次）
+    conflicts = find_conflicts()
+    if conflicts["fixed"] or conflicts["schedule"]:
+        return None, conflicts
+    try:
+        new_ids = get_repository(filename).add_fixed_bookings(weekday, slot_ids, room_id, user_id, purpose)
+    except (OSError, sqlite3.Error):
+        return False, conflicts
+    if new_ids is None:
+        return None, find_conflicts()  # 剛好被別人搶先：用最新資料重查衝突明細
+    return True, conflicts
+
+
+# 取消固定預約
+@tracing.traced(cat="write")
+def cancel_fixed_bookings(booking_ids, filename=DEFAULT_STORE):
+    """
+    把 booking_ids 的固定預約標記為取消。
+    回傳 True：成功；None：沒有可取消的預約（找不到或早已取消）；False：寫入失敗
+    """
+    try:
+        canceled = get_repository(filename).cancel_fixed_bookings(booking_ids)
+    except (OSError, sqlite3.Error):
+        return False
+    return True if canceled else None
+
+
+# 清除過期的暫時鎖定（租約）
+@tracing.traced(cat="lease")
+def cleanup_expired_locks(filename=DEFAULT_STORE):
+    try:
+        get_repository(filename).leases.purge_expired(LOCK_EXPIRY_SECONDS)
+    except sqlite3.Error as e:
+        print(f"清除過期鎖定失敗：{e}")
+
+
+# 建立暫時鎖定（租約）
+@tracing.traced(cat="lease")
+def lock_room(token, date, slot_ids, room_id, filename=DEFAULT_STORE):
+    """
+    成功回傳 True；已被別人鎖住回傳 False；租約儲存區寫入失敗回傳 None（由呼叫端顯示錯誤訊息）。
+    """
+    try:
+        return get_repository(filename).leases.acquire(token, date, slot_ids, room_id, LOCK_EXPIRY_SECONDS)
+    except sqlite3.Error:
+        return None
+
+# 幫正在填資料的使用者續約（確認頁每 HEARTBEAT_SECONDS 秒呼叫一次）
+@tracing.traced(cat="lease")
+def renew_lease(token, filename=DEFAULT_STORE):
+    """
+    成功回傳 True；租約已過期或已被釋放回傳 False（需要重新上鎖）；
+    租約儲存區寫入失敗回傳 None（下次心跳再試）。
+    """
+    try:
+        return get_repository(filename).leases.renew(token, LOCK_EXPIRY_SECONDS) > 0
+    except sqlite3.Error:
+        return None
+
+
+# 釋放某使用者的所有鎖定資料；回傳釋放的筆數，寫入失敗回傳 None
+@tracing.traced(cat="lease")
+def release_token_locks(token, filename=DEFAULT_STORE):
+    try:
+        return get_repository(filename).leases.release(token)
+    except sqlite3.Error as e:
+        print(f"釋放鎖定失敗：{e}")
+        return None
@@ -0,0 +1,509 @@
+"""
+本機預約伺服器（單一寫入者）
+
+初學者註解：
+- 多台 kiosk 各自開同一份 xlsx 時，大家都要搶檔案鎖、各自重讀檔案。
+- 伺服器模式改成：只有這一個程式碰 Excel，資料快照常駐在記憶體；
+  各 kiosk 的畫面透過 HTTP 問伺服器（見 booking_client.py），自己不再讀寫檔案。
+- 讀取（查空房、總覽…）可以很多個同時處理；寫入（預約、取消、暫時鎖定）
+  全部排進同一條佇列，由唯一的寫入執行緒依序完成，不會互相蓋掉。
+- 只聽 127.0.0.1（本機），不對外開放。
+- 整點時很多台 kiosk 會同時查同一天的空房：內容相同、同時進來的查詢只算一次，
+  大家共用結果（Coalescer）。
+- 暫時鎖定（租約）的寫入很頻繁：幾毫秒內進來的請求併成一個 SQLite 交易，只寫一次磁碟（LeaseBatcher）。
+- 合併的效果可以從 GET /metrics 看到。
+
+啟動：
+    python zoom_excel.py --serve              # 預設 127.0.0.1:8765
+    python booking_server.py --port 9000
+
+API（全部用 JSON）：
+    GET  /health
+    GET  /metrics
+    GET  /timeslots
+    GET  /timeslot-labels                                （含停用的時段，顯示舊紀錄用）
+    GET  /rooms                                          （啟用中的會議室）
+    GET  /bookings?user=A123                             （某人尚未取消的一般預約）
+    GET  /fixed-bookings?user=A123                       （某人尚未取消的固定預約）
+    GET  /fixed-overview                                 （Boss 專區：不可外借會議室的固定預約）
+    GET  /availability?date=2025/08/01&slots=1,2
+    GET  /conflict?date=...&slots=...&room="Z1"          （room 用 JSON 寫法）
+    GET  /templock-fixed?weekday=週一&slots=...&room="Z1"
+    GET  /overview?dates=2025/07/28,2025/07/29,...
+    POST /book           {date, slot_ids, room_id, user_id, purpose, token}
+    POST /cancel         {booking_ids}
+    POST /fixed          {weekday, slot_ids, room_id, user_id, purpose}
+    POST /fixed/cancel   {booking_ids}
+    POST /lease          {token, date, slot_ids, room_id}
+    POST /lease/release  {token}
+    POST /lease/renew    {token}                        （確認頁的續約心跳）
+    POST /lease/cleanup  {}
+"""
+import argparse
+import json
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import booking_core
+import occupancy
+import tracing
+from excel_manager import cas_stats
+from storage import DEFAULT_STORE, get_repository
+from workbook_lock import lock_stats
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+WRITE_TIMEOUT = 30  # 等寫入執行緒最多幾秒
+LEASE_BATCH_WINDOW = 0.005  # 第一筆租約請求進來後，再等幾秒收集同一批
+LEASE_BATCH_MAX = 64        # 一批最多幾筆
+
+
+class SingleWriter:
+    """唯一的寫入執行緒：submit(fn, ...) 排進佇列，依序執行，回傳 Future"""
+
+    def __init__(self, on_write=None):
+        self._queue = queue.Queue()
+        self._on_write = on_write  # 每做完一筆寫入就呼叫一次（讓查詢快取失效）
+        self._thread = threading.Thread(target=self._run, name="writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args):
+        future = Future()
+        self._queue.put((future, tracing.bind(fn), args))  # 寫入區段歸在送出它的請求底下
+        return future
+
+    def call(self, fn, *args):
+        return self.submit(fn, *args).result(timeout=WRITE_TIMEOUT)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn, args = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            finally:
+                if self._on_write is not None:
+                    self._on_write()
+            future.set_result(result)
+
+    def stop(self):
+        """做完佇列裡已排好的寫入後結束"""
+        self._queue.put(None)
+        self._thread.join()
+
+
+class LeaseBatcher:
+    """
+    暫時鎖定的寫入批次器。
+    - 第一筆請求進來後再等 LEASE_BATCH_WINDOW 秒，把這段時間內的上鎖 / 續約 / 釋放一起做，
+      在同一個 SQLite 交易裡依到達順序執行（LeaseStore.apply_batch），只 commit 一次。
+    - 每個請求仍拿到自己的結果（Future）。
+    """
+
+    def __init__(self, filename, on_write=None, window=LEASE_BATCH_WINDOW, max_batch=LEASE_BATCH_MAX):
+        self.filename = filename
+        self.window = window
+        self.max_batch = max_batch
+        self._on_write = on_write
+        self._queue = queue.Queue()
+        self.stats = {"ops": 0, "batches": 0, "max_batch": 0}
+        self._thread = threading.Thread(target=self._run, name="lease-writer", daemon=True)
+        self._thread.start()
+
+    def call(self, op):
+        future = Future()
+        self._queue.put((future, op))
+        return future.result(timeout=WRITE_TIMEOUT)
+
+    def _collect(self):
+        """等到第一筆，再收集 window 秒內（最多 max_batch 筆）的其他請求"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # 做完這批再結束
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            ops = [op for _, op in batch]
+            try:
+                results = get_repository(self.filename).leases.apply_batch(ops, booking_core.LOCK_EXPIRY_SECONDS)
+            except sqlite3.Error as e:
+                # 整個交易失敗（資料庫被鎖太久、磁碟錯誤…）：每個請求都拿到同一個錯誤
+                results = [e] * len(batch)
+            except Exception as e:
+                for future, _ in batch:
+                    future.set_exception(e)
+                continue
+            if self._on_write is not None:
+                self._on_write()
+            self.stats["ops"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+            # 某個操作出錯只影響送出它的那個請求（apply_batch 用 SAVEPOINT 隔開）
+            for (future, _), result in zip(batch, results):
+                if isinstance(result, sqlite3.Error):
+                    future.set_result(None)  # 與 booking_core.lock_room 相同：寫入失敗回傳 None
+                elif isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+class Coalescer:
+    """
+    相同的查詢同時進來時只算一次：第一個請求負責計算，其他請求等它的結果。
+    key 裡含「寫入世代」，寫入之後進來的查詢不會拿到寫入前開始算的結果。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}  # {key: Future}
+        self.stats = {"requests": 0, "computed": 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            self.stats["requests"] += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.stats["computed"] += 1
+        if not leader:
+            return future.result(timeout=WRITE_TIMEOUT)
+
+        try:
+            result = fn()
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_result(result)
+        return result
+
+
+class BadRequest(Exception):
+    """參數缺少或格式錯誤（回 400）"""
+
+
+def _slots(text):
+    """'1,2,3' → [1, 2, 3]"""
+    try:
+        return [int(s) for s in text.split(",") if s != ""]
+    except ValueError:
+        raise BadRequest(f"時段格式錯誤：{text}")
+
+
+def _field(body, name, types=str):
+    """
+    POST 內容的欄位：缺少或型別不對就回 400。
+    要在排進寫入佇列 / 租約批次之前檢查，壞掉的請求才不會拖累同一批的其他 kiosk。
+    """
+    if name not in body:
+        raise BadRequest(f"缺少欄位：{name}")
+    value = body[name]
+    # bool 也是 int 的子類別，要另外擋掉
+    if isinstance(value, bool) or not isinstance(value, types) or value == "":
+        raise BadRequest(f"欄位格式錯誤：{name}={value!r}")
+    return value
+
+
+def _date_field(body, name="date"):
+    value = _field(body, name)
+    try:
+        datetime.strptime(value, "%Y/%m/%d")
+    except ValueError:
+        raise BadRequest(f"日期格式錯誤：{value}")
+    return value
+
+
+def _weekday_field(body, name="weekday"):
+    value = _field(body, name)
+    if value not in occupancy.WEEKDAYS:
+        raise BadRequest(f"星期格式錯誤：{value}")
+    return value
+
+
+def _int_list(body, name):
+    """[1, "2"] → [1, 2]；不是非空清單或有轉不成整數的值就回 400"""
+    value = _field(body, name, list)
+    if not value or any(isinstance(v, bool) for v in value):
+        raise BadRequest(f"欄位格式錯誤：{name}={value!r}")
+    try:
+        return [int(v) for v in value]
+    except (TypeError, ValueError):
+        raise BadRequest(f"欄位格式錯誤：{name}={value!r}")
+
+
+def _id_list(body, name):
+    """流水號清單：保留原本的 int / 字串（Excel 裡手動輸入的可能是字串），只擋掉格式不對的"""
+    value = _field(body, name, list)
+    if not value or any(isinstance(v, bool) or not isinstance(v, (int, str)) for v in value):
+        raise BadRequest(f"欄位格式錯誤：{name}={value!r}")
+    return value
+
+
+def _room(text):
+    """會議室 ID 以 JSON 傳遞，才分得出 101（數字）和 "101"（字串）"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+class BookingService:
+    """
+    把 HTTP 路徑對應到 booking_core 的函式。
+    - GET 直接在處理請求的執行緒算（可同時多個；相同查詢會合併）
+    - POST 交給 SingleWriter 依序執行；租約交給 LeaseBatcher 批次寫入
+    """
+
+    def __init__(self, filename=DEFAULT_STORE):
+        self.filename = filename
+        self.generation = 0  # 每次寫入 +1，讓合併查詢不會跨過寫入
+        # 寫入執行緒與租約執行緒都會 +1；+= 不是原子操作，要上鎖才不會少算
+        self._generation_lock = threading.Lock()
+        self.writer = SingleWriter(on_write=self._bump)
+        self.leases = LeaseBatcher(filename, on_write=self._bump)
+        self.reads = Coalescer()
+
+    def _bump(self):
+        with self._generation_lock:
+            self.generation += 1
+
+    # ----- 讀取 -----
+
+    def get(self, path, params):
+        if path == "/health":
+            return {"ok": True}
+        if path == "/metrics":
+            return self.metrics()
+        with self._generation_lock:
+            generation = self.generation
+        key = (generation, path, tuple(sorted(params.items())))
+        return self.reads.do(key, lambda: self._read(path, params))
+
+    def _read(self, path, params):
+        f = self.filename
+        if path == "/timeslots":
+            return {"slots": booking_core.load_time_slots(f)}
+        if path == "/timeslot-labels":
+            return {"slots": booking_core.load_slot_labels(f)}
+        if path == "/rooms":
+            return {"rooms": booking_core.load_rooms(f)}
+        if path == "/bookings":
+            return {"bookings": booking_core.load_user_bookings(self._need(params, "user"), f)}
+        if path == "/fixed-bookings":
+            return {"bookings": booking_core.load_user_fixed_bookings(self._need(params, "user"), f)}
+        if path == "/fixed-overview":
+            fixed_map = booking_core.collect_fixed_overview(f)
+            return {"cells": [[wday, sid, entries] for (wday, sid), entries in fixed_map.items()]}
+        if path == "/availability":
+            # 讀取不清過期鎖定（那是寫入，要走寫入佇列）：需要先清的話，用戶端先呼叫 POST /lease/cleanup
+            day = booking_core.get_day_availability(
+                self._need(params, "date"), _slots(self._need(params, "slots")), f)
+            return {"slots": day}
+        if path == "/conflict":
+            return {"conflict": booking_core.is_conflict(
+                self._need(params, "date"), _slots(self._need(params, "slots")), _room(self._need(params, "room")), f)}
+        if path == "/templock-fixed":
+            hit, msg = booking_core.has_templock_conflict_for_fixed(
+                self._need(params, "weekday"), _slots(self._need(params, "slots")), _room(self._need(params, "room")), f)
+            return {"hit": hit, "message": msg}
+        if path == "/overview":
+            dates = self._need(params, "dates").split(",")
+            room_ids, bookings, details, has_records = booking_core.collect_weekly_bookings(dates, f)
+            # JSON 的 key 只能是字串：(日期, 時段) 改成 [日期, 時段, 值] 清單
+            return {
+                "room_ids": room_ids,
+                "bookings": [[d, sid, rooms] for (d, sid), rooms in bookings.items()],
+                "details": [[d, sid, texts] for (d, sid), texts in details.items()],
+                "has_records": has_records,
+            }
+        return None
+
+    # ----- 寫入 -----
+
+    def post(self, path, body):
+        # 初學者註解：每個欄位都先在這裡檢查、轉好型別，格式不對直接回 400，不會排進寫入佇列
+        f = self.filename
+        if not isinstance(body, dict):
+            raise BadRequest("內容必須是 JSON 物件")
+        if path == "/book":
+            args = (_date_field(body), _int_list(body, "slot_ids"), _field(body, "room_id", (str, int)),
+                    _field(body, "user_id"), _field(body, "purpose"), _field(body, "token"))
+            return {"result": self.writer.call(booking_core.commit_booking, *args, f)}
+        if path == "/cancel":
+            return {"result": self.writer.call(booking_core.cancel_bookings, _id_list(body, "booking_ids"), f)}
+        if path == "/fixed":
+            args = (_weekday_field(body), _int_list(body, "slot_ids"), _field(body, "room_id", (str, int)),
+                    _field(body, "user_id"), _field(body, "purpose"))
+            result, conflicts = self.writer.call(booking_core.commit_fixed_booking, *args, f)
+            return {"result": result, "conflicts": conflicts}
+        if path == "/fixed/cancel":
+            return {"result": self.writer.call(
+                booking_core.cancel_fixed_bookings, _id_list(body, "booking_ids"), f)}
+        if path == "/lease":
+            return {"result": self.leases.call(
+                ("acquire", _field(body, "token"), _date_field(body), _int_list(body, "slot_ids"),
+                 _field(body, "room_id", (str, int))))}
+        if path == "/lease/release":
+            # 釋放的筆數；寫入失敗是 None（與 booking_core.release_token_locks 相同）
+            return {"result": self.leases.call(("release", _field(body, "token")))}
+        if path == "/lease/renew":
+            renewed = self.leases.call(("renew", _field(body, "token")))
+            return {"result": None if renewed is None else renewed > 0}
+        if path == "/lease/cleanup":
+            self.writer.call(booking_core.cleanup_expired_locks, f)
+            return {"result": True}
+        return None
+
+    @staticmethod
+    def _need(params, name):
+        if name not in params:
+            raise BadRequest(f"缺少參數：{name}")
+        return params[name]
+
+    def metrics(self):
+        """合併 / 批次的效果；ratio = 請求數 ÷ 實際計算（或 commit）次數，越大代表省越多"""
+        reads = dict(self.reads.stats)
+        reads["coalesced"] = reads["requests"] - reads["computed"]
+        reads["ratio"] = reads["requests"] / reads["computed"] if reads["computed"] else 0.0
+        leases = dict(self.leases.stats)
+        leases["ratio"] = leases["ops"] / leases["batches"] if leases["batches"] else 0.0
+        return {
+            "reads": reads,
+            "lease_writes": leases,
+            "generation": self.generation,
+            "cas": dict(cas_stats),
+            "write_lock": lock_stats(),
+        }
+
+    def close(self):
+        self.leases.stop()
+        self.writer.stop()
+        booking_core.checkpoint(self.filename)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None  # 由 make_server 指定
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self._respond(lambda: self.service.get(url.path, params))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b"{}"
+        path = urlsplit(self.path).path
+
+        def handle():
+            try:
+                body = json.loads(raw.decode("utf-8"))
+            except ValueError:
+                raise BadRequest("內容不是 JSON")
+            return self.service.post(path, body)
+        self._respond(handle)
+
+    def _respond(self, handle):
+        try:
+            # 每個請求當成一個動作，請求裡的查詢 / 寫入區段都歸在它底下
+            with tracing.action(f"{self.command} {urlsplit(self.path).path}"):
+                result = handle()
+            status = 200 if result is not None else 404
+            if result is None:
+                result = {"error": f"找不到 {self.path}"}
+        except BadRequest as e:
+            status, result = 400, {"error": str(e)}
+        except Exception as e:
+            status, result = 500, {"error": f"{type(e).__name__}: {e}"}
+        data = json.dumps(result, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # 不要每個請求都印一行
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # 整點時很多台同時連線，預設的 5 不夠
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, filename=DEFAULT_STORE):
+    """建立（尚未啟動的）伺服器；只接受本機位址"""
+    if host not in ("127.0.0.1", "localhost", "::1"):
+        raise ValueError("預約伺服器只能綁定本機位址（127.0.0.1 / localhost / ::1）")
+    service = BookingService(filename)
+    handler = type("Handler", (_Handler,), {"service": service})
+    server = _Server((host, port), handler)
+    server.service = service
+    return server
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, filename=DEFAULT_STORE):
+    """啟動伺服器直到按 Ctrl+C；結束前呼叫 checkpoint（Excel 會把日誌併回）"""
+    booking_core.prepare(filename)
+    server = make_server(host, port, filename)
+    print(f"✅ 預約伺服器啟動：http://{host}:{port}（Ctrl+C 結束）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()
+        print("預約伺服器已關閉")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本機預約伺服器")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--file", default=DEFAULT_STORE, help="資料檔（.xlsx 或 .sqlite3），預設看 BOOKING_STORE")
+    parser.add_argument("--trace", metavar="FILE", help="把效能追蹤寫到 FILE（Chrome trace 格式）")
+    args = parser.parse_args()
+    if args.trace:
+        tracing.enable(args.trace)
+    serve(args.host, args.port, args.file)
@@ -1,5 +1,13 @@
 import os
+import shutil
 import tempfile
+import threading
+import journal
+import tracing
+from sheet_reader import RowBook, load_rowbook, rowbook_from_workbook
+import xlsx_writer
+from fast_xlsx import UnsupportedWorkbook
+from workbook_lock import write_lock, LockTimeout
 from openpyxl import Workbook, load_workbook
 from zipfile import BadZipFile
 from openpyxl.utils.exceptions import InvalidFileException
@@ -95,35 +103,142 @@ def is_excel_file_locked(filepath: str) -> bool:
     except PermissionError:
         return True
 
+BACKUP_COUNT = 3  # 保留幾份 .bak（.bak、.bak.1、.bak.2）
+
+
+def backup_paths(filename=FILENAME):
+    """由新到舊的備份檔路徑：xxx.xlsx.bak、xxx.xlsx.bak.1、..."""
+    base = filename + ".bak"
+    return [base] + [f"{base}.{i}" for i in range(1, BACKUP_COUNT)]
+
+
+def _rotate_backups(filename):
+    """把目前的檔案複製成最新的 .bak，舊的依序往後挪，最舊的丟掉"""
+    if not os.path.exists(filename):
+        return
+    paths = backup_paths(filename)
+    for older, newer in zip(reversed(paths[1:]), reversed(paths[:-1])):
+        if os.path.exists(newer):
+            os.replace(newer, older)
+    shutil.copy2(filename, paths[0])
+
+
+def _fsync_dir(folder):
+    """讓「改名」本身也落地；Windows 不支援開資料夾，略過即可"""
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
 def safe_save(wb, filename):
     """
     初學者註解：
-    1) 嘗試直接把活頁簿 wb 儲存到 filename。
-    2) 如果檔案被 Excel 開著（Windows 常見），會拋出 PermissionError，
+    1) 先把活頁簿 wb 存到同一個資料夾的暫存檔，fsync 確保內容真的寫到磁碟。
+    2) 把目前的檔案輪替成 .bak（保留 BACKUP_COUNT 份）。
+    3) 用 os.replace 一次把暫存檔換成正式檔名；別的 kiosk 讀到的不是舊檔就是新檔，
+       不會讀到寫一半的 zip。
+    4) 如果檔案被 Excel 開著（Windows 常見），會拋出 PermissionError，
        我們回傳 False，讓呼叫端顯示「請先關閉 Excel 再試」的提醒視窗。
-    3) 其他非預期錯誤也回傳 False，交由呼叫端決定要不要另外處理與提示。
+    5) 其他非預期錯誤也回傳 False，交由呼叫端決定要不要另外處理與提示。
+    6) 存檔成功後，直接用記憶體中的 wb 建立新的快照（見 get_workbook），
+       下一次讀取不必再重新解析檔案。
     """
+    folder = os.path.dirname(os.path.abspath(filename))
     try:
-        wb.save(filename)  # 嘗試直接覆寫檔案
-        return True
+        with write_lock(filename):
+            return _save_locked(wb, filename, folder)
     except PermissionError:
         # Excel 正在使用該檔案（檔案被鎖），無法寫入
         return False
     except Exception:
-        # 其他錯誤，保持安靜回傳 False，由呼叫端決定是否提示
+        # 其他錯誤（含等不到寫入鎖），保持安靜回傳 False，由呼叫端決定是否提示
         return False
 
+
+@tracing.traced("save_workbook", cat="storage")
+def _save_locked(wb, filename, folder, write=None):
+    """
+    safe_save 的本體；呼叫前要先拿到寫入鎖。
+    write(暫存檔路徑) 負責產生新檔案；沒給就用 wb.save。
+    """
+    tmp_path = None
+    try:
+        before = _current_version(filename)
+        fd, tmp_path = tempfile.mkstemp(prefix=".~", suffix=".xlsx.tmp", dir=folder)
+        os.close(fd)
+        (write or wb.save)(tmp_path)
+        with open(tmp_path, "r+b") as f:
+            os.fsync(f.fileno())
+
+        _rotate_backups(filename)
+        os.replace(tmp_path, filename)  # 原子覆蓋
+        tmp_path = None
+        _fsync_dir(folder)
+
+        _remember_snapshot(filename, wb)
+        _commits[os.path.abspath(filename)] = (before, _current_version(filename))
+        return True
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+@tracing.traced("load_workbook", cat="storage")
+def _load_or_restore(filename):
+    """
+    讀取 Excel；檔案壞掉時依序改用 .bak 備份，壞檔改名成 .corrupt 留存。
+    連備份都沒有可用的才建立空白活頁簿。
+    """
+    try:
+        return load_workbook(filename)
+    except (BadZipFile, InvalidFileException):
+        pass
+
+    print("⚠️ Excel 檔案錯誤，嘗試從備份還原")
+    os.replace(filename, filename + ".corrupt")
+    for path in backup_paths(filename):
+        if not os.path.exists(path):
+            continue
+        try:
+            # 用檔案物件開啟：openpyxl 看到 .bak 副檔名會直接拒絕
+            with open(path, "rb") as f:
+                wb = load_workbook(f)
+        except (BadZipFile, InvalidFileException):
+            continue
+        print(f"✅ 已從備份還原：{path}")
+        return wb
+    print("⚠️ 沒有可用的備份，重建空白檔案")
+    return Workbook()
+
+
 def init_excel_file(filename=FILENAME):
-    """檢查並初始化 Excel 檔案與所有必要工作表（僅改用 safe_save，流程不變）"""
+    """檢查並初始化 Excel 檔案與所有必要工作表，並把上次留下的異動日誌併回 Excel"""
+    # 整段拿著寫入鎖，避免兩台 kiosk 同時啟動時互相覆蓋
+    try:
+        with write_lock(filename):
+            _init_excel_file_locked(filename)
+    except LockTimeout:
+        print(f"等候其他程式寫入逾時：{filename}")
+        if _msgbox:
+            _msgbox.showerror("存檔失敗", f"其他電腦正在寫入 Excel 檔案，請稍後再重試：\n\n{filename}")
+        exit()
+
+
+def _init_excel_file_locked(filename):
     if not os.path.exists(filename):
         wb = Workbook()
     else:
-        try:
-            wb = load_workbook(filename)
-        except (BadZipFile, InvalidFileException):
-            print("⚠️ Excel 檔案錯誤，刪除並重建")
-            os.remove(filename)
-            wb = Workbook()
+        wb = _load_or_restore(filename)
 
     for sheet_name, headers in REQUIRED_SHEETS.items():
         if sheet_name not in wb.sheetnames:
@@ -141,12 +256,395 @@ def init_excel_file(filename=FILENAME):
     if "Schedule" in wb.sheetnames:
         wb.active = wb.sheetnames.index("Schedule")
 
+    # 啟動時順便做一次 checkpoint：把日誌中的異動寫進 Excel
+    # （流水號也在這裡和表內資料對齊，含關閉程式期間手動加進 Excel 的資料）
+    last_seq = _fold_journal(wb, filename)
+
     # 僅將 wb.save 改為 safe_save；失敗時維持你原本的對話框與退出行為
     if not safe_save(wb, filename):
         print(f"無法儲存 Excel 檔案，可能已被其他程式鎖定：{filename}")
         if _msgbox:
             _msgbox.showerror("存檔失敗", f"無法儲存 Excel 檔案。\n請先關閉檔案再重試：\n\n{filename}")
         exit()
+    journal.drop_through(filename, last_seq)
+
+
+# ===== 隱藏的 _Meta 工作表 =====
+# 初學者註解：存放系統自己用的設定值（例如日誌已併入到第幾筆），一般使用者看不到。
+META_SHEET = "_Meta"
+
+
+def _meta_sheet(wb):
+    if META_SHEET not in wb.sheetnames:
+        ws = wb.create_sheet(title=META_SHEET)
+        ws.sheet_state = "hidden"
+        ws.append(["Key", "Value"])
+    return wb[META_SHEET]
+
+
+def read_meta(wb, key, default=None):
+    if META_SHEET not in wb.sheetnames:
+        return default
+    for row in wb[META_SHEET].iter_rows(min_row=2, values_only=True):
+        if row and row[0] == key:
+            return row[1]
+    return default
+
+
+def write_meta(wb, key, value):
+    ws = _meta_sheet(wb)
+    for r, row in enumerate(ws.iter_rows(min_row=2, max_col=1, values_only=True), start=2):
+        if row[0] == key:
+            ws.cell(row=r, column=2, value=value)
+            return
+    ws.append([key, value])
+
+
+# ===== 流水號序列 =====
+# 初學者註解：
+# - 以前每新增一筆都要把整張表掃一遍找最大的流水號再 +1。
+# - 現在 _Meta 記著每張表「已用到的最大流水號」（id_seq:Schedule、id_seq:FixedBooking），
+#   快照套用日誌時順便更新，取號只要 O(1)。
+# - 每次從檔案重讀（含 Excel 在執行中被別人改過）都會再和表內最大值對齊一次，
+#   管理者手動加進 Excel 的列不會被重複取號。
+# - 取號本身不寫檔；兩台 kiosk 同時取到同一個號碼時，
+#   commit_if_unchanged 的版本比對會擋下後寫的那台，並讓它用新資料重新取號。
+ID_SHEETS = ("Schedule", "FixedBooking")
+
+
+def _scan_max_id(wb, sheet):
+    """掃整張表找最大的整數流水號（只在沒有記錄時才用）"""
+    max_id = 0
+    for row in wb[sheet].iter_rows(min_row=2, max_col=1, values_only=True):
+        if isinstance(row[0], int):
+            max_id = max(max_id, row[0])
+    return max_id
+
+
+def _id_seq_from_meta(wb):
+    """讀 _Meta 裡記錄的流水號；沒記錄的表不放進結果"""
+    id_seq = {}
+    for sheet in ID_SHEETS:
+        value = read_meta(wb, "id_seq:" + sheet)
+        if value is not None:
+            id_seq[sheet] = int(value)
+    return id_seq
+
+
+def _reconcile_id_seq(wb, id_seq):
+    """
+    從檔案重新讀進活頁簿時呼叫：流水號取「_Meta 記錄」與「表內最大值」較大的那個。
+    管理者可能在程式執行中直接用 Excel 加了幾列（_Meta 不會跟著改），只信 _Meta 會發出重複的號碼。
+    """
+    for sheet in ID_SHEETS:
+        if sheet in wb.sheetnames:
+            id_seq[sheet] = max(id_seq.get(sheet, 0), _scan_max_id(wb, sheet))
+    return id_seq
+
+
+def _track_id(id_seq, rec):
+    """套用一筆 append 紀錄時，順便推進該表的流水號"""
+    sheet = rec.get("sheet")
+    if rec.get("op") != "append" or sheet not in id_seq:
+        return
+    rid = rec["row"][0] if rec.get("row") else None
+    if isinstance(rid, int) and rid > id_seq[sheet]:
+        id_seq[sheet] = rid
+
+
+# ===== 活頁簿快照快取 =====
+# 初學者註解：
+# - 同一次點擊會呼叫好幾個讀取函式，每個都 load_workbook 一次，大檔案會慢到好幾秒。
+# - 這裡把解析好的活頁簿記在記憶體裡，只要檔案的 inode / 大小 / 修改時間都沒變，
+#   就直接回傳同一份，不再重新解析。
+# - 快照 = 上一次 checkpoint 的 Excel + 日誌中較新的紀錄；日誌變長時只套用新增的那幾行。
+# - 拿到的快照是「共用、唯讀」的：要修改資料請用 commit_records 寫日誌。
+# - 背景 I/O 執行緒（io_worker）會同時讀取，所以建立 / 追上 / 換掉快照都要先拿 snapshot_lock；
+#   需要「版本與內容一致」的地方（例如 occupancy 建索引）也可以拿同一把鎖。
+CHECKPOINT_EVERY = 500  # 日誌累積超過這麼多筆，就自動併回 Excel
+
+
+class _Snapshot:
+    def __init__(self, sig, wb):
+        self.sig = sig                  # Excel 檔案簽章
+        self.wb = wb
+        self.base_seq = int(read_meta(wb, "last_seq", 0) or 0)  # Excel 內已併入的最後一筆
+        self.last_seq = self.base_seq   # 目前快照已套用到的最後一筆
+        self.journal_ino = None
+        self.journal_offset = 0
+        # {工作表: 已用到的最大流水號}；每次從檔案重讀都和表內資料對齊一次
+        self.id_seq = _reconcile_id_seq(wb, _id_seq_from_meta(wb))
+
+
+_snapshots = {}  # {絕對路徑: _Snapshot}
+snapshot_lock = threading.RLock()
+_commits = {}    # {絕對路徑: (異動前版本, 異動後版本)}，給衍生索引判斷能否就地更新
+
+
+def file_signature(filename=FILENAME):
+    """回傳 (inode, 大小, 修改時間 ns)；檔案不存在時回傳 None"""
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _catch_up(snap, filename, strict=True):
+    """
+    把日誌中還沒套用的紀錄套到快照上。
+    回傳 False 代表日誌出現斷層（別的程式剛做完 checkpoint），快照需要整份重讀。
+    剛從 Excel 讀進來的快照用 strict=False：斷層只可能是日誌壞行，照順序套用即可。
+    """
+    ino, size = journal.journal_stat(filename)
+    if ino != snap.journal_ino or size < snap.journal_offset:
+        # 日誌被換過（checkpoint），從頭讀並略過已套用的 seq
+        snap.journal_ino, snap.journal_offset = ino, 0
+    if size == snap.journal_offset:
+        return True
+
+    records, snap.journal_offset = journal.read_records(filename, snap.journal_offset)
+    for rec in records:
+        seq = rec.get("seq", 0)
+        if seq <= snap.last_seq:
+            continue
+        if strict and seq != snap.last_seq + 1:
+            return False
+        journal.apply_record(snap.wb, rec)
+        _track_id(snap.id_seq, rec)
+        snap.last_seq = seq
+    return True
+
+
+def _remember_snapshot(filename, wb):
+    """把剛寫入磁碟的活頁簿（openpyxl Workbook 或 RowBook）記成最新快照"""
+    if not isinstance(wb, RowBook):
+        wb = rowbook_from_workbook(wb)
+    with snapshot_lock:
+        snap = _Snapshot(file_signature(filename), wb)
+        _snapshots[os.path.abspath(filename)] = snap
+        _catch_up(snap, filename, strict=False)
+
+
+def _current_version(filename):
+    """只看現有快照（不重新解析）；快照已過期則回傳 None"""
+    snap = _snapshots.get(os.path.abspath(filename))
+    if snap is None or snap.sig != file_signature(filename):
+        return None
+    return (snap.sig, snap.last_seq)
+
+
+def last_commit(filename=FILENAME):
+    """回傳本行程最近一次寫入的 (異動前版本, 異動後版本)；沒有寫過則回傳 None"""
+    return _commits.get(os.path.abspath(filename))
+
+
+def invalidate_workbook(filename=FILENAME):
+    """丟掉某個檔案的快照，下次讀取時會重新解析"""
+    with snapshot_lock:
+        _snapshots.pop(os.path.abspath(filename), None)
+
 
 def get_workbook(filename=FILENAME):
-    return load_workbook(filename)
+    """
+    取得活頁簿快照（唯讀用）。
+    - 先取檔案簽章再解析：若解析途中檔案被改寫，下次讀取會因簽章不同而重新載入。
+    - 每次呼叫都會順便追上日誌的新紀錄。
+    """
+    key = os.path.abspath(filename)
+    with snapshot_lock:
+        sig = file_signature(filename)
+        snap = _snapshots.get(key)
+        if snap is not None and sig is not None and snap.sig == sig:
+            if _catch_up(snap, filename):
+                return snap.wb
+
+        snap = _Snapshot(sig, load_rowbook(filename))
+        _snapshots[key] = snap
+        _catch_up(snap, filename, strict=False)
+        return snap.wb
+
+
+def workbook_version(filename=FILENAME):
+    """目前內容的版本 (Excel 簽章, 日誌 seq)；任何異動都會讓版本改變"""
+    with snapshot_lock:
+        get_workbook(filename)
+        snap = _snapshots[os.path.abspath(filename)]
+        return (snap.sig, snap.last_seq)
+
+
+# ===== 寫入：追加日誌、checkpoint =====
+
+def commit_records(filename, records):
+    """
+    把一批異動（格式見 journal.py）寫進日誌，只追加並 fsync 一次，不重寫整本 Excel。
+    成功回傳 True；日誌寫不進去（權限、磁碟滿）或等不到寫入鎖回傳 False。
+    - 整段拿著寫入鎖：先追上別台 kiosk 剛寫的紀錄再編 seq，seq 才不會重複。
+    """
+    try:
+        with write_lock(filename):
+            return _commit_locked(filename, records)
+    except LockTimeout:
+        return False
+
+
+@tracing.traced("journal_commit", cat="storage")
+def _commit_locked(filename, records):
+    key = os.path.abspath(filename)
+    with snapshot_lock:
+        before = workbook_version(filename)
+        snap = _snapshots[key]
+
+        seq = snap.last_seq
+        stamped = []
+        for rec in records:
+            seq += 1
+            stamped.append(dict(rec, seq=seq))
+        try:
+            journal.append_records(filename, stamped)
+        except OSError:
+            return False
+
+        caught_up = _catch_up(snap, filename)
+        if not caught_up:
+            invalidate_workbook(filename)
+    if caught_up and snap.last_seq - snap.base_seq >= CHECKPOINT_EVERY:
+        checkpoint(filename)
+
+    _commits[key] = (before, workbook_version(filename))
+    return True
+
+
+def allocate_ids(filename, sheet, count=1):
+    """
+    取 count 個新的流水號（可一次取一批，給多筆新增用）。
+    請在 commit_if_unchanged 的 build_records 裡呼叫，撞號會由版本比對擋下。
+    """
+    with snapshot_lock:
+        get_workbook(filename)
+        snap = _snapshots[os.path.abspath(filename)]
+        start = snap.id_seq.get(sheet, 0) + 1  # 快照建立時已和表內資料對齊過
+        return list(range(start, start + count))
+
+
+# ===== 樂觀並行控制（compare-and-swap） =====
+# 初學者註解：
+# - 使用者在畫面上操作的過程中不拿鎖；只有在最後寫入的那一瞬間才比對「資料版本」。
+# - 資料版本 = 日誌 seq（_Meta 的 last_seq + 之後追加的筆數），每寫一筆就 +1；
+#   checkpoint 只是搬家、不改內容，所以不會讓版本改變。
+# - 版本不同代表剛剛有人寫過 → 用最新資料重新檢查一次衝突，沒衝突再寫。
+COMMIT_RETRIES = 5
+cas_stats = {"commits": 0, "retries": 0, "gave_up": 0}
+
+
+def data_version(filename=FILENAME):
+    """目前資料內容的版本（日誌 seq）"""
+    with snapshot_lock:
+        get_workbook(filename)
+        return _snapshots[os.path.abspath(filename)].last_seq
+
+
+@tracing.traced(cat="storage")
+def commit_if_unchanged(filename, build_records, retries=COMMIT_RETRIES):
+    """
+    build_records(wb)：用讀到的快照做衝突檢查並產生要寫入的紀錄；
+    回傳 None 代表檢查不通過（例如時段已被預約），不寫入。
+    回傳值：
+    - True：寫入成功
+    - None：build_records 判定不能寫入
+    - False：寫入失敗（權限、等不到寫入鎖，或一直被別人搶先）
+    """
+    for _ in range(retries):
+        version = data_version(filename)
+        records = build_records(get_workbook(filename))
+        if records is None:
+            return None
+        try:
+            with write_lock(filename):
+                if data_version(filename) != version:
+                    cas_stats["retries"] += 1
+                    continue  # 有人搶先寫入 → 重新檢查
+                ok = _commit_locked(filename, records)
+        except LockTimeout:
+            return False
+        if ok:
+            cas_stats["commits"] += 1
+        return ok
+    cas_stats["gave_up"] += 1
+    return False
+
+
+def _fold_journal(wb, filename):
+    """把日誌中比 wb 新的紀錄套進 wb，並更新 _Meta 的 last_seq 與流水號；回傳最後一筆 seq"""
+    last_seq = int(read_meta(wb, "last_seq", 0) or 0)
+    id_seq = _id_seq_from_meta(wb)
+    records, _ = journal.read_records(filename)
+    for rec in records:
+        if rec.get("seq", 0) > last_seq:
+            journal.apply_record(wb, rec)
+            _track_id(id_seq, rec)
+            last_seq = rec["seq"]
+    write_meta(wb, "last_seq", last_seq)
+    # 連同關閉程式期間或執行中手動加進 Excel 的資料一起對齊，再寫回 _Meta
+    for sheet, value in _reconcile_id_seq(wb, id_seq).items():
+        write_meta(wb, "id_seq:" + sheet, value)
+    return last_seq
+
+
+@tracing.traced(cat="storage")
+def checkpoint(filename=FILENAME):
+    """
+    把日誌併回 Excel（可手動呼叫，也會在日誌過長時自動執行）。
+    順序：讀一份新的活頁簿 → 套用日誌 → safe_save → 從日誌移除已併入的紀錄。
+    整段拿著寫入鎖，checkpoint 途中別台 kiosk 追加的紀錄不會被 drop_through 漏掉。
+    - 平常只重寫有異動的工作表（xlsx_writer），其餘部分原封不動複製；
+      檔案含公式、日期值等處理不了的內容時，才改用 openpyxl 整本存檔。
+    """
+    try:
+        with write_lock(filename):
+            return _checkpoint_locked(filename)
+    except LockTimeout:
+        return False
+
+
+def _checkpoint_locked(filename):
+    try:
+        return _checkpoint_incremental(filename)
+    except PermissionError:
+        return False  # Excel 開著檔案，整本存也一樣會失敗
+    except Exception:
+        pass  # 含公式、日期值或格式特殊 → 改用 openpyxl 整本存
+    wb = load_workbook(filename)
+    base_seq = int(read_meta(wb, "last_seq", 0) or 0)
+    last_seq = _fold_journal(wb, filename)
+    if last_seq == base_seq:
+        return True
+    if not safe_save(wb, filename):
+        return False
+    journal.drop_through(filename, last_seq)
+    return True
+
+
+def _checkpoint_incremental(filename):
+    """只重寫日誌動到的工作表與 _Meta；做不到時丟出例外（UnsupportedWorkbook 等）"""
+    # 先看日誌：沒有比 _Meta 的 last_seq 新的紀錄就不用解析整本活頁簿（只讀 _Meta 這張小表）
+    records, _ = journal.read_records(filename)
+    if not records:
+        return True
+    meta = load_rowbook(filename, engine="fast", fallback=False, sheets={META_SHEET})
+    if META_SHEET not in meta.sheetnames:
+        raise UnsupportedWorkbook("沒有 _Meta 工作表")
+    base_seq = int(read_meta(meta, "last_seq", 0) or 0)
+    changed = {META_SHEET}
+    changed.update(rec.get("sheet") for rec in records if rec.get("seq", 0) > base_seq)
+    if len(changed) == 1:
+        return True  # 沒有新紀錄
+
+    wb = load_rowbook(filename, engine="fast", fallback=False)
+    last_seq = _fold_journal(wb, filename)
+    sheets = {name: list(wb[name].iter_rows()) for name in changed if name in wb.sheetnames}
+    folder = os.path.dirname(os.path.abspath(filename))
+    _save_locked(wb, filename, folder,
+                 write=lambda tmp_path: xlsx_writer.rewrite_sheets(filename, tmp_path, sheets))
+    journal.drop_through(filename, last_seq)
+    return True
@@ -0,0 +1,237 @@
+"""
+精簡版 xlsx 讀取器（不經過 openpyxl 物件）
+
+初學者註解：
+- xlsx 其實是一個 zip：工作表在 xl/worksheets/sheetN.xml，
+  文字集中放在 xl/sharedStrings.xml，儲存格裡只記「第幾個字串」。
+- 這裡直接打開 zip，工作表用 expat 回呼一段一段解析（不建立 XML 節點），把每一列轉成 list：
+    數字 → int / float（流水號、時段 ID 會是 int）
+    布林 → True / False（取消狀態）
+    套了日期格式的數字 → datetime
+    共用字串 / 行內字串 → str
+  結果與 openpyxl 讀出來的值相同，但不建立 Cell、樣式等物件，所以快很多。
+- 只支援「純資料」的活頁簿；遇到公式或看不懂的格式就丟出 UnsupportedWorkbook，
+  由 sheet_reader 自動改用 openpyxl 讀。
+"""
+import posixpath
+import zipfile
+from xml.etree.ElementTree import XMLParser, iterparse
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.datetime import from_excel, CALENDAR_WINDOWS_1900, CALENDAR_MAC_1904
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_R_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+_DIGITS = "0123456789"
+_CELL_TYPES = {"n", "s", "b", "str", "e", "inlineStr"}
+
+
+class UnsupportedWorkbook(Exception):
+    """這個讀取器處理不了的活頁簿（例如含公式），請改用 openpyxl"""
+
+
+def _column_index(letters):
+    """'A' → 0、'AA' → 26"""
+    n = 0
+    for ch in letters:
+        n = n * 26 + (ord(ch) - 64)
+    return n - 1
+
+
+def sheet_targets(zf):
+    """回傳 ([(工作表名稱, zip 內路徑)], 是否為 1904 日期系統)"""
+    rels = {}
+    for _, el in iterparse(zf.open("xl/_rels/workbook.xml.rels")):
+        if el.tag == _REL_NS + "Relationship":
+            target = el.get("Target")
+            if target.startswith("/"):
+                target = target[1:]
+            else:
+                target = posixpath.normpath(posixpath.join("xl", target))
+            rels[el.get("Id")] = target
+
+    sheets = []
+    date1904 = False
+    for _, el in iterparse(zf.open("xl/workbook.xml")):
+        if el.tag == _NS + "sheet":
+            sheets.append((el.get("name"), rels[el.get(_R_ID)]))
+        elif el.tag == _NS + "workbookPr":
+            date1904 = el.get("date1904") in ("1", "true")
+    if not sheets:
+        raise UnsupportedWorkbook("找不到工作表（可能是 strict 格式）")
+    return sheets, date1904
+
+
+def _shared_strings(zf):
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return []
+    strings = []
+    parts = []
+    in_phonetic = False  # <rPh> 是注音 / 假名標示，不是內容本身
+    for event, el in iterparse(zf.open("xl/sharedStrings.xml"), events=("start", "end")):
+        tag = el.tag
+        if tag == _NS + "rPh":
+            in_phonetic = event == "start"
+        elif event == "start":
+            if tag == _NS + "si":
+                parts = []
+        elif tag == _NS + "t" and not in_phonetic:
+            parts.append(el.text or "")
+        elif tag == _NS + "si":
+            strings.append("".join(parts))
+            el.clear()
+    return strings
+
+
+def _date_styles(zf):
+    """回傳「套了日期格式」的 cellXfs 索引集合"""
+    if "xl/styles.xml" not in zf.namelist():
+        return set()
+    custom = {}
+    xf_formats = []
+    in_cell_xfs = False
+    for event, el in iterparse(zf.open("xl/styles.xml"), events=("start", "end")):
+        if el.tag == _NS + "cellXfs":
+            in_cell_xfs = event == "start"
+        elif event == "end" and el.tag == _NS + "numFmt":
+            custom[int(el.get("numFmtId"))] = el.get("formatCode")
+        elif event == "start" and in_cell_xfs and el.tag == _NS + "xf":
+            xf_formats.append(int(el.get("numFmtId", 0)))
+
+    date_xfs = set()
+    for i, fmt_id in enumerate(xf_formats):
+        code = custom.get(fmt_id, BUILTIN_FORMATS.get(fmt_id))
+        if code and is_date_format(code):
+            date_xfs.add(i)
+    return date_xfs
+
+
+def _convert_number(text):
+    """與 openpyxl 相同的規則：有小數點或指數就是 float，否則 int"""
+    if "." in text or "E" in text or "e" in text:
+        return float(text)
+    return int(text)
+
+
+class _SheetTarget:
+    """
+    給 expat 用的回呼物件：不建立任何 XML 節點，讀到一個儲存格就直接轉成值。
+    讀完的列先放在 self.rows，由 _iter_sheet 分批取走。
+    """
+
+    def __init__(self, strings, date_xfs, epoch):
+        self.strings = strings
+        self.date_xfs = date_xfs
+        self.epoch = epoch
+        self.rows = []
+        self.row_no = 0
+        self.values = []
+        self.col = 0
+        self.cell_type = "n"
+        self.cell_style = 0
+        self.text = []
+        self.collect = False  # 目前是否在 <v> 或 <t> 裡
+
+    def start(self, tag, attrib):
+        if tag == _C:
+            ref = attrib.get("r")
+            self.col = _column_index(ref.rstrip(_DIGITS)) if ref else len(self.values)
+            self.cell_type = attrib.get("t", "n")
+            self.cell_style = int(attrib.get("s", 0))
+            self.text = []
+        elif tag == _V or tag == _T:
+            self.collect = True
+        elif tag == _ROW:
+            self.row_no = int(attrib.get("r", self.row_no + 1))
+            self.values = []
+        elif tag == _F:
+            raise UnsupportedWorkbook("含公式")
+
+    def data(self, text):
+        if self.collect:
+            self.text.append(text)
+
+    def end(self, tag):
+        if tag == _V or tag == _T:
+            self.collect = False
+        elif tag == _C:
+            self._finish_cell()
+        elif tag == _ROW:
+            self.rows.append((self.row_no, self.values))
+
+    def _finish_cell(self):
+        cell_type = self.cell_type
+        if not self.text:
+            return  # 空白儲存格（openpyxl 也把空的行內字串讀成 None）
+        text = "".join(self.text)
+        if cell_type == "s":
+            value = self.strings[int(text)]
+        elif cell_type == "n":
+            value = _convert_number(text)
+            if self.cell_style in self.date_xfs:
+                value = from_excel(value, self.epoch)
+        elif cell_type == "b":
+            value = text == "1"
+        elif cell_type in ("inlineStr", "str", "e"):
+            value = text
+        else:
+            raise UnsupportedWorkbook(f"不支援的儲存格型別：{cell_type}")
+
+        values, col = self.values, self.col
+        if col == len(values):
+            values.append(value)
+        else:
+            if col > len(values):
+                values.extend([None] * (col - len(values) + 1))
+            values[col] = value
+
+    def close(self):
+        return None
+
+
+_C, _V, _T, _F, _ROW = _NS + "c", _NS + "v", _NS + "t", _NS + "f", _NS + "row"
+_CHUNK = 1 << 16
+
+
+def _iter_sheet(zf, path, strings, date_xfs, epoch):
+    """逐列回傳 (列號, [值, ...])；空白儲存格為 None。每次只讀 64KB，記憶體與表的大小無關"""
+    target = _SheetTarget(strings, date_xfs, epoch)
+    parser = XMLParser(target=target)
+    with zf.open(path) as f:
+        while True:
+            chunk = f.read(_CHUNK)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            if target.rows:
+                yield from target.rows
+                target.rows = []
+    parser.close()
+    yield from target.rows
+
+
+def read_workbook_rows(filename, names=None):
+    """
+    讀整本活頁簿：回傳 [(工作表名稱, [每列的 list])]，rows[0] 對應 Excel 第 1 列。
+    中間的空白列會補成空 list，與 openpyxl 的列號一致。
+    names：只讀這些工作表（其他工作表的 XML 完全不解析）；None 代表全部
+    """
+    with zipfile.ZipFile(filename) as zf:
+        sheets, date1904 = sheet_targets(zf)
+        strings = _shared_strings(zf)
+        date_xfs = _date_styles(zf)
+        epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+
+        result = []
+        for name, path in sheets:
+            if names is not None and name not in names:
+                continue
+            rows = []
+            for row_no, values in _iter_sheet(zf, path, strings, date_xfs, epoch):
+                while len(rows) < row_no - 1:
+                    rows.append([])
+                rows.append(values)
+            result.append((name, rows))
+        return result
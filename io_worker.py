@@ -0,0 +1,113 @@
+"""
+背景 I/O 工作執行緒
+
+初學者註解：
+- Tkinter 只有一條「主執行緒」在畫畫面；按鈕事件裡如果直接讀大 Excel，
+  整個視窗會卡住好幾秒（連關閉鈕都按不動）。
+- 這裡用 ThreadPoolExecutor 在背景執行讀寫，主執行緒每隔 POLL_MS 用 after() 看一下
+  有沒有做完的工作，再「回到主執行緒」呼叫 on_done / on_error 更新畫面。
+  （Tk 的元件與 messagebox 只能在主執行緒使用，所以背景工作裡不可以碰畫面。）
+- 多個互不相干的讀取（例如時段頁與總覽頁）可以同時在背景跑。
+- 有工作在跑時，視窗右下角會顯示「處理中…」並把滑鼠游標變成等待圖示。
+- 開啟效能追蹤時（tracing.py），背景工作與回呼都會歸在「送出它的那個畫面動作」底下。
+"""
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox
+
+import tracing
+
+POLL_MS = 30      # 多久檢查一次背景工作是否完成
+MAX_WORKERS = 4
+
+
+class BusyIndicator:
+    """右下角的「處理中…」小標籤 + 等待游標"""
+
+    def __init__(self, root, text="處理中…"):
+        self.root = root
+        self.label = tk.Label(root, text=text, font=("Arial", 10), bg="#fef3c7", fg="#92400e",
+                              padx=8, pady=2)
+
+    def show(self):
+        self.label.place(relx=1.0, rely=1.0, anchor="se", x=-8, y=-8)
+        self.label.lift()
+        self.root.config(cursor="watch")
+
+    def hide(self):
+        self.label.place_forget()
+        self.root.config(cursor="")
+
+
+def _default_error(exc):
+    messagebox.showerror("錯誤", f"讀取或寫入資料失敗。\n錯誤原因：{exc}")
+
+
+class IOWorker:
+    """
+    用法：
+        worker.submit(get_day_availability, date, slots, on_done=self._show)
+    - fn(*args) 在背景執行；完成後在主執行緒呼叫 on_done(結果) 或 on_error(例外)。
+    - key：同一個 key 只採用「最後一次送出」的結果（例如連按兩次重新整理，舊的結果直接丟掉）。
+    """
+
+    def __init__(self, root, max_workers=MAX_WORKERS):
+        self.root = root
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="io")
+        self._pending = []          # [(future, on_done, on_error, key, 序號)]
+        self._latest = {}           # {key: 最新序號}
+        self._counter = 0
+        self._lock = threading.Lock()
+        self._polling = False
+        self.busy = BusyIndicator(root)
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def is_busy(self, key):
+        """同一個 key 是否還有工作在跑（用來擋連點）"""
+        return any(k == key for _, _, _, k, _ in self._pending)
+
+    def submit(self, fn, *args, on_done=None, on_error=None, key=None, **kwargs):
+        with self._lock:
+            self._counter += 1
+            seq = self._counter
+        if key is not None:
+            self._latest[key] = seq
+        future = self._pool.submit(tracing.bind(fn), *args, **kwargs)
+        self._pending.append((future, tracing.bind(on_done), tracing.bind(on_error or _default_error), key, seq))
+        if len(self._pending) == 1:
+            self.busy.show()
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_MS, self._poll)
+        return future
+
+    def _poll(self):
+        # 只看一次 done()：分兩次看的話，剛好在中間完成的工作兩邊都不會出現，回呼就永遠不會執行
+        finished, running = [], []
+        for item in self._pending:
+            (finished if item[0].done() else running).append(item)
+        if finished:
+            self._pending = running
+            if not self._pending:
+                self.busy.hide()
+        for future, on_done, on_error, key, seq in finished:
+            if key is not None and self._latest.get(key) != seq:
+                continue  # 已經有更新的同類工作，這個結果過時了
+            exc = future.exception()
+            if exc is not None:
+                on_error(exc)
+            elif on_done is not None:
+                on_done(future.result())
+
+        if self._pending:
+            self.root.after(POLL_MS, self._poll)
+        else:
+            self._polling = False
+
+    def shutdown(self):
+        """關閉視窗前呼叫：等背景工作做完（結果不再回呼）"""
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,139 @@
+"""
+預約異動日誌（write-ahead journal）
+
+初學者註解：
+- 以前每次新增 / 取消 / 暫鎖都要把整本 Excel 重新壓縮寫一次，就算只改 TempLock 一列也一樣。
+- 現在每次異動只在 Excel 旁邊的 meeting_schedule.journal.jsonl 追加一行 JSON，並 fsync 確保落地。
+- 讀取時 = 「上一次 checkpoint 的 Excel」+「日誌中比它新的紀錄」。
+- checkpoint（excel_manager.checkpoint）才會把日誌併回 Excel，並把已併入的紀錄從日誌移除。
+
+每筆紀錄都有遞增的 seq；Excel 的隱藏工作表 _Meta 記著已併入的最後一個 seq，
+所以就算 checkpoint 做到一半被中斷，重播時也不會重複套用。
+
+支援的 op：
+- append：{"op": "append", "sheet": 工作表, "row": [...]}
+- update：{"op": "update", "sheet": 工作表, "key": 第一欄的值, "col": 欄號(從 1 起算), "value": 新值}
+- delete / expire：只用來重播「舊版」留下的日誌。
+  暫時鎖定搬到 lease_store 之後，程式已經不會再寫出這兩種紀錄；但升級前的日誌裡可能還有
+  TempLock 的 delete / expire，啟動時的 checkpoint 仍要能把它們套用進 Excel，所以保留。
+    delete：{"op": "delete", "sheet": 工作表, "col": 欄號, "value": 要刪除的值}
+    expire：{"op": "expire", "sheet": "TempLock", "cutoff": "YYYY/mm/dd HH:MM:SS"}，刪除時間戳不晚於 cutoff 的鎖
+"""
+import json
+import os
+from datetime import datetime
+
+TIMESTAMP_FORMAT = "%Y/%m/%d %H:%M:%S"
+
+
+def journal_path(filename):
+    """meeting_schedule.xlsx → meeting_schedule.journal.jsonl"""
+    return os.path.splitext(filename)[0] + ".journal.jsonl"
+
+
+def journal_stat(filename):
+    """回傳 (inode, 大小)；日誌不存在時回傳 (None, 0)"""
+    try:
+        st = os.stat(journal_path(filename))
+    except OSError:
+        return None, 0
+    return st.st_ino, st.st_size
+
+
+def append_records(filename, records):
+    """把紀錄追加到日誌尾端並 fsync；records 需已帶好 seq"""
+    if not records:
+        return
+    data = "".join(json.dumps(rec, ensure_ascii=False) + "\n" for rec in records)
+    with open(journal_path(filename), "ab") as f:
+        f.write(data.encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_records(filename, offset=0):
+    """
+    從 offset（位元組）開始讀日誌。
+    回傳 (紀錄清單, 新的 offset)；最後一行若還沒寫完（沒有換行）就先不讀，offset 停在它前面。
+    """
+    try:
+        with open(journal_path(filename), "rb") as f:
+            f.seek(offset)
+            data = f.read()
+    except OSError:
+        return [], offset
+
+    records = []
+    consumed = 0
+    for line in data.splitlines(keepends=True):
+        if not line.endswith(b"\n"):
+            break  # 寫到一半的尾巴，下次再讀
+        consumed += len(line)
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line.decode("utf-8")))
+        except ValueError:
+            continue  # 壞掉的行直接略過
+    return records, offset + consumed
+
+
+def drop_through(filename, last_seq):
+    """checkpoint 後呼叫：移除 seq <= last_seq 的紀錄（先寫暫存檔再原子替換）"""
+    path = journal_path(filename)
+    if not os.path.exists(path):
+        return
+    records, _ = read_records(filename)
+    remaining = [rec for rec in records if rec.get("seq", 0) > last_seq]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        for rec in remaining:
+            f.write((json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# ===== 把紀錄套用到活頁簿（openpyxl Workbook 或 sheet_reader.RowBook 皆可）=====
+
+def _rewrite_rows(ws, keep):
+    """只保留 keep(row_values) 為 True 的資料列"""
+    rows = [list(row) for row in ws.iter_rows(min_row=2, values_only=True) if keep(row)]
+    if ws.max_row >= 2:
+        ws.delete_rows(2, ws.max_row)
+    for row in rows:
+        ws.append(row)
+
+
+def _is_alive(timestamp, cutoff):
+    try:
+        return datetime.strptime(timestamp, TIMESTAMP_FORMAT) > cutoff
+    except (TypeError, ValueError):
+        return False  # 無效或壞資料一併清掉
+
+
+def apply_record(wb, rec):
+    """把一筆日誌紀錄套用到活頁簿（就地修改）"""
+    op = rec.get("op")
+    sheet = rec.get("sheet")
+    if sheet not in wb.sheetnames:
+        return
+    ws = wb[sheet]
+
+    if op == "append":
+        ws.append(list(rec["row"]))
+
+    elif op == "update":
+        for r, row in enumerate(ws.iter_rows(min_row=2, max_col=1, values_only=True), start=2):
+            if row[0] == rec["key"]:
+                ws.cell(row=r, column=rec["col"], value=rec["value"])
+
+    # 以下兩種只出現在舊版日誌（暫時鎖定還存在 TempLock 工作表時），見檔案開頭說明
+    elif op == "delete":
+        col, value = rec["col"] - 1, rec["value"]
+        _rewrite_rows(ws, lambda row: not (len(row) > col and row[col] == value))
+
+    elif op == "expire":
+        cutoff = datetime.strptime(rec["cutoff"], TIMESTAMP_FORMAT)
+        _rewrite_rows(ws, lambda row: len(row) >= 6 and _is_alive(row[5], cutoff))
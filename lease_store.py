@@ -0,0 +1,300 @@
+"""
+暫時鎖定（TempLock）的租約儲存區
+
+初學者註解：
+- 以前每建立 / 釋放 / 清除一次暫時鎖，就要改寫整本 Excel；這是整個系統最頻繁的寫入。
+- 現在改存到 Excel 旁邊的小型 SQLite 檔（meeting_schedule.locks.sqlite3），
+  預約用的 Excel 完全不會因為暫時鎖而被寫入。
+- SQLite 本身就有跨程式的檔案鎖，多台 kiosk 同時取得租約也不會互相蓋掉。
+- 租約只記錄「何時鎖的」，過期與否由讀取端依 TTL 判斷（與舊的 TempLock 行為相同）。
+- 過期的租約「讀的時候」就已經看不到了，實際刪除只是整理空間，所以不必每次都做：
+  記憶體裡用最小堆積（heapq）記住已知租約的上鎖時間，堆頂就是最早到期的那一筆。
+  清除時先看堆頂；還沒有任何租約過期就直接結束，不碰資料庫、不寫檔。
+  真的有過期的才用一個 DELETE 一次刪完；剛好有取得租約的交易時，順便在同一個交易裡刪。
+- 所有東西都以 token（一次預約流程）為單位查：
+  資料表的主鍵以 token 開頭，釋放 / 續約 / 查某個 token 的租約只會碰到它自己的幾列；
+  記憶體裡也用 {token: {(日期, 時段, 會議室): 上鎖時間}} 記著，釋放或續約時只改這個 token，
+  過期時只拿掉過期的那幾列（同一個 token 後來才鎖的還留著）；堆積裡對不上的舊紀錄
+  等輪到堆頂時再丟掉，不必重讀整張表。所以尖峰時同時有幾十台在鎖，釋放一次的成本也不會跟著變大。
+"""
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from excel_manager import FILENAME
+
+LOCK_STATUS = "LOCKING"
+
+# ✅ 租約時間：整個系統只用這一組設定
+# - 確認頁會每 HEARTBEAT_SECONDS 秒在背景續約一次，正在填資料的人不會被別台的清除動作踢掉。
+# - kiosk 當機或斷線就不再續約，它鎖住的會議室最慢 LEASE_TTL 秒後自動釋出。
+# - LEASE_TTL 要比 HEARTBEAT_SECONDS 長好幾倍，偶爾漏掉一兩次續約也不會過期。
+LEASE_TTL = 30          # 秒
+HEARTBEAT_SECONDS = 10  # 秒
+
+# 與 TempLock 工作表的欄位對應：UserID(token), Date, SlotID, RoomID, Status, Timestamp
+Lease = namedtuple("Lease", ["token", "date", "slot_id", "room_id", "status", "locked_at"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    token     TEXT    NOT NULL,
+    date      TEXT    NOT NULL,
+    slot_id   INTEGER NOT NULL,
+    room_id           NOT NULL,  -- 不指定型別：保留 Excel 裡原本的 int / 字串
+    status    TEXT    NOT NULL,
+    locked_at REAL    NOT NULL,
+    PRIMARY KEY (token, date, slot_id, room_id)  -- 以 token 開頭：依 token 釋放 / 續約都走這個索引
+);
+CREATE INDEX IF NOT EXISTS idx_leases_date ON leases (date, slot_id, room_id);
+CREATE INDEX IF NOT EXISTS idx_leases_locked_at ON leases (locked_at);
+"""
+
+# 別台 kiosk 建的租約不會進到這台的堆積；每隔這麼久就從資料庫重讀一次
+HEAP_SYNC_INTERVAL = 30  # 秒
+# 堆積裡已釋放 / 已續約的舊紀錄比有效的多出這麼多時，提早重讀
+HEAP_SLACK = 1000
+
+
+def store_path(filename=FILENAME):
+    """meeting_schedule.xlsx → meeting_schedule.locks.sqlite3"""
+    return os.path.splitext(filename)[0] + ".locks.sqlite3"
+
+
+class LeaseStore:
+    def __init__(self, path):
+        self.path = path
+        # isolation_level=None：自己用 BEGIN IMMEDIATE 控制交易，檢查 + 寫入在同一個鎖內完成
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        # 同一條連線會被背景 I/O 執行緒共用；一次只讓一個執行緒使用，交易才不會交錯
+        self._lock = threading.Lock()
+        self._heap = []          # (上鎖時間, token) 的最小堆積
+        self._tokens = {}        # {token: {(date, slot_id, room_id): 上鎖時間}}；堆積裡對不上任何一列的就是舊紀錄
+        self._synced_at = None   # 上次從資料庫重建堆積的時間（time.monotonic）
+
+    def _rows_to_leases(self, rows):
+        return [
+            Lease(token, date, slot_id, room_id, status, datetime.fromtimestamp(locked_at))
+            for token, date, slot_id, room_id, status, locked_at in rows
+        ]
+
+    def acquire(self, token, date, slot_ids, room_id, ttl):
+        """
+        幫 token 鎖住 (date, slot_ids, room_id)。
+        若其中任一時段已被「別的 token」在 ttl 秒內鎖住，什麼都不寫並回傳 False。
+        """
+        return self._apply_one(("acquire", token, date, slot_ids, room_id), ttl)
+
+    def apply_batch(self, ops, ttl):
+        """
+        在同一個交易裡依序執行多個操作，只 commit（寫入磁碟）一次；回傳每個操作的結果。
+        ops 的格式：
+            ("acquire", token, date, slot_ids, room_id) → True / False（同 acquire）
+            ("release", token)                          → 刪除筆數（同 release）
+            ("renew", token)                            → 續約筆數（同 renew）
+        後面的操作看得到前面操作的結果（例如同一批裡兩台搶同一間，只有先到的成功）。
+        每個操作包在自己的 SAVEPOINT 裡：某一個操作出錯（參數不對等）只撤銷它自己，
+        結果清單的那個位置放的是例外物件，同一批其他人的操作照常寫入。
+        """
+        now = time.time()
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                results = []
+                for op in ops:
+                    cur.execute("SAVEPOINT op")
+                    try:
+                        results.append(self._apply_in(cur, now, ttl, op))
+                    except Exception as e:
+                        cur.execute("ROLLBACK TO op")
+                        results.append(e)
+                    cur.execute("RELEASE op")
+                # 反正已經在寫入交易裡：若已知有過期的租約，順便一起刪掉，不另外 commit
+                earliest = self._earliest()
+                purged = earliest is not None and earliest <= now - ttl
+                if purged:
+                    cur.execute("DELETE FROM leases WHERE locked_at <= ?", (now - ttl,))
+                cur.execute("COMMIT")
+                if purged:
+                    self._pop_expired(now - ttl)
+                return results
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def _apply_one(self, op, ttl):
+        """只做一個操作；出錯時直接丟出例外"""
+        result = self.apply_batch([op], ttl)[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _apply_in(self, cur, now, ttl, op):
+        """apply_batch 裡的一個操作"""
+        if op[0] == "acquire":
+            return self._acquire_in(cur, now, ttl, *op[1:])
+        if op[0] == "release":
+            cur.execute("DELETE FROM leases WHERE token = ?", (op[1],))
+            self._tokens.pop(op[1], None)
+            return cur.rowcount
+        if op[0] == "renew":
+            return self._renew_in(cur, now, ttl, op[1])
+        raise ValueError(f"不支援的操作：{op[0]}")
+
+    def _acquire_in(self, cur, now, ttl, token, date, slot_ids, room_id):
+        """acquire 的本體：在已開始的交易中檢查 + 寫入"""
+        slot_ids = [int(sid) for sid in slot_ids]
+        marks = ",".join("?" * len(slot_ids))
+        cur.execute(
+            f"SELECT 1 FROM leases WHERE date = ? AND room_id = ? AND slot_id IN ({marks})"
+            " AND token != ? AND locked_at > ? LIMIT 1",
+            [date, room_id, *slot_ids, token, now - ttl],
+        )
+        if cur.fetchone():
+            return False
+        cur.executemany(
+            "INSERT OR REPLACE INTO leases VALUES (?, ?, ?, ?, ?, ?)",
+            [(token, date, sid, room_id, LOCK_STATUS, now) for sid in slot_ids],
+        )
+        self._track(token, now, [(date, sid, room_id) for sid in slot_ids])
+        return True
+
+    def _renew_in(self, cur, now, ttl, token):
+        """
+        renew 的本體：只續「還沒過期」的租約。
+        已過期的不能續：那間會議室可能已經被別台鎖走，續回來就變成兩台都以為自己鎖住了。
+        """
+        cur.execute("UPDATE leases SET locked_at = ? WHERE token = ? AND locked_at > ?", (now, token, now - ttl))
+        renewed = cur.rowcount
+        if renewed:
+            rows = self._tokens.get(token)
+            if rows is None:
+                # 別台 kiosk 建的、還沒同步進堆積的 token → 用主鍵讀回它自己的幾列
+                rows = {
+                    (date, slot_id, room_id): locked_at
+                    for date, slot_id, room_id, locked_at in cur.execute(
+                        "SELECT date, slot_id, room_id, locked_at FROM leases WHERE token = ?", (token,))
+                }
+                self._tokens[token] = rows
+                for locked_at in set(rows.values()):
+                    heapq.heappush(self._heap, (locked_at, token))
+            self._track(token, now, [key for key, locked_at in rows.items() if locked_at > now - ttl])
+        return renewed
+
+    def renew(self, token, ttl=LEASE_TTL):
+        """把 token 仍有效的租約時間更新為現在；回傳更新筆數（0 代表租約已過期或已釋放）"""
+        return self._apply_one(("renew", token), ttl)
+
+    def release(self, token):
+        """釋放 token 的所有租約；回傳刪除筆數"""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM leases WHERE token = ?", (token,))
+            self._tokens.pop(token, None)
+            return cur.rowcount
+
+    def list_active(self, ttl, date=None, token=None):
+        """列出 ttl 秒內仍有效的租約；可只查某一天，或只查某個 token 的"""
+        cutoff = time.time() - ttl
+        with self._lock:
+            if token is not None:
+                rows = self._conn.execute(
+                    "SELECT * FROM leases WHERE token = ? AND locked_at > ?", (token, cutoff)
+                ).fetchall()
+            elif date is None:
+                rows = self._conn.execute(
+                    "SELECT * FROM leases WHERE locked_at > ?", (cutoff,)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT * FROM leases WHERE date = ? AND locked_at > ?", (date, cutoff)
+                ).fetchall()
+        return self._rows_to_leases(rows)
+
+    def purge_expired(self, ttl):
+        """
+        實際刪掉超過 ttl 秒的租約；回傳刪除筆數。
+        沒有任何租約過期時直接回傳 0，不寫資料庫（頁面重新整理時呼叫也不會產生寫入）。
+        """
+        cutoff = time.time() - ttl
+        with self._lock:
+            if not self._has_expired(cutoff):
+                return 0
+            cur = self._conn.execute("DELETE FROM leases WHERE locked_at <= ?", (cutoff,))
+            self._pop_expired(cutoff)
+            return cur.rowcount
+
+    # ----- 到期時間的最小堆積（呼叫前要先拿 self._lock） -----
+
+    def _sync_heap(self):
+        """以資料庫為準重建堆積：丟掉舊紀錄，補上別台 kiosk 建的租約"""
+        self._tokens = {}
+        for token, date, slot_id, room_id, locked_at in self._conn.execute(
+                "SELECT token, date, slot_id, room_id, locked_at FROM leases"):
+            self._tokens.setdefault(token, {})[(date, slot_id, room_id)] = locked_at
+        # 同一個 token 同一個時間只放一筆
+        self._heap = list({(locked_at, token) for token, rows in self._tokens.items() for locked_at in rows.values()})
+        heapq.heapify(self._heap)
+        self._synced_at = time.monotonic()
+
+    def _track(self, token, locked_at, keys):
+        """記下 token 的這幾列（(date, slot_id, room_id)）在 locked_at 上鎖 / 續約"""
+        if not keys:
+            return
+        rows = self._tokens.setdefault(token, {})
+        for key in keys:
+            rows[key] = locked_at
+        heapq.heappush(self._heap, (locked_at, token))
+        if len(self._heap) > len(self._tokens) + HEAP_SLACK:
+            self._sync_heap()
+
+    def _earliest(self):
+        """最早的上鎖時間；順便丟掉堆頂已釋放 / 已續約的舊紀錄。沒有租約回傳 None"""
+        while self._heap:
+            locked_at, token = self._heap[0]
+            if locked_at in self._tokens.get(token, {}).values():
+                return locked_at
+            heapq.heappop(self._heap)
+        return None
+
+    def _pop_expired(self, cutoff):
+        """拿掉上鎖時間 <= cutoff 的列；token 的列全部過期了才把整個 token 拿掉"""
+        while True:
+            earliest = self._earliest()
+            if earliest is None or earliest > cutoff:
+                return
+            _, token = heapq.heappop(self._heap)
+            rows = self._tokens[token]
+            for key in [key for key, locked_at in rows.items() if locked_at <= cutoff]:
+                del rows[key]
+            if not rows:
+                del self._tokens[token]
+
+    def _has_expired(self, cutoff):
+        """是否有上鎖時間 <= cutoff 的租約；大部分情況只看堆頂，不查資料庫"""
+        if self._synced_at is None or time.monotonic() - self._synced_at >= HEAP_SYNC_INTERVAL:
+            self._sync_heap()
+        earliest = self._earliest()
+        if earliest is None or earliest > cutoff:
+            return False
+        # 堆頂可能是別台 kiosk 已經釋放或續約的租約 → 用索引確認一下（只讀不寫）
+        if self._conn.execute("SELECT 1 FROM leases WHERE locked_at <= ? LIMIT 1", (cutoff,)).fetchone():
+            return True
+        self._pop_expired(cutoff)
+        return False
+
+_stores = {}  # {絕對路徑: LeaseStore}
+_stores_lock = threading.Lock()
+
+
+def get_store(filename=FILENAME):
+    """取得某個 Excel 對應的租約儲存區（每個行程共用一條連線）"""
+    path = os.path.abspath(store_path(filename))
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = LeaseStore(path)
+        return _stores[path]
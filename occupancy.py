@@ -0,0 +1,240 @@
+"""
+會議室佔用索引（bitmask）
+
+初學者註解：
+- Schedule 的時段欄是 "1,2,3" 這種字串，以前每次查衝突都要整張表重切字串、轉 int、做集合交集。
+- 這裡改成一次掃完 Schedule 與 FixedBooking，建立：
+    一般預約 {(日期, 會議室): 整數 mask}
+    固定預約 {(星期, 會議室): 整數 mask}
+  第 n 個 bit 為 1 代表「時段 n 已被佔用」，衝突檢查就只剩一次 AND。
+- 固定預約另外依「星期 → 時段 → 會議室」存一份明細（流水號、預約人、用途），
+  固定預約衝突清單、本週總覽直接查字典，不必每次重掃 FixedBooking。
+- 寫入成功後呼叫 after_commit() 就地更新索引，不必為了一筆新預約重掃整張表。
+"""
+import os
+import threading
+from datetime import datetime
+
+import tracing
+from excel_manager import FILENAME, get_workbook, workbook_version, last_commit, snapshot_lock
+
+WEEKDAYS = ["週一", "週二", "週三", "週四", "週五", "週六", "週日"]
+
+
+def slots_to_mask(slot_ids):
+    """[1, 3] → 0b1010"""
+    mask = 0
+    for sid in slot_ids:
+        mask |= 1 << int(sid)
+    return mask
+
+
+def mask_to_slots(mask):
+    """0b1010 → [1, 3]"""
+    slots = []
+    sid = 0
+    while mask:
+        if mask & 1:
+            slots.append(sid)
+        mask >>= 1
+        sid += 1
+    return slots
+
+
+def parse_slot_str(slot_str):
+    """把 Schedule 的 "1,2,3" 轉成時段清單；格式錯誤時回傳空清單"""
+    if slot_str is None or slot_str == "":
+        return []
+    try:
+        return [int(s) for s in str(slot_str).split(",")]
+    except ValueError:
+        return []
+
+
+def fixed_entry(weekday_str, slot_id, room_id):
+    """
+    固定預約的一列 → (星期, 時段, 會議室)；格式不對（星期不是字串、時段不是數字…）回傳 None。
+    建索引與取消時用同一套規則，取消才扣得掉當初加進去的那一筆。
+    """
+    if not isinstance(weekday_str, str) or not room_id:
+        return None
+    try:
+        return weekday_str.strip(), int(slot_id), room_id
+    except (TypeError, ValueError):
+        return None
+
+
+def weekday_of(date_str):
+    """'2025/07/29' → '週二'"""
+    return WEEKDAYS[datetime.strptime(date_str, "%Y/%m/%d").weekday()]
+
+
+class OccupancyIndex:
+    """
+    佔用索引本體。
+    - 內部對每個 key 記錄「每個時段被幾筆預約佔用」，取消時才不會誤清掉重疊的另一筆。
+    - masks 是由計數推出來的結果，查詢時直接用。
+    """
+
+    def __init__(self):
+        self._booked_counts = {}  # {(date, room_id): {slot_id: 筆數}}
+        self._booked_masks = {}   # {(date, room_id): mask}
+        self._fixed_counts = {}   # {(weekday, room_id): {slot_id: 筆數}}
+        self._fixed_masks = {}    # {(weekday, room_id): mask}
+        self._fixed_week = {}     # {weekday: {slot_id: {room_id: {booking_id: (user_id, purpose)}}}}
+
+    @classmethod
+    def from_workbook(cls, wb):
+        fixed = wb["FixedBooking"].iter_rows(min_row=2, values_only=True) if "FixedBooking" in wb.sheetnames else []
+        return cls.from_rows(wb["Schedule"].iter_rows(min_row=2, values_only=True), fixed)
+
+    @classmethod
+    @tracing.traced("OccupancyIndex.build", cat="query")
+    def from_rows(cls, schedule_rows, fixed_rows):
+        """
+        用 Schedule / FixedBooking 的資料列建立索引。
+        每一列的欄位順序與 Excel 相同（storage 的 Booking / FixedBooking namedtuple 也可以直接傳進來）。
+        """
+        index = cls()
+        for row in schedule_rows:
+            date, slot_str, room_id, canceled = row[1], row[2], row[3], row[6]
+            if canceled or not date or not room_id:
+                continue
+            index.add_booking(date, parse_slot_str(slot_str), room_id)
+
+        for row in fixed_rows:
+            if len(row) < 4:
+                continue
+            if len(row) >= 7 and row[6] is True:
+                continue  # ✅ 已取消的固定預約
+            entry = fixed_entry(*row[1:4])
+            if entry is None:
+                continue
+            wday, sid, rid = entry
+            user_id, purpose = (row[4], row[5]) if len(row) >= 6 else (None, None)
+            index.add_fixed(wday, [sid], rid, [row[0]], user_id, purpose)
+        return index
+
+    # --------- 內部工具 ---------
+
+    @staticmethod
+    def _bump(counts, masks, key, slot_ids, delta):
+        slot_counts = counts.setdefault(key, {})
+        mask = masks.get(key, 0)
+        for sid in slot_ids:
+            sid = int(sid)
+            n = slot_counts.get(sid, 0) + delta
+            if n > 0:
+                slot_counts[sid] = n
+                mask |= 1 << sid
+            else:
+                slot_counts.pop(sid, None)
+                mask &= ~(1 << sid)
+        if mask:
+            masks[key] = mask
+        else:
+            masks.pop(key, None)
+            counts.pop(key, None)
+
+    # --------- 增量更新 ---------
+
+    def add_booking(self, date, slot_ids, room_id):
+        self._bump(self._booked_counts, self._booked_masks, (date, room_id), slot_ids, +1)
+
+    def remove_booking(self, date, slot_ids, room_id):
+        self._bump(self._booked_counts, self._booked_masks, (date, room_id), slot_ids, -1)
+
+    def add_fixed(self, weekday_str, slot_ids, room_id, booking_ids, user_id=None, purpose=None):
+        """booking_ids 與 slot_ids 一一對應（固定預約每個時段一筆）"""
+        weekday_str = weekday_str.strip()
+        self._bump(self._fixed_counts, self._fixed_masks, (weekday_str, room_id), slot_ids, +1)
+        week = self._fixed_week.setdefault(weekday_str, {})
+        for sid, bid in zip(slot_ids, booking_ids):
+            week.setdefault(int(sid), {}).setdefault(room_id, {})[bid] = (user_id, purpose)
+
+    def remove_fixed(self, weekday_str, slot_ids, room_id, booking_ids):
+        weekday_str = weekday_str.strip()
+        self._bump(self._fixed_counts, self._fixed_masks, (weekday_str, room_id), slot_ids, -1)
+        week = self._fixed_week.get(weekday_str, {})
+        for sid, bid in zip(slot_ids, booking_ids):
+            rooms = week.get(int(sid), {})
+            entries = rooms.get(room_id, {})
+            entries.pop(bid, None)
+            # 空了就整層拿掉，fixed_week() 才不會列出沒有預約的會議室
+            if not entries:
+                rooms.pop(room_id, None)
+            if not rooms:
+                week.pop(int(sid), None)
+
+    # --------- 查詢 ---------
+
+    def booked_mask(self, date, room_id):
+        """一般預約佔用的時段 mask"""
+        return self._booked_masks.get((date, room_id), 0)
+
+    def fixed_mask(self, weekday_str, room_id):
+        """固定預約佔用的時段 mask"""
+        return self._fixed_masks.get((weekday_str, room_id), 0)
+
+    def taken_mask(self, date, room_id):
+        """某天某會議室被佔用的時段（一般 + 固定）"""
+        return self.booked_mask(date, room_id) | self.fixed_mask(weekday_of(date), room_id)
+
+    def fixed_entries(self, weekday_str, slot_id, room_id):
+        """某星期、時段、會議室的固定預約明細 {booking_id: (user_id, purpose)}"""
+        return self._fixed_week.get(weekday_str, {}).get(int(slot_id), {}).get(room_id, {})
+
+    def fixed_week(self, weekday_str):
+        """某星期所有固定預約 {slot_id: {room_id: {booking_id: (user_id, purpose)}}}（唯讀，請勿修改）"""
+        return self._fixed_week.get(weekday_str, {})
+
+    def is_booked(self, date, slot_ids, room_id):
+        return bool(self.booked_mask(date, room_id) & slots_to_mask(slot_ids))
+
+    def is_fixed_booked(self, weekday_str, slot_ids, room_id):
+        return bool(self.fixed_mask(weekday_str, room_id) & slots_to_mask(slot_ids))
+
+    def is_taken(self, date, slot_ids, room_id):
+        return bool(self.taken_mask(date, room_id) & slots_to_mask(slot_ids))
+
+
+# ===== 依檔案快取索引 =====
+_indexes = {}  # {絕對路徑: (活頁簿版本, OccupancyIndex)}
+_index_lock = threading.RLock()  # 背景執行緒也會查索引
+
+
+def get_index(filename=FILENAME):
+    """取得與目前內容版本一致的佔用索引；被別的程式改過才重建"""
+    key = os.path.abspath(filename)
+    with _index_lock:
+        # 版本與內容要在同一把鎖內取得，索引才不會記錯版本
+        with snapshot_lock:
+            version = workbook_version(filename)
+            cached = _indexes.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            index = OccupancyIndex.from_workbook(get_workbook(filename))
+        _indexes[key] = (version, index)
+        return index
+
+
+def after_commit(filename=FILENAME, update=None):
+    """
+    寫入（commit_records / safe_save）成功後呼叫。
+    - 索引若正好對應「寫入前」的版本，就用 update(index) 就地套用這次的變更，並對到新的版本。
+    - 對不上（例如檔案中途被其他程式改過）就丟掉，下次查詢時重建。
+    - 只改 TempLock 之類不影響佔用的寫入，update 傳 None 即可。
+    """
+    key = os.path.abspath(filename)
+    with _index_lock:
+        cached = _indexes.get(key)
+        commit = last_commit(filename)
+        if cached is None or commit is None:
+            return
+        before, after = commit
+        if before is None or cached[0] != before:
+            _indexes.pop(key, None)
+            return
+        if update is not None:
+            update(cached[1])
+        _indexes[key] = (after, cached[1])
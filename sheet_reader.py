@@ -0,0 +1,134 @@
+"""
+唯讀查詢用的輕量活頁簿
+
+初學者註解：
+- load_workbook() 預設是「編輯模式」：每個儲存格都建一個 Cell 物件、連樣式一起讀進來，
+  大檔案又慢又吃記憶體；可是查詢只需要每一列的值。
+- 這裡用 openpyxl 的 read_only 模式一列一列串流讀出 values，讀完立刻關檔，
+  每列只存成一個 list，查詢時回傳 tuple。
+- RowBook / RowSheet 只實作查詢與日誌會用到的那一小部分 API
+  （sheetnames、wb[名稱]、iter_rows(min_row=2, values_only=True)、append、cell、delete_rows），
+  所以原本的讀取程式不用改。
+- 只有 checkpoint / 初始化這種要「存回 Excel」的地方，才用完整的 load_workbook。
+- 讀取引擎可以切換（READ_ENGINE）：
+    "fast"    ：fast_xlsx 直接解析 zip 裡的 XML，最快；看不懂的檔案會自動改用 openpyxl
+    "openpyxl"：openpyxl 的 read_only 模式
+"""
+from openpyxl import load_workbook
+
+import fast_xlsx
+import tracing
+
+READ_ENGINE = "fast"
+
+
+class RowSheet:
+    """一張工作表：rows[0] 是標題列，對應 Excel 第 1 列"""
+
+    def __init__(self, title, rows=None):
+        self.title = title
+        self._rows = [list(row) for row in rows or []]
+        self.max_column = max((len(row) for row in self._rows), default=0)
+
+    @property
+    def max_row(self):
+        return len(self._rows)
+
+    def iter_rows(self, min_row=1, max_row=None, max_col=None, values_only=True):
+        """與 openpyxl 相同：每列補齊到同樣欄數；只支援 values_only"""
+        width = self.max_column if max_col is None else max_col
+        end = len(self._rows) if max_row is None else min(max_row, len(self._rows))
+        for row in self._rows[min_row - 1:end]:
+            if len(row) >= width:
+                yield tuple(row[:width])
+            else:
+                yield tuple(row) + (None,) * (width - len(row))
+
+    def append(self, values):
+        row = list(values)
+        self._rows.append(row)
+        self.max_column = max(self.max_column, len(row))
+
+    def cell(self, row, column, value=None):
+        """只支援寫值：cell(row=列, column=欄, value=值)"""
+        while len(self._rows) < row:
+            self._rows.append([])
+        target = self._rows[row - 1]
+        if len(target) < column:
+            target.extend([None] * (column - len(target)))
+        target[column - 1] = value
+        self.max_column = max(self.max_column, column)
+
+    def delete_rows(self, idx, amount=1):
+        del self._rows[idx - 1:idx - 1 + amount]
+
+
+class RowBook:
+    """多張 RowSheet 的集合，用法與 openpyxl Workbook 相同：wb["Schedule"]"""
+
+    def __init__(self, sheets=None):
+        self._sheets = {}
+        for sheet in sheets or []:
+            self._sheets[sheet.title] = sheet
+
+    @property
+    def sheetnames(self):
+        return list(self._sheets)
+
+    def __getitem__(self, name):
+        return self._sheets[name]
+
+    def __contains__(self, name):
+        return name in self._sheets
+
+    def create_sheet(self, title):
+        self._sheets[title] = RowSheet(title)
+        return self._sheets[title]
+
+
+@tracing.traced(cat="storage")
+def load_rowbook(filename, engine=None, fallback=True, sheets=None):
+    """
+    讀整本活頁簿，回傳 RowBook（檔案在回傳前就已關閉）；engine 預設用 READ_ENGINE。
+    fallback=False 時，fast 引擎讀不了就直接丟出錯誤，不改用 openpyxl。
+    sheets：只讀這些工作表；None 代表全部
+    """
+    if (engine or READ_ENGINE) == "fast":
+        try:
+            return RowBook([
+                RowSheet(name, _trim(rows))
+                for name, rows in fast_xlsx.read_workbook_rows(filename, names=sheets)
+            ])
+        except Exception:
+            if not fallback:
+                raise
+            # 含公式、格式特殊或檔案損壞 → 交給 openpyxl（真的壞掉時由它丟出錯誤）
+    return _load_rowbook_openpyxl(filename, sheets)
+
+
+def _load_rowbook_openpyxl(filename, sheets=None):
+    wb = load_workbook(filename, read_only=True)
+    try:
+        return RowBook([
+            RowSheet(name, _trim(wb[name].iter_rows(values_only=True)))
+            for name in wb.sheetnames
+            if sheets is None or name in sheets
+        ])
+    finally:
+        wb.close()
+
+
+def rowbook_from_workbook(wb):
+    """把記憶體中的 openpyxl Workbook（例如剛存檔的那份）轉成 RowBook，不必重讀檔案"""
+    return RowBook([
+        RowSheet(ws.title, _trim(ws.iter_rows(values_only=True)))
+        for ws in wb.worksheets
+    ])
+
+
+def _trim(rows):
+    """去掉尾端整列空白（read_only 模式有時會多讀出格式殘留的空列）"""
+    rows = list(rows)
+    while rows and all(v is None for v in rows[-1]):
+        rows.pop()
+    return rows
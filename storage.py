@@ -0,0 +1,636 @@
+"""
+儲存後端（repository）
+
+初學者註解：
+- 商業邏輯原本直接用欄位位置讀 Excel（row[1]、row[6]...），換儲存方式就得全部改。
+- 這裡定義一組固定的操作：會議室、時段、一般預約、固定預約、暫時鎖定（租約），
+  由不同的後端實作：
+    ExcelRepository  ：現行的 meeting_schedule.xlsx（+ 異動日誌）
+    SqliteRepository ：有索引的 SQLite 檔，適合累積多年資料的環境
+- 兩邊用同一組 namedtuple 交換資料，欄位順序與 excel_manager.REQUIRED_SHEETS 相同。
+- booking_core 的查詢、衝突檢查、寫入、暫時鎖定全部透過這裡（get_repository）做，
+  畫面、伺服器、總覽都不再自己讀 Excel；衝突檢查與寫入的邏輯也只寫在各後端裡一份。
+- 用哪個後端由設定決定：環境變數 BOOKING_STORE 指定資料檔（預設 meeting_schedule.xlsx），
+  副檔名 .sqlite3 / .sqlite / .db → SQLite，其餘 → Excel。
+- import_xlsx / export_xlsx 可以在兩者之間搬資料；也可以只匯入 MeetingRooms、TimeSlots，
+  讓管理者繼續用 Excel 維護會議室。
+
+指令列用法：
+    python storage.py import meeting_schedule.xlsx meeting_schedule.sqlite3
+    python storage.py import meeting_schedule.xlsx meeting_schedule.sqlite3 MeetingRooms TimeSlots
+    python storage.py export meeting_schedule.sqlite3 匯出.xlsx
+"""
+import os
+import sqlite3
+import sys
+import threading
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from datetime import datetime
+
+from openpyxl import Workbook
+
+import lease_store
+import occupancy
+from excel_manager import (
+    FILENAME, REQUIRED_SHEETS, get_workbook, commit_if_unchanged, allocate_ids, safe_save,
+    init_excel_file, checkpoint, workbook_version, snapshot_lock,
+)
+
+# ✅ 資料檔（決定用哪個後端）：設定環境變數 BOOKING_STORE，例如 meeting_schedule.sqlite3
+STORE_ENV = "BOOKING_STORE"
+DEFAULT_STORE = os.environ.get(STORE_ENV) or FILENAME
+SQLITE_SUFFIXES = (".sqlite3", ".sqlite", ".db")
+
+# 欄位順序與 REQUIRED_SHEETS 相同，Excel 的一列可以直接 Room._make(row[:8])
+Room = namedtuple("Room", ["room_id", "name", "account", "password", "link", "usage", "disabled", "external"])
+Slot = namedtuple("Slot", ["slot_id", "time_range", "disabled", "note"])
+Booking = namedtuple("Booking", ["booking_id", "date", "slot_str", "room_id", "user_id", "purpose", "canceled"])
+FixedBooking = namedtuple("FixedBooking", ["booking_id", "weekday", "slot_id", "room_id", "user_id", "purpose", "canceled"])
+
+_ROW_TYPES = {
+    "MeetingRooms": Room,
+    "TimeSlots": Slot,
+    "Schedule": Booking,
+    "FixedBooking": FixedBooking,
+}
+
+
+def is_true(value):
+    """Excel 裡的布林欄位可能是 True 或 "TRUE" 字串"""
+    return value is True or str(value).strip().upper() == "TRUE"
+
+
+def _pad(row, width):
+    row = tuple(row[:width])
+    return row + (None,) * (width - len(row))
+
+
+class Repository(ABC):
+    """所有後端都要提供的操作"""
+
+    # --------- 開始 / 結束 ---------
+    @abstractmethod
+    def prepare(self):
+        """程式啟動時呼叫：建立缺少的工作表 / 資料表"""
+
+    @abstractmethod
+    def checkpoint(self):
+        """程式結束前呼叫：把還沒落地的異動整理進主檔；成功回傳 True"""
+
+    # --------- 讀取 ---------
+    @abstractmethod
+    def rooms(self):
+        """全部會議室（含停用）"""
+
+    @abstractmethod
+    def time_slots(self):
+        """全部時段（含停用）"""
+
+    @abstractmethod
+    def bookings(self, date=None, user_id=None):
+        """一般預約（含已取消）；可依日期或預約人篩選"""
+
+    @abstractmethod
+    def fixed_bookings(self, weekday=None, user_id=None):
+        """固定預約（含已取消）；可依星期或預約人篩選"""
+
+    @abstractmethod
+    def occupancy(self):
+        """與目前資料一致的佔用索引（occupancy.OccupancyIndex），衝突檢查與空房查詢用"""
+
+    # --------- 寫入 ---------
+    @abstractmethod
+    def add_booking(self, date, slot_ids, room_id, user_id, purpose):
+        """檢查衝突並新增一般預約；成功回傳流水號，時段已被佔用回傳 None，寫入失敗丟出 OSError"""
+
+    @abstractmethod
+    def cancel_bookings(self, booking_ids):
+        """取消一般預約；回傳這次真正被取消的流水號"""
+
+    @abstractmethod
+    def add_fixed_bookings(self, weekday, slot_ids, room_id, user_id, purpose):
+        """檢查衝突並新增固定預約（每個時段一筆）；成功回傳流水號清單，衝突回傳 None"""
+
+    @abstractmethod
+    def cancel_fixed_bookings(self, booking_ids):
+        """取消固定預約；回傳這次真正被取消的流水號"""
+
+    # --------- 暫時鎖定 ---------
+    @property
+    @abstractmethod
+    def leases(self):
+        """租約儲存區（lease_store.LeaseStore）"""
+
+
+def _is_future_weekday(date, weekday, today):
+    """一般預約的日期是否在今天（含）之後、且是指定的星期；日期格式不對的舊資料一律不算"""
+    if not isinstance(date, str) or date < today:
+        return False
+    try:
+        return occupancy.weekday_of(date) == weekday
+    except ValueError:
+        return False
+
+
+def _release_fixed(index, booking_id, weekday, slot_id, room_id):
+    """取消固定預約後從索引扣掉；與建索引時同樣經過 occupancy.fixed_entry，格式不對的列當初就沒加進去"""
+    entry = occupancy.fixed_entry(weekday, slot_id, room_id)
+    if entry is not None:
+        wday, sid, rid = entry
+        index.remove_fixed(wday, [sid], rid, [booking_id])
+
+
+# ===== Excel 後端 =====
+
+class ExcelRepository(Repository):
+    """現行的 Excel + 異動日誌；寫入一律走 commit_if_unchanged（版本比對）"""
+
+    def __init__(self, filename=FILENAME):
+        self.filename = filename
+        self._cache = {}  # {工作表: (活頁簿版本, [namedtuple, ...])}；同一版本只轉換一次（唯讀，請勿修改）
+
+    def prepare(self):
+        init_excel_file(self.filename)
+
+    def checkpoint(self):
+        return checkpoint(self.filename)
+
+    def _rows(self, sheet):
+        # 版本與內容在同一把鎖內取得，快取才不會記錯版本
+        with snapshot_lock:
+            version = workbook_version(self.filename)
+            cached = self._cache.get(sheet)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            row_type = _ROW_TYPES[sheet]
+            width = len(row_type._fields)
+            wb = get_workbook(self.filename)
+            rows = []
+            if sheet in wb.sheetnames:
+                rows = [
+                    row_type._make(_pad(row, width))
+                    for row in wb[sheet].iter_rows(min_row=2, values_only=True)
+                    if row and row[0] is not None
+                ]
+            self._cache[sheet] = (version, rows)
+            return rows
+
+    def rooms(self):
+        return self._rows("MeetingRooms")
+
+    def time_slots(self):
+        return self._rows("TimeSlots")
+
+    def bookings(self, date=None, user_id=None):
+        return [
+            b for b in self._rows("Schedule")
+            if (date is None or b.date == date) and (user_id is None or str(b.user_id) == str(user_id))
+        ]
+
+    def fixed_bookings(self, weekday=None, user_id=None):
+        return [
+            f for f in self._rows("FixedBooking")
+            if (weekday is None or f.weekday == weekday) and (user_id is None or str(f.user_id) == str(user_id))
+        ]
+
+    def occupancy(self):
+        return occupancy.get_index(self.filename)
+
+    def add_booking(self, date, slot_ids, room_id, user_id, purpose):
+        slot_ids = [int(sid) for sid in slot_ids]
+        new_ids = []
+
+        def build(wb):
+            if occupancy.get_index(self.filename).is_taken(date, slot_ids, room_id):
+                return None
+            new_ids[:] = allocate_ids(self.filename, "Schedule")
+            row = [new_ids[0], date, ",".join(map(str, slot_ids)), room_id, user_id, purpose, False]
+            return [{"op": "append", "sheet": "Schedule", "row": row}]
+
+        result = commit_if_unchanged(self.filename, build)
+        if result is None:
+            return None
+        if not result:
+            raise OSError(f"無法寫入 {self.filename}")
+        occupancy.after_commit(self.filename, lambda index: index.add_booking(date, slot_ids, room_id))
+        return new_ids[0]
+
+    def _cancel(self, sheet, booking_ids, release):
+        wanted = set(booking_ids)
+        canceled = []
+
+        def build(wb):
+            canceled.clear()
+            for row in self._rows(sheet):
+                if row.booking_id in wanted and not row.canceled:
+                    canceled.append(row)
+            if not canceled:
+                return None
+            return [
+                {"op": "update", "sheet": sheet, "key": row.booking_id, "col": 7, "value": True}
+                for row in canceled
+            ]
+
+        result = commit_if_unchanged(self.filename, build)
+        if result is None:
+            return []
+        if not result:
+            raise OSError(f"無法寫入 {self.filename}")
+
+        def _release(index):
+            for row in canceled:
+                release(index, row)
+        occupancy.after_commit(self.filename, _release)
+        return [row.booking_id for row in canceled]
+
+    def cancel_bookings(self, booking_ids):
+        return self._cancel(
+            "Schedule", booking_ids,
+            lambda index, b: index.remove_booking(b.date, occupancy.parse_slot_str(b.slot_str), b.room_id),
+        )
+
+    def add_fixed_bookings(self, weekday, slot_ids, room_id, user_id, purpose):
+        slot_ids = [int(sid) for sid in slot_ids]
+        new_ids = []
+
+        def build(wb):
+            index = occupancy.get_index(self.filename)
+            if index.is_fixed_booked(weekday, slot_ids, room_id):
+                return None
+            today = datetime.today().strftime("%Y/%m/%d")
+            for b in self._rows("Schedule"):
+                if b.canceled or b.room_id != room_id or not _is_future_weekday(b.date, weekday, today):
+                    continue
+                if set(occupancy.parse_slot_str(b.slot_str)) & set(slot_ids):
+                    return None
+            new_ids[:] = allocate_ids(self.filename, "FixedBooking", len(slot_ids))
+            return [
+                {"op": "append", "sheet": "FixedBooking",
+                 "row": [bid, weekday, sid, room_id, user_id, purpose, False]}
+                for bid, sid in zip(new_ids, slot_ids)
+            ]
+
+        result = commit_if_unchanged(self.filename, build)
+        if result is None:
+            return None
+        if not result:
+            raise OSError(f"無法寫入 {self.filename}")
+        occupancy.after_commit(
+            self.filename, lambda index: index.add_fixed(weekday, slot_ids, room_id, new_ids, user_id, purpose))
+        return list(new_ids)
+
+    def cancel_fixed_bookings(self, booking_ids):
+        return self._cancel(
+            "FixedBooking", booking_ids,
+            lambda index, f: _release_fixed(index, f.booking_id, f.weekday, f.slot_id, f.room_id),
+        )
+
+    @property
+    def leases(self):
+        return lease_store.get_store(self.filename)
+
+
+# ===== SQLite 後端 =====
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rooms (
+    room_id PRIMARY KEY, name, account, password, link, usage, disabled, external
+);
+CREATE TABLE IF NOT EXISTS time_slots (
+    slot_id INTEGER PRIMARY KEY, time_range, disabled, note
+);
+CREATE TABLE IF NOT EXISTS schedule (
+    booking_id INTEGER PRIMARY KEY, date TEXT, slot_str TEXT, room_id, user_id, purpose,
+    canceled INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_schedule_date ON schedule (date);
+CREATE INDEX IF NOT EXISTS idx_schedule_user ON schedule (user_id);
+-- 一筆預約拆成每個時段一列，衝突檢查直接查索引
+CREATE TABLE IF NOT EXISTS schedule_slots (
+    booking_id INTEGER NOT NULL, date TEXT NOT NULL, weekday TEXT NOT NULL,
+    slot_id INTEGER NOT NULL, room_id NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_schedule_slots_date ON schedule_slots (date, room_id, slot_id);
+CREATE INDEX IF NOT EXISTS idx_schedule_slots_weekday ON schedule_slots (weekday, room_id, slot_id);
+CREATE TABLE IF NOT EXISTS fixed_booking (
+    booking_id INTEGER PRIMARY KEY, weekday TEXT, slot_id INTEGER, room_id, user_id, purpose,
+    canceled INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_fixed_weekday ON fixed_booking (weekday, room_id, slot_id);
+CREATE INDEX IF NOT EXISTS idx_fixed_user ON fixed_booking (user_id);
+"""
+
+# 工作表 → (資料表, 欄數)
+_TABLES = {
+    "MeetingRooms": ("rooms", 8),
+    "TimeSlots": ("time_slots", 4),
+    "Schedule": ("schedule", 7),
+    "FixedBooking": ("fixed_booking", 7),
+}
+
+
+class SqliteRepository(Repository):
+    """有索引的 SQLite 後端；租約與 Excel 後端一樣放在旁邊的 .locks.sqlite3"""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        # 租約不能和預約放同一個檔案：續約、釋放很頻繁，每次都會改到 PRAGMA data_version，
+        # 佔用索引就會一直被判定過期、整個重建
+        self._leases = lease_store.get_store(path)
+        self._lock = threading.RLock()  # 同一條連線給畫面與背景執行緒共用，交易不能交錯
+        self._writes = 0    # 自己 commit 的次數（PRAGMA data_version 不會因為自己的寫入改變）
+        self._index = None  # ((data_version, _writes), OccupancyIndex)
+
+    def prepare(self):
+        pass  # 資料表在連線時就已建立
+
+    def checkpoint(self):
+        return True  # 每次寫入都已經 commit，沒有要整理的東西
+
+    def _select(self, row_type, sql, params=()):
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        if row_type in (Booking, FixedBooking):
+            rows = [row[:-1] + (bool(row[-1]),) for row in rows]
+        return [row_type._make(row) for row in rows]
+
+    def rooms(self):
+        return self._select(Room, "SELECT * FROM rooms ORDER BY rowid")
+
+    def time_slots(self):
+        return self._select(Slot, "SELECT * FROM time_slots ORDER BY slot_id")
+
+    def bookings(self, date=None, user_id=None):
+        sql, params = "SELECT * FROM schedule WHERE 1=1", []
+        if date is not None:
+            sql += " AND date = ?"
+            params.append(date)
+        if user_id is not None:
+            sql += " AND CAST(user_id AS TEXT) = ?"
+            params.append(str(user_id))
+        return self._select(Booking, sql + " ORDER BY booking_id", params)
+
+    def fixed_bookings(self, weekday=None, user_id=None):
+        sql, params = "SELECT * FROM fixed_booking WHERE 1=1", []
+        if weekday is not None:
+            sql += " AND weekday = ?"
+            params.append(weekday)
+        if user_id is not None:
+            sql += " AND CAST(user_id AS TEXT) = ?"
+            params.append(str(user_id))
+        return self._select(FixedBooking, sql + " ORDER BY booking_id", params)
+
+    def _data_version(self):
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def occupancy(self):
+        """別的連線寫入過（data_version 變了）或自己寫入後對不上，才重建索引"""
+        with self._lock:
+            key = (self._data_version(), self._writes)
+            if self._index is not None and self._index[0] == key:
+                return self._index[1]
+            index = occupancy.OccupancyIndex.from_rows(self.bookings(), self.fixed_bookings())
+            self._index = (key, index)
+            return index
+
+    def _transaction(self, work, update=None):
+        """
+        BEGIN IMMEDIATE：檢查 + 寫入在同一把鎖內，多台 kiosk 也不會撞號或重複預約。
+        update(index, result) 用來把這次寫入就地套用到佔用索引（同 occupancy.after_commit）。
+        """
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(cur)
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            cur.execute("COMMIT")
+            self._after_write(update, result)
+            return result
+
+    def _after_write(self, update, result):
+        cached = self._index
+        self._writes += 1
+        if cached is None:
+            return
+        version = self._data_version()
+        # 寫入前若有別的連線改過資料，索引就不是「寫入前」的樣子，丟掉重建
+        if cached[0] != (version, self._writes - 1) or update is None:
+            self._index = None
+            return
+        if result:
+            update(cached[1], result)
+        self._index = ((version, self._writes), cached[1])
+
+    @staticmethod
+    def _insert_booking(cur, row):
+        booking_id, date, slot_str, room_id = row[0], row[1], row[2], row[3]
+        cur.execute("INSERT OR REPLACE INTO schedule VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (*row[:6], 1 if is_true(row[6]) else 0))
+        cur.execute("DELETE FROM schedule_slots WHERE booking_id = ?", (booking_id,))
+        try:
+            weekday = occupancy.weekday_of(date)
+        except (TypeError, ValueError):
+            return  # 日期格式不對的舊資料：保留原始列，但不參與衝突檢查
+        cur.executemany(
+            "INSERT INTO schedule_slots VALUES (?, ?, ?, ?, ?)",
+            [(booking_id, date, weekday, sid, room_id) for sid in occupancy.parse_slot_str(slot_str)],
+        )
+
+    def add_booking(self, date, slot_ids, room_id, user_id, purpose):
+        slot_ids = [int(sid) for sid in slot_ids]
+        marks = ",".join("?" * len(slot_ids))
+
+        def work(cur):
+            cur.execute(
+                f"SELECT 1 FROM schedule_slots s JOIN schedule b USING (booking_id)"
+                f" WHERE s.date = ? AND s.room_id = ? AND s.slot_id IN ({marks}) AND b.canceled = 0 LIMIT 1",
+                [date, room_id, *slot_ids],
+            )
+            if cur.fetchone():
+                return None
+            cur.execute(
+                f"SELECT 1 FROM fixed_booking WHERE weekday = ? AND room_id = ? AND slot_id IN ({marks})"
+                " AND canceled = 0 LIMIT 1",
+                [occupancy.weekday_of(date), room_id, *slot_ids],
+            )
+            if cur.fetchone():
+                return None
+            booking_id = cur.execute("SELECT COALESCE(MAX(booking_id), 0) + 1 FROM schedule").fetchone()[0]
+            self._insert_booking(cur, (booking_id, date, ",".join(map(str, slot_ids)), room_id, user_id, purpose, False))
+            return booking_id
+
+        return self._transaction(work, lambda index, _: index.add_booking(date, slot_ids, room_id))
+
+    def _cancel(self, table, columns, booking_ids, release):
+        ids = list(booking_ids)
+        if not ids:
+            return []
+        marks = ",".join("?" * len(ids))
+
+        def work(cur):
+            rows = cur.execute(
+                f"SELECT {columns} FROM {table} WHERE booking_id IN ({marks}) AND canceled = 0", ids
+            ).fetchall()
+            cur.execute(f"UPDATE {table} SET canceled = 1 WHERE booking_id IN ({marks})", ids)
+            return rows
+
+        def _release(index, rows):
+            for row in rows:
+                release(index, row)
+
+        return [row[0] for row in self._transaction(work, _release)]
+
+    def cancel_bookings(self, booking_ids):
+        return self._cancel(
+            "schedule", "booking_id, date, slot_str, room_id", booking_ids,
+            lambda index, row: index.remove_booking(row[1], occupancy.parse_slot_str(row[2]), row[3]),
+        )
+
+    def add_fixed_bookings(self, weekday, slot_ids, room_id, user_id, purpose):
+        slot_ids = [int(sid) for sid in slot_ids]
+        marks = ",".join("?" * len(slot_ids))
+
+        def work(cur):
+            cur.execute(
+                f"SELECT 1 FROM fixed_booking WHERE weekday = ? AND room_id = ? AND slot_id IN ({marks})"
+                " AND canceled = 0 LIMIT 1",
+                [weekday, room_id, *slot_ids],
+            )
+            if cur.fetchone():
+                return None
+            cur.execute(
+                f"SELECT 1 FROM schedule_slots s JOIN schedule b USING (booking_id)"
+                f" WHERE s.weekday = ? AND s.room_id = ? AND s.slot_id IN ({marks})"
+                " AND s.date >= ? AND b.canceled = 0 LIMIT 1",
+                [weekday, room_id, *slot_ids, datetime.today().strftime("%Y/%m/%d")],
+            )
+            if cur.fetchone():
+                return None
+            start = cur.execute("SELECT COALESCE(MAX(booking_id), 0) + 1 FROM fixed_booking").fetchone()[0]
+            new_ids = list(range(start, start + len(slot_ids)))
+            cur.executemany(
+                "INSERT INTO fixed_booking VALUES (?, ?, ?, ?, ?, ?, 0)",
+                [(bid, weekday, sid, room_id, user_id, purpose) for bid, sid in zip(new_ids, slot_ids)],
+            )
+            return new_ids
+
+        return self._transaction(
+            work, lambda index, new_ids: index.add_fixed(weekday, slot_ids, room_id, new_ids, user_id, purpose))
+
+    def cancel_fixed_bookings(self, booking_ids):
+        return self._cancel(
+            "fixed_booking", "booking_id, weekday, slot_id, room_id", booking_ids,
+            lambda index, row: _release_fixed(index, *row),
+        )
+
+    @property
+    def leases(self):
+        return self._leases
+
+    # --------- 匯入 / 匯出用 ---------
+
+    def replace_sheet(self, sheet, rows):
+        """用 Excel 工作表的資料整批取代對應的資料表"""
+        table, width = _TABLES[sheet]
+
+        def work(cur):
+            cur.execute(f"DELETE FROM {table}")
+            if sheet == "Schedule":
+                cur.execute("DELETE FROM schedule_slots")
+                for row in rows:
+                    self._insert_booking(cur, _pad(row, width))
+                return
+            padded = [_pad(row, width) for row in rows]
+            if sheet == "FixedBooking":
+                padded = [row[:6] + (1 if is_true(row[6]) else 0,) for row in padded]
+            cur.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({','.join('?' * width)})", padded)
+
+        self._transaction(work)  # 整批取代：索引下次查詢時重建
+
+    def sheet_rows(self, sheet):
+        """依 Excel 工作表的欄位順序取出資料"""
+        return {
+            "MeetingRooms": self.rooms,
+            "TimeSlots": self.time_slots,
+            "Schedule": self.bookings,
+            "FixedBooking": self.fixed_bookings,
+        }[sheet]()
+
+
+def is_sqlite_path(path):
+    return os.path.splitext(path)[1].lower() in SQLITE_SUFFIXES
+
+
+def open_repository(path=None):
+    """依副檔名選後端：.sqlite3 / .db → SQLite，其餘視為 Excel"""
+    path = path or DEFAULT_STORE
+    if is_sqlite_path(path):
+        return SqliteRepository(path)
+    return ExcelRepository(path)
+
+
+_repositories = {}  # {絕對路徑: Repository}；SQLite 後端握著連線與索引，同一個檔案共用一個
+_repositories_lock = threading.Lock()
+
+
+def get_repository(path=None):
+    """取得（必要時建立）資料檔對應的後端；沒指定就用 BOOKING_STORE 設定的檔案"""
+    path = path or DEFAULT_STORE
+    key = os.path.abspath(path)
+    with _repositories_lock:
+        repo = _repositories.get(key)
+        if repo is None:
+            # 用絕對路徑建立：之後就算工作目錄改變，共用的這一個仍指向同一個檔案
+            repo = _repositories[key] = open_repository(key)
+        return repo
+
+
+# ===== 匯入 / 匯出（沿用 REQUIRED_SHEETS 的欄位配置）=====
+
+def import_xlsx(xlsx_path, db_path, sheets=None):
+    """
+    把 Excel（含尚未併回的日誌）匯入 SQLite；會整批取代對應的資料表。
+    sheets 只給 ["MeetingRooms", "TimeSlots"] 時，就只更新會議室與時段。
+    TempLock 是進行中的暫時鎖定，不搬。
+    """
+    repo = SqliteRepository(db_path)
+    wb = get_workbook(xlsx_path)
+    for sheet in sheets or _TABLES:
+        if sheet not in wb.sheetnames:
+            continue
+        rows = [row for row in wb[sheet].iter_rows(min_row=2, values_only=True) if row and row[0] is not None]
+        repo.replace_sheet(sheet, rows)
+    return repo
+
+
+def export_xlsx(db_path, xlsx_path):
+    """把 SQLite 的資料輸出成與 REQUIRED_SHEETS 相同配置的 Excel"""
+    repo = SqliteRepository(db_path)
+    wb = Workbook()
+    wb.remove(wb.active)
+    for sheet, headers in REQUIRED_SHEETS.items():
+        ws = wb.create_sheet(title=sheet)
+        ws.append(headers)
+        if sheet in _TABLES:
+            for row in repo.sheet_rows(sheet):
+                ws.append(list(row))
+    if not safe_save(wb, xlsx_path):
+        raise OSError(f"無法寫入 {xlsx_path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "import":
+        import_xlsx(sys.argv[2], sys.argv[3], sys.argv[4:] or None)
+        print(f"✅ 已匯入 {sys.argv[2]} → {sys.argv[3]}")
+    elif len(sys.argv) == 4 and sys.argv[1] == "export":
+        export_xlsx(sys.argv[2], sys.argv[3])
+        print(f"✅ 已匯出 {sys.argv[2]} → {sys.argv[3]}")
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,224 @@
+"""
+效能追蹤：記錄每個操作花了多久，存成 Chrome trace 檔
+
+用法：
+    python zoom_excel.py --trace trace.json      # 或設定環境變數 ZOOM_TRACE=trace.json
+    之後用 Chrome 開 chrome://tracing（或 https://ui.perfetto.dev）載入 trace.json
+
+初學者註解：
+- 「區段」(span)：一段程式從開始到結束的時間，例如讀 Excel、衝突檢查、存檔、畫表格。
+  用 @traced 裝飾函式，或用 with span("名稱"): 包住一段程式。
+- 「畫面動作」(action)：使用者按一個按鈕觸發的整件事，例如 PageRoomSelect.next_page。
+  動作裡發生的所有區段（包含丟給背景執行緒做的，見 io_worker.py）都會標上同一個動作編號，
+  在 trace 裡點任一區段就看得到它屬於哪一次點擊（args.action）。
+- 只保留最近 MAX_EVENTS 筆，檔案大小固定不會一直長大；每次動作結束後
+  （最多每 FLUSH_INTERVAL 秒一次）與程式結束時寫檔。
+- 沒開啟時，每個被裝飾的函式只多一次 if 判斷，幾乎沒有額外負擔。
+"""
+import atexit
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+TRACE_ENV = "ZOOM_TRACE"
+MAX_EVENTS = 50_000
+FLUSH_INTERVAL = 2.0   # 秒
+
+_enabled = False
+_path = None
+_events = deque(maxlen=MAX_EVENTS)
+_events_lock = threading.Lock()
+_thread_names = {}
+_last_flush = 0.0
+_action_ids = itertools.count(1)   # next() 在多執行緒下也不會重複
+_current_action = contextvars.ContextVar("trace_action", default=None)
+
+
+def enable(path, max_events=MAX_EVENTS):
+    """開始記錄，之後寫到 path"""
+    global _enabled, _path, _events
+    with _events_lock:
+        _path = path
+        _events = deque(maxlen=max_events)
+        _thread_names.clear()
+    _enabled = True
+
+
+def disable():
+    """停止記錄（已記錄的內容先寫檔）"""
+    global _enabled
+    flush()
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def _now_us():
+    return time.perf_counter() * 1_000_000
+
+
+def _record(name, cat, start_us, end_us, args):
+    thread = threading.current_thread()
+    event = {
+        "name": name, "cat": cat, "ph": "X",
+        "ts": round(start_us, 1), "dur": round(end_us - start_us, 1),
+        "pid": os.getpid(), "tid": thread.ident,
+    }
+    action = _current_action.get()
+    if action is not None or args:
+        event["args"] = dict(args or {}, action=action)
+    with _events_lock:
+        _events.append(event)
+        _thread_names[thread.ident] = thread.name
+
+
+class _NoopSpan:
+    """沒開啟追蹤時用的空區段"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        args = self.args
+        if exc_type is not None:
+            args = dict(args or {}, error=exc_type.__name__)
+        _record(self.name, self.cat, self.start, _now_us(), args)
+        return False
+
+
+def span(name, cat="app", **args):
+    """with span("讀取 Excel", cat="storage"): ..."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name, cat, args)
+
+
+def traced(name=None, cat="app"):
+    """
+    把整個函式當成一個區段：
+        @traced                  → 名稱用函式名稱（例如 PageRoomSelect._show_rooms）
+        @traced("safe_save", cat="storage")
+    """
+    def decorate(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(label, cat, None):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    if callable(name):  # 直接寫 @traced，沒有括號
+        fn, name = name, None
+        return decorate(fn)
+    return decorate
+
+
+class _Action(_Span):
+    """一次畫面動作：設定目前的動作編號，結束時還原並視情況寫檔"""
+
+    def __enter__(self):
+        self.token = _current_action.set(f"{self.name}#{next(_action_ids)}")
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        _current_action.reset(self.token)
+        if time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+            flush()
+        return False
+
+
+def action(name):
+    """
+    with action("PageRoomSelect.next_page"): ...
+    已經在某個動作裡時（例如 next_page 切頁觸發 refresh），只當成一般區段，歸在外層動作下。
+    """
+    if not _enabled:
+        return _NOOP
+    if _current_action.get() is not None:
+        return _Span(name, "action", None)
+    return _Action(name, "action", None)
+
+
+def ui_action(fn):
+    """畫面事件（按鈕、切頁）用的裝飾器：名稱用函式名稱，例如 PageConfirm.do_booking"""
+    label = fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return fn(*args, **kwargs)
+        with action(label):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def bind(fn):
+    """
+    把目前的動作帶到別的執行緒 / 之後才執行的回呼（io_worker 用）。
+    沒開啟追蹤時原樣回傳 fn。
+    """
+    if not _enabled or fn is None:
+        return fn
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return ctx.run(fn, *args, **kwargs)
+    return wrapper
+
+
+def flush():
+    """把目前保留的紀錄寫到檔案（先寫暫存檔再替換，讀到的永遠是完整 JSON）"""
+    global _last_flush
+    if _path is None:
+        return
+    with _events_lock:
+        events = list(_events)
+        names = dict(_thread_names)
+    pid = os.getpid()
+    meta = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": tname}}
+        for tid, tname in names.items()
+    ]
+    tmp_path = _path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": meta + events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        os.replace(tmp_path, _path)
+    except OSError as e:
+        print(f"寫入追蹤檔失敗：{e}")
+    _last_flush = time.monotonic()
+
+
+atexit.register(flush)
+
+if os.environ.get(TRACE_ENV):
+    enable(os.environ[TRACE_ENV])
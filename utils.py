@@ -1,54 +1,9 @@
 from datetime import datetime, timedelta
-from openpyxl import load_workbook
 import tkinter as tk
-from excel_manager import safe_save  # 初學者註解：安全寫入，先寫暫存檔→原子覆蓋→產生 .bak
+import booking_core
+import tracing
 
 
-FILENAME = "meeting_schedule.xlsx"
-LOCK_EXPIRY_SECONDS = 20
-
-
-
-# 載入時段
-def load_time_slots(filename=FILENAME):
-    wb = load_workbook(filename)
-    ws = wb["TimeSlots"]
-    time_slots = {}
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        slot_id, time_range, disabled, *_ = row
-        if str(disabled).strip().upper() != "TRUE":
-            time_slots[int(slot_id)] = time_range
-    return time_slots
-
-# 清除過期鎖定
-def cleanup_expired_locks(filename=FILENAME):
-    wb = load_workbook(filename)
-
-    if "TempLock" not in wb.sheetnames:
-        ws = wb.create_sheet("TempLock")
-        ws.append(["UserID", "Date", "SlotID", "RoomID", "Status", "Timestamp"])
-        safe_save(wb, filename)
-        print("TempLock 表不存在，自動建立完成，跳過本次清除")
-        return
-
-    ws = wb["TempLock"]
-    now = datetime.now()
-    rows_to_keep = [ws[1]]
-
-    for row in ws.iter_rows(min_row=2):
-        timestamp_str = row[5].value
-        try:
-            lock_time = datetime.strptime(timestamp_str, "%Y/%m/%d %H:%M:%S")
-            if (now - lock_time).total_seconds() < LOCK_EXPIRY_SECONDS:
-                rows_to_keep.append(row)
-        except:
-            pass
-
-    ws.delete_rows(2, ws.max_row)
-    for row in rows_to_keep[1:]:
-        ws.append([cell.value for cell in row])
-
-    safe_save(wb, filename)
 class Tooltip:
     def __init__(self, widget, text):
         self.widget = widget
@@ -87,6 +42,7 @@ class Tooltip:
             self.tipwindow = None
 
 
+@tracing.traced(cat="render")
 def render_schedule_table(frame, time_slots, dates, bookings_by_day_slot, all_room_ids):
     """
     將預約狀況渲染至傳入的 tkinter Frame
@@ -159,23 +115,38 @@ def render_schedule_table(frame, time_slots, dates, bookings_by_day_slot, all_ro
     for row in range(len(slot_ids) + 1):
         frame.grid_rowconfigure(row, weight=1)
 
-def render_boss_table(frame):
-    from datetime import datetime, timedelta
-    from openpyxl import load_workbook
+def this_week_dates():
+    """本週一 ~ 週五的日期字串"""
+    today = datetime.today()
+    monday = today - timedelta(days=today.weekday())
+    return [(monday + timedelta(days=i)).strftime("%Y/%m/%d") for i in range(5)]
+
+
+# 初學者註解：總覽分成「讀資料」與「畫表格」兩段。
+# load_xxx 只讀資料、不碰畫面，交給背景執行緒（io_worker）跑；render_xxx 回到主執行緒再畫。
+
+@tracing.traced(cat="query")
+def load_boss_overview(client=None):
+    """
+    Boss 專區的資料階段。client：預約伺服器的 BookingClient；None 代表直接用本機的 booking_core
+    回傳 (time_slots, dates, fixed_map)，交給 render_boss_table
+    """
+    source = client if client is not None else booking_core
+    # === 取得「不可外借」會議室的固定預約（已取消的不含）===
+    return source.load_time_slots(), this_week_dates(), source.collect_fixed_overview()
+
+
+@tracing.traced(cat="render")
+def render_boss_table(frame, data):
+    """data：load_boss_overview 的結果"""
+    time_slots, dates, fixed_map = data
 
     # 清空舊畫面元件
     for widget in frame.winfo_children():
         widget.destroy()
 
-    wb = load_workbook(FILENAME)
-    time_slots = load_time_slots()
     slot_ids = sorted(time_slots.keys())
 
-    # 取得本週一 ~ 週五的日期
-    today = datetime.today()
-    monday = today - timedelta(days=today.weekday())
-    dates = [(monday + timedelta(days=i)).strftime("%Y/%m/%d") for i in range(5)]
-
     # 產生日期對應的中文星期
     weekday_names = ["週一", "週二", "週三", "週四", "週五"]
     date_to_wday = {
@@ -183,35 +154,6 @@ def render_boss_table(frame):
         for date in dates
     }
 
-    # === 新增：取得「不可外借」會議室的 ID 清單 ===
-    non_external_rooms = set()
-    ws_rooms = wb["MeetingRooms"]
-    for row in ws_rooms.iter_rows(min_row=2, values_only=True):
-        room_id, *_ , allow_external = row
-        if str(allow_external).strip().upper() != "TRUE":
-            non_external_rooms.add(room_id)
-
-    # === 取得固定預約資料 ===
-    fixed_map = {}
-    if "FixedBooking" in wb.sheetnames:
-        ws = wb["FixedBooking"]
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if len(row) < 6:
-                continue
-            if len(row) >= 7 and row[6] is True:
-                continue  # ❌ 已取消固定預約，略過
-
-            booking_id, wday, sid, rid, uid, purpose = row[:6]
-
-            try:
-                sid = int(sid)
-            except:
-                continue
-
-            # ✅ 加入過濾條件：只保留「不可外借」的會議室
-            if isinstance(rid, str) and isinstance(wday, str) and rid in non_external_rooms:
-                fixed_map.setdefault((wday.strip(), sid), []).append((rid, uid, purpose))
-
     # === 若無任何資料，顯示提示文字 ===
     if not fixed_map:
         tk.Label(
@@ -308,70 +250,30 @@ def render_boss_table(frame):
 
 
 
-def render_weekly_table(frame):
-    cleanup_expired_locks()
+@tracing.traced(cat="query")
+def load_weekly_overview(client=None):
+    """
+    本週總覽的資料階段。client：預約伺服器的 BookingClient；None 代表直接用本機的 booking_core
+    回傳 (time_slots, dates, collect_weekly_bookings 的結果)，交給 render_weekly_table
+    """
+    source = client if client is not None else booking_core
+    source.cleanup_expired_locks()
+    dates = this_week_dates()
+    return source.load_time_slots(), dates, source.collect_weekly_bookings(dates)
+
+
+@tracing.traced(cat="render")
+def render_weekly_table(frame, data):
+    """data：load_weekly_overview 的結果"""
+    time_slots, dates, weekly = data
+    all_room_ids, bookings_by_day_slot, details_by_day_slot, valid_records_exist = weekly
 
     # 清空原有內容
     for widget in frame.winfo_children():
         widget.destroy()
 
-    time_slots = load_time_slots()
     slot_ids = sorted(time_slots.keys())
 
-    today = datetime.today()
-    monday = today - timedelta(days=today.weekday())
-    dates = [(monday + timedelta(days=i)).strftime("%Y/%m/%d") for i in range(5)]
-
-    wb = load_workbook(FILENAME)
-    ws_schedule = wb["Schedule"]
-    ws_rooms = wb["MeetingRooms"]
-
-    all_room_ids = [
-        row[0] for row in ws_rooms.iter_rows(min_row=2, values_only=True)
-        if str(row[6]).strip().upper() != "TRUE"  # ✅ 未停用
-        and str(row[7]).strip().upper() == "TRUE"  # ✅ 可外借
-    ]
-
-
-    room_name_map = {
-        row[0]: row[1] for row in ws_rooms.iter_rows(min_row=2, values_only=True)
-    }
-            # 取得固定預約資料
-    fixed_bookings = []
-    if "FixedBooking" in wb.sheetnames:
-        ws_fixed = wb["FixedBooking"]
-        for row in ws_fixed.iter_rows(min_row=2, values_only=True):
-            fixed_bookings.append(row)  # [BookingID, Weekday, SlotID, RoomID, UserID, Purpose]
-
-    bookings_by_day_slot = {}
-    valid_records_exist = False  # ✅ 是否有有效預約資料
-
-    for row in ws_schedule.iter_rows(min_row=2, values_only=True):
-        date, slot_str, room_id, canceled = row[1], row[2], row[3], row[6]
-        if canceled or not slot_str:
-            continue
-        try:
-            for sid in map(int, str(slot_str).split(',')):
-                bookings_by_day_slot.setdefault((date, sid), []).append(room_id)
-                valid_records_exist = True
-        except:
-            continue
-            # 🔽 加入固定預約的房間（轉換為對應日期）
-        ws_fixed = wb["FixedBooking"]
-        for row in ws_fixed.iter_rows(min_row=2, values_only=True):
-            if len(row) >= 7 and row[6] is True:
-                continue  # ✅ 已取消，跳過
-            _, wday, sid, rid, *_ = row
-            if not isinstance(sid, int) or not rid or rid not in all_room_ids:
-                continue
-            # 轉換星期幾為對應的日期
-            for i, weekday_str in enumerate(["週一", "週二", "週三", "週四", "週五"]):
-                if wday == weekday_str:
-                    date = dates[i]
-                    bookings_by_day_slot.setdefault((date, sid), []).append(rid)
-                    break  # 找到就不用再比對下去
-
-
     # ✅ 若無預約資料，顯示提示文字並離開
     if not valid_records_exist:
         tk.Label(
@@ -428,48 +330,7 @@ def render_weekly_table(frame):
                 symbol = "●"
                 color = "#f59e0b"  # 黃
 
-            slot_name = time_slots[sid]
-            details = []
-
-            # 加入「一般預約」資訊
-            for row in ws_schedule.iter_rows(min_row=2, values_only=True):
-                b_date, b_slots, b_room, b_user, b_purpose, b_cancel = row[1], row[2], row[3], row[4], row[5], row[6]
-                if b_cancel or b_date != date or not b_slots:
-                    continue
-                if b_room not in all_room_ids:
-                    continue  # ✅ 不在可外借房間清單，跳過
-                try:
-                    booked_sids = set(map(int, str(b_slots).split(',')))
-                except:
-                    continue
-                if sid in booked_sids:
-                    room_name = room_name_map.get(b_room, "")
-                    details.append(f"[一般] 會議室：{b_room}（{room_name}）\n預約人：{b_user}\n用途：{b_purpose}")
-
-            # 加入「固定預約」資訊
-            weekday_str = ["週一", "週二", "週三", "週四", "週五"][c]  # 第 c 欄對應的星期幾
-            for fb in fixed_bookings:
-                if len(fb) >= 7 and fb[6] is True:
-                    continue  # ✅ 已取消，跳過
-
-                wday, fsid, froom, fuser, fpurpose = fb[1:6]
-
-                if wday == weekday_str and fsid == sid:
-                    if froom not in all_room_ids:
-                        continue  # ✅ 不可外借會議室，略過
-                    room_name = room_name_map.get(froom, "")
-                    
-                        # ✅ 若用途中包含 MIS，加入提示
-                    tag = ""
-                    if "MIS" in str(fpurpose).upper():
-                        tag = "\n⚠️ 此固定預約涉及 MIS 支援"
-
-                    details.append(
-                        f"[固定] 會議室：{froom}（{room_name}）\n預約人：{fuser}\n用途：{fpurpose}{tag}"
-                    )
-
-
-
+            details = details_by_day_slot.get((date, sid), [])
             tooltip_text = "\n-------------------\n".join(details) if details else "尚未有預約"
             bg_color = "#f9fafb" if r % 2 != 1 else "#e5e7eb"  # ✅ 交錯灰底
             label = tk.Label(
@@ -2,7 +2,8 @@ import tkinter as tk
 from tkinter import messagebox
 from datetime import datetime, timedelta
 from openpyxl import load_workbook
-from utils import  render_weekly_table, render_boss_table
+from utils import  load_weekly_overview, render_weekly_table, load_boss_overview, render_boss_table
+import tracing
 
 class PageWeeklyOverview(tk.Frame):
     def __init__(self, parent, controller):
@@ -136,9 +137,10 @@ class PageWeeklyOverview(tk.Frame):
 
         btn_refresh.pack()
 
+    @tracing.ui_action
     def on_refresh(self):
-        self.refresh()
-        messagebox.showinfo("已更新", "預約資料已重新整理完成")
+        self.refresh(on_done=lambda: messagebox.showinfo("已更新", "預約資料已重新整理完成"))
+    @tracing.ui_action
     def switch_tab(self, tab_name):
         if self.current_tab == tab_name:
             return
@@ -162,16 +164,31 @@ class PageWeeklyOverview(tk.Frame):
         self.current_tab = tab_name
         self.refresh()
 
-    def refresh(self):
+    @tracing.ui_action
+    def refresh(self, on_done=None):
+        # 連到預約伺服器時，總覽與 Boss 專區的資料都向伺服器要
+        client = self.controller.client
         if self.current_tab == "weekly":
-            render_weekly_table(self.table_frame)
+            load, render, frame = load_weekly_overview, render_weekly_table, self.table_frame
         elif self.current_tab == "boss":
-            render_boss_table(self.boss_frame)
+            load, render, frame = load_boss_overview, render_boss_table, self.boss_frame
+        else:
+            return
+
+        def done(data):
+            render(frame, data)
+            if on_done is not None:
+                on_done()
+
+        # 讀資料在背景執行緒（總覽要掃整張預約表），畫表格回到主執行緒；連續切換分頁只採用最後一次
+        self.controller.io.submit(load, client, on_done=done, key="weekly_overview")
 
 if __name__ == "__main__":
+    from types import SimpleNamespace
+    from io_worker import IOWorker
     root = tk.Tk()
     root.geometry("1000x600")
-    page = PageWeeklyOverview(root, None)
+    page = PageWeeklyOverview(root, SimpleNamespace(client=None, io=IOWorker(root)))
     page.pack(fill="both", expand=True)
     page.refresh()
     root.mainloop()
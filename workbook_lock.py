@@ -0,0 +1,153 @@
+"""
+跨程式的寫入鎖（advisory file lock）
+
+初學者註解：
+- 好幾台 kiosk 同時對同一份 meeting_schedule.xlsx 寫入時，
+  「讀 → 改 → 寫」如果沒有互斥，後寫的人會把先寫的人蓋掉（lost update）。
+- 這裡在 Excel 旁邊放一個 meeting_schedule.lock 小檔案，
+  寫入前用作業系統的檔案鎖（Linux / macOS 用 fcntl，Windows 用 msvcrt）鎖住它。
+- 只有「寫入」要拿鎖；讀取（get_workbook）完全不受影響。
+- 同一個程式裡可以重複進入（例如 commit_records 裡面觸發 checkpoint → safe_save）。
+- 拿不到鎖時會退避重試，最多等 LOCK_TIMEOUT 秒，逾時丟出 LockTimeout。
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_TIMEOUT = 10.0       # 最多等幾秒
+BACKOFF_START = 0.005     # 第一次重試前等待秒數
+BACKOFF_MAX = 0.2         # 每次等待的上限
+
+
+class LockTimeout(Exception):
+    """等太久還是拿不到寫入鎖"""
+
+
+# 競爭統計：給效能調校與除錯用
+_stats = {
+    "acquired": 0,       # 成功拿到鎖的次數（不含重複進入）
+    "contended": 0,      # 第一次嘗試就失敗、需要等待的次數
+    "timeouts": 0,       # 逾時放棄的次數
+    "wait_total": 0.0,   # 累計等待秒數
+    "wait_max": 0.0,     # 單次最長等待秒數
+}
+_stats_lock = threading.Lock()
+
+
+def lock_stats():
+    """回傳競爭統計的複本"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_lock_stats():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0.0 if isinstance(_stats[key], float) else 0
+
+
+def lock_path(filename):
+    """meeting_schedule.xlsx → meeting_schedule.lock"""
+    return os.path.splitext(filename)[0] + ".lock"
+
+
+def _try_lock(f):
+    """非阻塞地鎖住檔案；拿到回傳 True"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class _Holder:
+    """每個鎖檔在本程式中的持有狀態"""
+
+    def __init__(self):
+        self.rlock = threading.RLock()  # 同程式內的執行緒互斥
+        self.depth = 0                  # 重複進入的層數
+        self.file = None
+
+
+_holders = {}
+_holders_lock = threading.Lock()
+
+
+def _holder_for(path):
+    with _holders_lock:
+        if path not in _holders:
+            _holders[path] = _Holder()
+        return _holders[path]
+
+
+@contextmanager
+def write_lock(filename, timeout=LOCK_TIMEOUT):
+    """
+    用法：
+        with write_lock(FILENAME):
+            ...讀最新資料、檢查、寫入...
+    """
+    path = os.path.abspath(lock_path(filename))
+    holder = _holder_for(path)
+    start = time.monotonic()
+
+    if not holder.rlock.acquire(timeout=timeout):
+        with _stats_lock:
+            _stats["timeouts"] += 1
+        raise LockTimeout(path)
+
+    try:
+        if holder.depth == 0:
+            f = open(path, "a+b")
+            delay = BACKOFF_START
+            contended = False
+            while not _try_lock(f):
+                contended = True
+                if time.monotonic() - start >= timeout:
+                    f.close()
+                    with _stats_lock:
+                        _stats["timeouts"] += 1
+                    raise LockTimeout(path)
+                time.sleep(delay)
+                delay = min(delay * 2, BACKOFF_MAX)
+
+            waited = time.monotonic() - start
+            with _stats_lock:
+                _stats["acquired"] += 1
+                _stats["contended"] += int(contended)
+                _stats["wait_total"] += waited
+                _stats["wait_max"] = max(_stats["wait_max"], waited)
+            holder.file = f
+
+        holder.depth += 1
+        try:
+            yield
+        finally:
+            holder.depth -= 1
+            if holder.depth == 0:
+                f, holder.file = holder.file, None
+                try:
+                    _unlock(f)
+                finally:
+                    f.close()
+    finally:
+        holder.rlock.release()
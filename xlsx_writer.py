@@ -0,0 +1,223 @@
+"""
+只重寫「有變動的工作表」的 xlsx 寫入器
+
+初學者註解：
+- openpyxl 存檔時，每張工作表、樣式、共用字串都會重新產生、重新壓縮一次，
+  就算只改了 Schedule 的一列也一樣。
+- xlsx 是 zip：這裡把「沒變的檔案」連同壓縮後的位元組原封不動複製過去（不解壓、不重壓），
+  只重新產生有變動的那幾張工作表 XML。
+- 新寫的儲存格文字一律用「行內字串」（inlineStr），所以 sharedStrings.xml 也不必動。
+- 工作表 XML 裡 <sheetData> 以外的部分（欄寬、凍結窗格等）原樣保留；
+  原本儲存格上的樣式編號也會照位置保留。
+- 遇到處理不了的情況（zip64、日期型別的值、非法字元…）丟出 UnsupportedWorkbook，
+  呼叫端改用 openpyxl 整本存檔。
+"""
+import math
+import re
+import struct
+import time
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import get_column_letter
+
+from fast_xlsx import UnsupportedWorkbook, sheet_targets
+
+# zip 格式的固定欄位（見 PKWARE APPNOTE）
+_LOCAL = struct.Struct("<4s5H3L2H")      # 本地檔頭 30 bytes
+_CENTRAL = struct.Struct("<4s6H3L5H2L")  # 中央目錄一筆 46 bytes
+_END = struct.Struct("<4s4H2LH")         # 中央目錄結尾 22 bytes
+_LOCAL_SIG, _CENTRAL_SIG, _END_SIG = b"PK\x03\x04", b"PK\x01\x02", b"PK\x05\x06"
+_DESCRIPTOR_SIG = b"PK\x07\x08"
+
+_SHEET_DATA = re.compile(rb"<sheetData\b[^>]*?(/?)>")
+_DIMENSION = re.compile(rb'<dimension ref="[^"]*"\s*/>')
+_CELL_TAG = re.compile(rb"<c\b([^>]*)>")
+_ATTR_R = re.compile(rb'\br="([A-Z]+)(\d+)"')
+_ATTR_S = re.compile(rb'\bs="(\d+)"')
+
+
+# ===== 產生工作表 XML =====
+
+def _cell_xml(ref, value, style):
+    s_attr = f' s="{style}"' if style else ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{s_attr} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, int):
+        return f'<c r="{ref}"{s_attr}><v>{value}</v></c>'
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise UnsupportedWorkbook("數值不是有限數")
+        return f'<c r="{ref}"{s_attr}><v>{value!r}</v></c>'
+    if isinstance(value, str):
+        if ILLEGAL_CHARACTERS_RE.search(value):
+            raise UnsupportedWorkbook("含 XML 不允許的字元")
+        return f'<c r="{ref}"{s_attr} t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>'
+    raise UnsupportedWorkbook(f"不支援的值型別：{type(value).__name__}")
+
+
+def _old_styles(sheet_data):
+    """原本 sheetData 裡有樣式的儲存格：{(列號, 欄字母): 樣式編號}"""
+    styles = {}
+    for m in _CELL_TAG.finditer(sheet_data):
+        attrs = m.group(1)
+        s = _ATTR_S.search(attrs)
+        r = _ATTR_R.search(attrs)
+        if s and r and s.group(1) != b"0":
+            styles[(int(r.group(2)), r.group(1).decode())] = s.group(1).decode()
+    return styles
+
+
+def build_sheet_xml(old_xml, rows):
+    """
+    用新的資料列取代 old_xml 的 <sheetData>，其餘部分原樣保留。
+    rows：由第 1 列開始的 tuple / list（None 代表空白）
+    """
+    m = _SHEET_DATA.search(old_xml)
+    if m is None:
+        raise UnsupportedWorkbook("找不到 sheetData")
+    if m.group(1):  # <sheetData/>
+        head, old_data, tail = old_xml[:m.start()], b"", old_xml[m.end():]
+    else:
+        end = old_xml.find(b"</sheetData>", m.end())
+        if end < 0:
+            raise UnsupportedWorkbook("sheetData 沒有結尾")
+        head, old_data, tail = old_xml[:m.start()], old_xml[m.end():end], old_xml[end + len(b"</sheetData>"):]
+
+    styles = _old_styles(old_data)
+    letters = []
+    parts = ["<sheetData>"]
+    max_row = max_col = 0
+    for r, row in enumerate(rows, start=1):
+        cells = []
+        for c, value in enumerate(row):
+            if value is None:
+                continue
+            while len(letters) <= c:
+                letters.append(get_column_letter(len(letters) + 1))
+            col = letters[c]
+            cells.append(_cell_xml(f"{col}{r}", value, styles.get((r, col))))
+            max_col = max(max_col, c + 1)
+        if cells:
+            parts.append(f'<row r="{r}">')
+            parts.extend(cells)
+            parts.append("</row>")
+            max_row = r
+    parts.append("</sheetData>")
+
+    dimension = f"A1:{get_column_letter(max_col)}{max_row}" if max_row else "A1"
+    head = _DIMENSION.sub(f'<dimension ref="{dimension}"/>'.encode(), head, count=1)
+    return head + "".join(parts).encode("utf-8") + tail
+
+
+# ===== zip：原封不動複製 + 寫入新成員 =====
+
+def _central_directory(f):
+    """讀出中央目錄的每一筆 (固定欄位, 檔名, extra, comment)"""
+    f.seek(0, 2)
+    size = f.tell()
+    tail_len = min(size, _END.size + 0xFFFF)
+    f.seek(size - tail_len)
+    tail = f.read()
+    pos = tail.rfind(_END_SIG)
+    if pos < 0:
+        raise UnsupportedWorkbook("找不到 zip 結尾")
+    _, disk, _, _, count, cd_size, cd_offset, _ = _END.unpack_from(tail, pos)
+    if disk != 0 or count == 0xFFFF or cd_offset == 0xFFFFFFFF:
+        raise UnsupportedWorkbook("不支援分割或 zip64 檔案")
+
+    f.seek(cd_offset)
+    data = f.read(cd_size)
+    entries = []
+    pos = 0
+    for _ in range(count):
+        fields = _CENTRAL.unpack_from(data, pos)
+        if fields[0] != _CENTRAL_SIG:
+            raise UnsupportedWorkbook("中央目錄格式錯誤")
+        n, m, k = fields[10], fields[11], fields[12]
+        pos += _CENTRAL.size
+        name = data[pos:pos + n]
+        extra = data[pos + n:pos + n + m]
+        comment = data[pos + n + m:pos + n + m + k]
+        pos += n + m + k
+        if 0xFFFFFFFF in (fields[8], fields[9], fields[16]):
+            raise UnsupportedWorkbook("不支援 zip64 檔案")
+        entries.append((list(fields), name, extra, comment))
+    return entries
+
+
+def _copy_raw(src, out, fields):
+    """把一個成員的本地檔頭 + 壓縮資料（+ data descriptor）原封不動複製過去"""
+    offset, csize, flags = fields[16], fields[8], fields[3]
+    src.seek(offset)
+    header = src.read(_LOCAL.size)
+    local = _LOCAL.unpack(header)
+    if local[0] != _LOCAL_SIG:
+        raise UnsupportedWorkbook("本地檔頭格式錯誤")
+    length = local[9] + local[10] + csize
+    body = src.read(length)
+    descriptor = b""
+    if flags & 0x08:
+        peek = src.read(4)
+        descriptor = peek + src.read(12 if peek == _DESCRIPTOR_SIG else 8)
+    out.write(header + body + descriptor)
+
+
+def _dos_time():
+    t = time.localtime()
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+def _write_new(out, fields, name, data):
+    """用 deflate 壓縮寫入一個新成員，並回傳更新過的中央目錄欄位"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    crc = zlib.crc32(data) & 0xFFFFFFFF
+    mtime, mdate = _dos_time()
+    out.write(_LOCAL.pack(_LOCAL_SIG, 20, 0, zipfile.ZIP_DEFLATED, mtime, mdate,
+                          crc, len(compressed), len(data), len(name), 0))
+    out.write(name)
+    out.write(compressed)
+    fields[2], fields[3], fields[4] = 20, 0, zipfile.ZIP_DEFLATED
+    fields[5], fields[6] = mtime, mdate
+    fields[7], fields[8], fields[9] = crc, len(compressed), len(data)
+    fields[11] = 0  # 新成員不帶 extra
+    return fields
+
+
+def rewrite_sheets(src_path, dst_path, sheets):
+    """
+    sheets：{工作表名稱: 由第 1 列開始的資料列}
+    產生 dst_path：只有這幾張工作表重新寫，其餘成員原封不動複製。
+    """
+    with zipfile.ZipFile(src_path) as zf:
+        targets, _ = sheet_targets(zf)
+        paths = dict(targets)
+        missing = [name for name in sheets if name not in paths]
+        if missing:
+            raise UnsupportedWorkbook(f"找不到工作表：{missing}")
+        replacements = {
+            paths[name].encode("utf-8"): build_sheet_xml(zf.read(paths[name]), rows)
+            for name, rows in sheets.items()
+        }
+
+    with open(src_path, "rb") as src, open(dst_path, "wb") as out:
+        central = []
+        for fields, name, extra, comment in _central_directory(src):
+            new_offset = out.tell()
+            if name in replacements:
+                fields = _write_new(out, fields, name, replacements[name])
+                extra = b""
+            else:
+                _copy_raw(src, out, fields)
+            fields[16] = new_offset
+            central.append((fields, name, extra, comment))
+
+        cd_offset = out.tell()
+        for fields, name, extra, comment in central:
+            out.write(_CENTRAL.pack(*fields) + name + extra + comment)
+        cd_size = out.tell() - cd_offset
+        out.write(_END.pack(_END_SIG, 0, 0, len(central), len(central), cd_size, cd_offset, 0))
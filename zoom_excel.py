@@ -1,17 +1,18 @@
 #zoom_excel
 from weekly_overview import PageWeeklyOverview
-from openpyxl import Workbook, load_workbook
 import os
+import sys
 import uuid
+import argparse
 import tkinter as tk
-from tkinter import ttk
 from tkinter import messagebox
-from datetime import datetime,timedelta
-from excel_manager import init_excel_file, FILENAME, safe_save
-
-# ✅ 鎖定狀態與時間（秒）
-LOCK_STATUS = "LOCKING"
-LOCK_EXPIRY_SECONDS = 180 # 3分鐘
+from datetime import datetime
+from io_worker import IOWorker
+import booking_core
+import tracing
+from storage import DEFAULT_STORE, is_sqlite_path
+# 查詢、衝突檢查、寫入、暫時鎖定都在 booking_core（不含畫面），這裡只負責 Tk 頁面
+from booking_core import LOCK_EXPIRY_SECONDS, HEARTBEAT_SECONDS, rooms_free_for_slots
 
 # 全域變數儲存跨畫面資料
 app_state = {
@@ -24,6 +25,8 @@ app_state = {
     "lock_token": str(uuid.uuid4())  # ✅ 新增唯一識別碼
 }
 def is_excel_file_locked(filepath):
+    if not os.path.exists(filepath):
+        return False  # 檔案還不存在：不要用 "a" 模式把空檔案建出來
     try:
         with open(filepath, "a"):
             return False  # 沒有被鎖
@@ -31,448 +34,10 @@ def is_excel_file_locked(filepath):
         return True  # 被其他程式鎖住（例如 Excel）
 
 
-# 載入可用時段
-def load_time_slots(filename=FILENAME):
-    wb = load_workbook(filename)
-    ws = wb["TimeSlots"]
-    time_slots = {}
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        slot_id, time_range, disabled, *_ = row
-        if str(disabled).strip().upper() != "TRUE":
-            time_slots[int(slot_id)] = time_range
-    return time_slots
-
-def get_temp_locked_rooms(date, slot_ids, filename="meeting_schedule.xlsx"):
-    from openpyxl import load_workbook
-
-    LOCK_EXPIRY_SECONDS = 180
-    try:
-        wb = load_workbook(filename)
-    except:
-        return set()
-
-    if "TempLock" not in wb.sheetnames:
-        return set()
-
-    ws = wb["TempLock"]
-    now = datetime.now()
-    locked_rooms = set()
-
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        try:
-            lock_date, slot_id, room_id, status, timestamp_str = row[1], row[2], row[3], row[4], row[5]
-            if not (lock_date and slot_id and room_id and timestamp_str):
-                continue
-            lock_time = datetime.strptime(timestamp_str, "%Y/%m/%d %H:%M:%S")
-            if lock_date == date and int(slot_id) in slot_ids:
-                elapsed = (now - lock_time).total_seconds()
-                if elapsed < LOCK_EXPIRY_SECONDS:
-                    locked_rooms.add(room_id)
-        except:
-            continue
-
-    return locked_rooms
-
-def get_available_rooms(date, slot_ids):
-    wb = load_workbook(FILENAME)
-    ws_schedule = wb["Schedule"]
-    ws_rooms = wb["MeetingRooms"]
-
-    # 已被正式預約的房間
-    booked_rooms = set()
-    for row in ws_schedule.iter_rows(min_row=2, values_only=True):
-        record_date, existing_slots, meeting_id, canceled = row[1], row[2], row[3], row[6]
-        if record_date == date and not canceled:
-            booked_slots = set(map(int, existing_slots.split(',')))
-            if any(slot in booked_slots for slot in slot_ids):
-                booked_rooms.add(meeting_id)
-
-    # 取得正在鎖定中的房間
-    locked_rooms = get_temp_locked_rooms(date, slot_ids)
-
-    # 加入固定預約佔用的房間
-    fixed_locked_rooms = set()
-    weekday_index = datetime.strptime(date, "%Y/%m/%d").weekday()
-    weekday_str = ["週一", "週二", "週三", "週四", "週五"][weekday_index]
-
-    if "FixedBooking" in wb.sheetnames:
-        ws_fixed = wb["FixedBooking"]
-        for row in ws_fixed.iter_rows(min_row=2, values_only=True):
-            if len(row) >= 7 and row[6] is True:
-                continue  # ✅ 加上這行，跳過已取消的固定預約
-            _, wday, sid, rid, *_ = row
-            if wday == weekday_str and rid and sid in slot_ids:
-                fixed_locked_rooms.add(rid)
-
-    # ✅ 只根據「可外借狀態」為 TRUE 的房間
-    available_rooms = []
-    for row in ws_rooms.iter_rows(min_row=2, values_only=True):
-        room_id, name, acc, pwd, link, usage, closed, allow_external = row
-
-        if str(allow_external).strip().upper() != "TRUE":
-            continue  # ✅ 若不可外借，直接跳過
-
-        if room_id in booked_rooms or room_id in fixed_locked_rooms:
-            continue  # 已被預約
-
-        is_locked = room_id in locked_rooms
-        available_rooms.append((room_id, name, usage, is_locked))
-
-    return available_rooms
-
-
-# 檢查某會議室在指定日期與時段是否已被預約，與excel做出比對
-def is_conflict(date, slot_ids, room_id):
-    wb = load_workbook(FILENAME)
-    ws = wb["Schedule"]
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        record_date, slots, booked_room, canceled = row[1], row[2], row[3], row[6]
-        if record_date == date and booked_room == room_id and not canceled:
-            booked_slots = set(map(int, slots.split(',')))
-            if any(slot in booked_slots for slot in slot_ids):
-                return True
-    # ✅ 加上固定預約的衝突檢查（插在 return False 前面）
-    if is_fixed_booked_on_date(date, slot_ids, room_id):
-        return True
-    return False
-def is_fixed_booked_on_date(date: str, slot_ids: list, room_id: str) -> bool:
-    # 將日期轉為對應的星期幾（0=週一）
-    weekday_index = datetime.strptime(date, "%Y/%m/%d").weekday()
-    weekday_str = ["週一", "週二", "週三", "週四", "週五"][weekday_index]
-
-    wb = load_workbook(FILENAME)
-    ws = wb["FixedBooking"]
-
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        if len(row) >= 7 and row[6] is True:
-            continue  # ✅ 跳過已取消的固定預約
-        _, wday, sid, rid, *_ = row
-        if wday == weekday_str and rid == room_id and sid in slot_ids:
-            return True
-
-    return False
-
-def find_schedule_conflicts_by_weekday(weekday_str, slot_ids, room_id):
-    weekday_map = {"週一": 0, "週二": 1, "週三": 2, "週四": 3, "週五": 4}
-    target_weekday = weekday_map.get(weekday_str)
-    today = datetime.today().date()
-    conflicts = []
-
-    wb = load_workbook(FILENAME)
-    ws = wb["Schedule"]
-    ws_slot = wb["TimeSlots"]
-
-    # 建立 slot_id → 時間區間 的對照表
-    slot_time_map = {}
-    for row in ws_slot.iter_rows(min_row=2, values_only=True):
-        sid, time_str, disabled, *_ = row
-        if sid and time_str:
-            slot_time_map[int(sid)] = time_str
-
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        if len(row) < 7:
-            continue  # 資料異常，跳過
-
-        booking_id, date_str, slots, booked_room, uid, purpose, canceled = row
-
-        try:
-            record_date = datetime.strptime(date_str, "%Y/%m/%d").date()
-        except:
-            continue
-
-        if record_date < today or canceled or booked_room != room_id:
-            continue
-
-        if record_date.weekday() != target_weekday:
-            continue
-
-        booked_slots = set(map(int, slots.split(',')))
-        for sid in slot_ids:
-            if sid in booked_slots:
-                slot_time = slot_time_map.get(sid, "時間未知")
-                conflicts.append({
-                    "date": date_str,
-                    "slot": sid,
-                    "slot_time": slot_time,
-                    "room": room_id,
-                    "user": uid,
-                    "purpose": purpose,
-                    "source": "Schedule"
-                })
-
-    return conflicts
-
-# === 新增：固定預約送出前，比對 TempLock（將日期→週幾） ===
-from datetime import datetime
-
-_ZH_WEEKDAYS = ["週一", "週二", "週三", "週四", "週五", "週六", "週日"]  # 與 UI 字面一致
-
-def _to_zh_weekday(dt):
-    """
-    初學者註解：
-    - datetime.weekday()：週一=0、週日=6
-    - 轉成中文字，方便和固定預約選單直接比對
-    """
-    return _ZH_WEEKDAYS[dt.weekday()]
-
-def _parse_date_cell(cell):
-    """
-    初學者註解：
-    - TempLock 的日期欄可能是字串或日期，統一轉成 datetime（只取日期）
-    """
-    if cell is None:
-        return None
-    if isinstance(cell, datetime):
-        return datetime(cell.year, cell.month, cell.day)
-    # 可能是 date
-    try:
-        from datetime import date as _date
-        if isinstance(cell, _date):
-            return datetime(cell.year, cell.month, cell.day)
-    except Exception:
-        pass
-    if isinstance(cell, str):
-        for fmt in ("%Y/%m/%d", "%Y-%m-%d"):
-            try:
-                d = datetime.strptime(cell.strip(), fmt)
-                return datetime(d.year, d.month, d.day)
-            except ValueError:
-                continue
-    return None
-
-def _parse_ts_cell(cell):
-    """
-    初學者註解：
-    - 解析 TempLock 的 Timestamp，判斷是否過期（TTL）
-    """
-    if cell is None:
-        return None
-    if isinstance(cell, datetime):
-        return cell
-    if isinstance(cell, str):
-        for fmt in ("%Y/%m/%d %H:%M:%S", "%Y-%m-%d %H:%M:%S"):
-            try:
-                return datetime.strptime(cell.strip(), fmt)
-            except ValueError:
-                continue
-    return None
-
-def _normalize_slot_ids(slot_ids):
-    """
-    初學者註解：
-    - 讓時段 ID 變成 set[int]，方便交集比對
-    """
-    if slot_ids is None:
-        return set()
-    if isinstance(slot_ids, (list, tuple, set)):
-        try:
-            return {int(x) for x in slot_ids}
-        except Exception:
-            return set()
-    try:
-        return {int(slot_ids)}
-    except Exception:
-        return set()
-
-def has_templock_conflict_for_fixed(weekday_str, slot_ids, room_id, filename=FILENAME):
-    """
-    功能（給固定預約送出前用）：
-    - 從 Excel 讀取『TempLock』，把每筆鎖的「Date」轉為「週幾」，
-      與固定預約的〈room_id, slot_ids, weekday_str〉做比對。
-    - 只讀檢查，不寫入任何資料。
-    回傳：
-    - (True, message) 代表命中（有人正在一般預約）；(False, "") 代表無命中。
-    """
-    # 正規化參數
-    try:
-        target_room_id_int = int(room_id)
-    except Exception:
-        target_room_id_int = None  # 若無法轉 int，後面改用字串比對
-    target_room_id_str = str(room_id).strip()
-    target_slots = _normalize_slot_ids(slot_ids)
-    if not target_slots:
-        return False, ""
-
-    # 開檔／無表直接視為無衝突
-    try:
-        wb = load_workbook(filename)
-    except Exception:
-        return False, ""
-    if "TempLock" not in wb.sheetnames:
-        return False, ""
-
-    ws = wb["TempLock"]
-    now = datetime.now()
-
-    # 預期欄位順序：["UserID/Token", "Date", "SlotID", "RoomID", "Status", "Timestamp"]
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        if len(row) < 6:
-            continue
-        token, lock_date_cell, slot_id_cell, lock_room_cell, status_cell, ts_cell = row[:6]
-
-        # 必要欄位要有
-        if lock_date_cell is None or slot_id_cell is None or lock_room_cell is None or ts_cell is None:
-            continue
-
-        # TTL：過期就略過
-        ts = _parse_ts_cell(ts_cell)
-        if ts is None:
-            continue
-        if (now - ts).total_seconds() >= LOCK_EXPIRY_SECONDS:
-            continue
-
-        # 狀態欄位（若有值）必須等於 LOCK_STATUS
-        if status_cell and str(status_cell).strip().upper() != str(LOCK_STATUS).strip().upper():
-            continue
-
-        # 會議室比對（容錯：同時嘗試 int 與字串）
-        try:
-            lock_room_int = int(lock_room_cell)
-        except Exception:
-            lock_room_int = None
-        lock_room_str = str(lock_room_cell).strip()
-
-        same_room = (
-            (target_room_id_int is not None and lock_room_int == target_room_id_int)
-            or (lock_room_str == target_room_id_str)
-        )
-        if not same_room:
-            continue
-
-        # 時段比對
-        try:
-            lock_slot_id = int(slot_id_cell)
-        except Exception:
-            continue
-        if lock_slot_id not in target_slots:
-            continue
-
-        # 日期→週幾
-        lock_dt = _parse_date_cell(lock_date_cell)
-        if lock_dt is None:
-            continue
-        lock_wd = _to_zh_weekday(lock_dt)
-
-        # 週幾命中 → 擋
-        if str(lock_wd) == str(weekday_str):
-            return True, f"此時段有人正在一般預約中（{lock_wd} / 房 {lock_room_str} / 時段 {lock_slot_id}）。"
-
-    return False, ""
-
-
-# 寫入預約
-def add_booking():
-    wb = load_workbook(FILENAME)
-    ws = wb["Schedule"]
-    new_id = 1
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        if isinstance(row[0], int):
-            new_id = max(new_id, row[0] + 1)
-    slot_str = ",".join(map(str, app_state["selected_slots"]))
-    ws.append([new_id, app_state["selected_date"], slot_str, app_state["selected_room"],
-           app_state["user_id"], app_state["purpose"], False])
-    # 初學者註解：改用安全存檔；若被 Excel 鎖住或寫入失敗，給人看得懂的訊息
-    if not safe_save(wb, FILENAME):
-        messagebox.showerror("錯誤", "儲存 Excel 檔案失敗，請先關閉 Excel 或檢查檔案權限。")
-        return False  # ✅ 新增
-    return True  # ✅ 新增
-# 檢查某固定預約是否會與既有的 Schedule 衝突
-def is_fixed_booking_conflict(weekday_str, slot_id, room_id, weeks_ahead=4):
-    weekday_map = {
-        "週一": 0,
-        "週二": 1,
-        "週三": 2,
-        "週四": 3,
-        "週五": 4
-    }
-
-    if weekday_str not in weekday_map:
-        return False
-
-    weekday_index = weekday_map[weekday_str]
-    today = datetime.today()
-    this_weekday = today.weekday()
-    days_until_target = (weekday_index - this_weekday) % 7
-    next_target_date = today + timedelta(days=days_until_target)
-
-    wb = load_workbook(FILENAME)
-    ws = wb["Schedule"]
-
-# 回傳與 FixedBooking 衝突的清單（根據 星期、時段、會議室）
-def find_fixed_conflicts(weekday_str, slot_ids, room_id):
-    wb = load_workbook(FILENAME)
-    ws_fixed = wb["FixedBooking"]
-    ws_slot = wb["TimeSlots"]
-
-    # 建立 slot_id → 時間區間 的對照表
-    slot_time_map = {}
-    for row in ws_slot.iter_rows(min_row=2, values_only=True):
-        sid, time_str, disabled, *_ = row
-        if sid and time_str:
-            slot_time_map[int(sid)] = time_str
-
-    conflicts = []
-
-    for row in ws_fixed.iter_rows(min_row=2, values_only=True):
-        if len(row) >= 7 and row[6] is True:
-            continue  # ✅ 跳過已取消的固定預約
-
-        bid, wday, sid, rid, uid, purpose = row[:6]
-
-        if wday == weekday_str and sid in slot_ids and rid == room_id:
-            conflicts.append({
-                "source": "FixedBooking",
-                "booking_id": bid,
-                "weekday": wday,
-                "slot": sid,
-                "slot_time": slot_time_map.get(sid, "時間未知"),
-                "room": rid,
-                "user": uid,
-                "purpose": purpose
-            })
-
-    return conflicts
-
-# 回傳與 Schedule 衝突的清單（檢查未來 N 週）
-def find_schedule_conflicts(weekday_str, slot_ids, room_id, weeks_ahead=4):
-    weekday_map = {"週一": 0, "週二": 1, "週三": 2, "週四": 3, "週五": 4}
-    if weekday_str not in weekday_map:
-        return []
-
-    target_weekday = weekday_map[weekday_str]
-    today = datetime.today()
-    days_until_next = (target_weekday - today.weekday() + 7) % 7
-    base_date = today + timedelta(days=days_until_next)
-
-    wb = load_workbook(FILENAME)
-    ws = wb["Schedule"]
-    conflicts = []
-
-    for i in range(weeks_ahead):
-        target_date = (base_date + timedelta(days=i * 7)).strftime("%Y/%m/%d")
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            booking_id, record_date, slots, booked_room, uid, purpose, canceled = row[:7]
-            if record_date == target_date and booked_room == room_id and not canceled:
-                booked_slots = set(map(int, slots.split(',')))
-                if any(slot in booked_slots for slot in slot_ids):
-                    intersect_slots = booked_slots.intersection(slot_ids)
-                    for sid in intersect_slots:
-                        conflicts.append({
-                            "source": "Schedule",
-                            "booking_id": booking_id,
-                            "date": record_date,
-                            "slot": sid,
-                            "room": booked_room,
-                            "user": uid,
-                            "purpose": purpose
-                        })
-    return conflicts
-
-
 # 主應用程式
 class MeetingApp(tk.Tk):
 
-    def __init__(self):
+    def __init__(self, client=None):
         super().__init__()
         self.title("會議室預約系統")
 
@@ -485,6 +50,14 @@ class MeetingApp(tk.Tk):
         self.grid_rowconfigure(0, weight=1)
         self.grid_columnconfigure(0, weight=1)
 
+        # 讀寫 Excel 都交給背景執行緒，畫面不會卡住（見 io_worker.py）
+        self.io = IOWorker(self)
+
+        # 預約相關的查詢 / 寫入：一般模式直接用 booking_core，
+        # 連到預約伺服器時（--server）改用 BookingClient，方法名稱都一樣
+        self.client = client
+        self.backend = client if client is not None else booking_core
+
         self.frames = {}
         for F in (PageDateInput, PageTimeSelect, PageRoomSelect, PageConfirm, PageFinish, PageWeeklyOverview,PageCancelBooking,PageUserBookingList,PageCancelSuccess,PageFixedBooking,PageFixedCancelBooking,PageRoomInfo):
             page_name = F.__name__
@@ -494,7 +67,25 @@ class MeetingApp(tk.Tk):
 
         self.show_frame("PageDateInput")
 
+        # 關閉視窗前把異動日誌併回 Excel，讓管理者打開 Excel 看到的是最新資料
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        self.io.shutdown()  # 等還在背景寫入的工作做完
+        if self.client is None:
+            booking_core.checkpoint()  # 伺服器模式由伺服器負責
+        self.destroy()
+
+    def store_locked(self):
+        """
+        本機資料檔是否被 Excel 等程式開著（開著就存不進去）。
+        伺服器模式由伺服器負責檔案、SQLite 也不會被 Excel 鎖住，這兩種情況都不碰本機檔案。
+        """
+        if self.client is not None or is_sqlite_path(DEFAULT_STORE):
+            return False
+        return is_excel_file_locked(DEFAULT_STORE)
 
+    @tracing.ui_action
     def show_frame(self, page_name):
         frame = self.frames[page_name]
         frame.tkraise()
@@ -620,6 +211,11 @@ class PageRoomInfo(tk.Frame):
         return str(v).strip()
 
     def refresh(self):
+        # 啟用中的會議室在背景讀（伺服器模式向伺服器要，不讀本機檔案），讀完再回主執行緒畫表
+        self.controller.io.submit(self.controller.backend.load_rooms, on_done=self._show_rooms, key="room_info")
+
+    @tracing.traced(cat="render")
+    def _show_rooms(self, rooms):
         # 清表：移除所有儲存格與行，再重建表頭與資料
         for w in self.rows_frame.winfo_children():
             w.destroy()
@@ -636,34 +232,19 @@ class PageRoomInfo(tk.Frame):
         self._head_cell(4, "連結")
         self._head_cell(5, "操作")
 
-        # ====== 讀取資料並建立每列（row 從 1 開始）======
-        from openpyxl import load_workbook
-        wb = load_workbook(FILENAME)
-        if "MeetingRooms" not in wb.sheetnames:
-            tk.Label(self.rows_frame, text="找不到 MeetingRooms 工作表",
-                     bg="white", fg="#6b7280").grid(row=1, column=0, columnspan=self.N_COLS, sticky="w", padx=6, pady=6)
-            return
-        ws = wb["MeetingRooms"]
+        # ====== 建立每列（row 從 1 開始）======
 
         def _s(v):  # 一般文字欄位：None -> "" 並去空白
             return "" if v is None else str(v).strip()
 
         row_grid = 1
-        # values_only=False 取得 Cell 物件；但此需求只需值即可
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            # Excel 欄位順序：0:ID, 1:名稱, 2:帳號, 3:密碼, 4:連結, 5:用途, 6:停用, 7:可外借
-            name_raw, account_raw, password_raw, url_raw, purpose_raw, disabled = row[1], row[2], row[3], row[4], row[5], row[6]
-
-            disabled_flag = (disabled is True) or (str(disabled).strip().upper() == "TRUE")
-            if disabled_flag:
-                continue
-
+        for room in rooms:
             # 轉成要顯示的文字（帳號/密碼特別處理成「非科學記號」）
-            name = _s(name_raw)
-            purpose = _s(purpose_raw)
-            account = self._excel_num_as_text(account_raw)
-            password = self._excel_num_as_text(password_raw)
-            url = _s(url_raw)
+            name = _s(room.name)
+            purpose = _s(room.usage)
+            account = self._excel_num_as_text(room.account)
+            password = self._excel_num_as_text(room.password)
+            url = _s(room.link)
 
             # 擺上同一個 rows_frame（同一張表）
             self._data_cell(row_grid, 0, name)
@@ -764,9 +345,8 @@ class PageUserBookingList(tk.Frame):
         tk.Button(btn_frame, text="返回", command=lambda: controller.show_frame("PageCancelBooking"),
                   font=("Arial", 12), bg="#e5e7eb", fg="#111827", relief="flat").pack(side="left", padx=10)
 
+    @tracing.ui_action
     def load_user_records(self, user_id):
-        from datetime import datetime, timedelta
-
         self.user_id = user_id
         self.lbl_title.config(text=f"使用者：{user_id}，預約紀錄")
         self.records = []
@@ -775,29 +355,35 @@ class PageUserBookingList(tk.Frame):
         for widget in self.list_frame.winfo_children():
             widget.destroy()
 
-        slot_mapping = self.load_time_slot_mapping()
-        today = datetime.today().date()
+        # 時段對照表與預約紀錄在背景讀，讀完再回主執行緒畫清單
+        self.controller.io.submit(self._fetch_records, user_id,
+                                  on_done=self._show_records,
+                                  key="user_records")
 
-        wb = load_workbook(FILENAME)
-        ws = wb["Schedule"]
+    def _fetch_records(self, user_id):
+        # 背景執行緒：只讀資料，不碰畫面
+        # === 一般預約（尚未取消的；伺服器模式向伺服器要）===
+        return self.load_time_slot_mapping(), self.controller.backend.load_user_bookings(user_id)
 
-        # === 一般預約 ===
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            booking_id, date_str, slots, room_id, uid, purpose, canceled = row
-            if uid == user_id and not canceled:
-                try:
-                    booking_date = datetime.strptime(str(date_str), "%Y/%m/%d").date()
-                    if booking_date >= today:
-                        slot_ids = list(map(int, slots.split(',')))
-                        time_strings = [slot_mapping.get(sid, f"時段{sid}") for sid in slot_ids]
-                        time_str = "，".join(time_strings)
+    @tracing.traced(cat="render")
+    def _show_records(self, data):
+        slot_mapping, bookings = data
+        today = datetime.today().date()
 
-                        # ✅ 每新增一筆預約記錄時，也新增一個對應的勾選變數
-                        self.records.append(("[一般]", booking_id, booking_date, time_str, room_id, purpose))
-                        var = tk.BooleanVar()
-                        self.vars.append(var)
-                except:
-                    continue
+        for b in bookings:
+            try:
+                booking_date = datetime.strptime(str(b.date), "%Y/%m/%d").date()
+                if booking_date >= today:
+                    slot_ids = list(map(int, b.slot_str.split(',')))
+                    time_strings = [slot_mapping.get(sid, f"時段{sid}") for sid in slot_ids]
+                    time_str = "，".join(time_strings)
+
+                    # ✅ 每新增一筆預約記錄時，也新增一個對應的勾選變數
+                    self.records.append(("[一般]", b.booking_id, booking_date, time_str, b.room_id, b.purpose))
+                    var = tk.BooleanVar()
+                    self.vars.append(var)
+            except:
+                continue
 
 
 
@@ -872,15 +458,10 @@ class PageUserBookingList(tk.Frame):
             lbl_info.pack(fill="x", pady=(2, 0))
 
     def load_time_slot_mapping(self):
-        # 讀取 TimeSlots 工作表，建立 {1: "09:00–10:00", 2: "..."} 對照表
-        wb = load_workbook(FILENAME)
-        ws = wb["TimeSlots"]
-        mapping = {}
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            slot_id, time_range, disabled, *_ = row  # 使用 *_ 來忽略後面的多餘欄位
-            mapping[int(slot_id)] = time_range
-        return mapping
+        # 建立 {1: "09:00–10:00", 2: "..."} 對照表（含停用的時段，舊紀錄才顯示得出來）
+        return self.controller.backend.load_slot_labels()
 
+    @tracing.ui_action
     def delete_selected(self):
         selected_ids = [
             self.records[i][1] for i, var in enumerate(self.vars) if var.get()
@@ -891,38 +472,34 @@ class PageUserBookingList(tk.Frame):
 
         # 初學者註解：
         # 1) 先檢查 Excel 是否被開啟（被鎖住），鎖住時就不繼續往下做，避免做了也存不進去。
-        if is_excel_file_locked(FILENAME):
+        if self.controller.store_locked():
             messagebox.showerror("錯誤", "Excel 檔案正在被使用中，請先關閉再試。")
             return
 
-        try:
-            wb = load_workbook(FILENAME)
-            ws = wb["Schedule"]
-            updated = False
+        if self.controller.io.is_busy("cancel_booking"):
+            return  # 上一次刪除還在處理中，避免連點
 
-            # ✅ 一般預約取消（將第 7 欄 canceled 設為 True）
-            for row in ws.iter_rows(min_row=2):
-                if row[0].value in selected_ids:
-                    row[6].value = True
-                    updated = True
+        def work():
+            # 初學者註解：
+            # 2) 寫入日誌，回傳 None 代表找不到資料、False 代表「沒有成功寫入」（例如沒有權限）
+            return self.controller.backend.cancel_bookings(selected_ids)
 
-            if not updated:
+        def done(ok):
+            # 3) 回到主執行緒才顯示訊息或換頁
+            if ok is None:
                 messagebox.showinfo("提示", "找不到對應的預約資料，可能已被取消或不存在。")
                 return
-
-            # 初學者註解：
-            # 2) 嘗試存檔，safe_save() 回傳 False 代表「沒有成功寫入」（例如檔案被鎖）
-            ok = safe_save(wb, FILENAME)
             if not ok:
                 messagebox.showerror("錯誤", "儲存 Excel 檔案失敗，請先關閉 Excel 或檢查檔案權限。")
                 return
-
             # 只有在確認寫入成功後，才顯示成功頁面
             self.controller.show_frame("PageCancelSuccess")
 
-        except Exception as e:
+        def failed(e):
             messagebox.showerror("錯誤", f"讀取或寫入 Excel 檔案失敗。\n錯誤原因：{e}")
 
+        self.controller.io.submit(work, on_done=done, on_error=failed, key="cancel_booking")
+
 
 
 #99 取消頁面
@@ -1006,6 +583,7 @@ class PageCancelBooking(tk.Frame):
             relief="flat"
         ).grid(row=2, column=0, pady=(0, 30))
 
+    @tracing.ui_action
     def query_user_booking(self):
         user_id = self.entry_userid.get().strip()
         if not user_id:
@@ -1018,7 +596,7 @@ class PageFixedBooking(tk.Frame):
     def __init__(self, parent, controller):
         super().__init__(parent, bg="white")
         self.controller = controller
-        self.time_slots = load_time_slots()
+        self.time_slots = controller.backend.load_time_slots()
         self.rooms = self.load_rooms()
 
         tk.Label(self, text="固定預約管理", font=("Arial", 20, "bold"), bg="white").pack(pady=(30, 10))
@@ -1064,7 +642,7 @@ class PageFixedBooking(tk.Frame):
         # 會議室選單（請選擇）
         tk.Label(right_frame, text="會議室：", font=("Arial", 12), bg="white").pack(anchor="w", pady=(0, 5))
         self.room_var = tk.StringVar()
-        room_ids = [r[0] for r in self.rooms]
+        room_ids = [r.room_id for r in self.rooms]
         room_options = ["請選擇"] + room_ids
         self.room_var.set("請選擇")
         room_menu = tk.OptionMenu(right_frame, self.room_var, *room_options)
@@ -1125,14 +703,11 @@ class PageFixedBooking(tk.Frame):
         ).pack(side="left", padx=20)
 
     def load_rooms(self):
-        wb = load_workbook(FILENAME)
-        ws = wb["MeetingRooms"]
-        return [
-            row for row in ws.iter_rows(min_row=2, values_only=True)
-            if str(row[6]).strip().upper() != "TRUE"  # ✅ 排除「停用」的會議室
-        ]
+        # ✅ 只列啟用中的會議室（伺服器模式向伺服器要，本機不需要有 Excel）
+        return self.controller.backend.load_rooms()
 
 
+    @tracing.ui_action
     def save_fixed_booking(self):
         # 取得表單欄位內容
         weekday = self.weekday_var.get().strip()
@@ -1158,54 +733,56 @@ class PageFixedBooking(tk.Frame):
             messagebox.showwarning("欄位不完整", "請輸入使用目的")
             return
 
-        # === 新增：TempLock（一般預約進行中）比對，一旦命中就阻擋本次送出 ===
-        hit, _msg = has_templock_conflict_for_fixed(
-            weekday_str=weekday,
-            slot_ids=selected_slots,
-            room_id=room_id,          # 可為字串；函式內會做容錯
-            filename=FILENAME
-        )
-        if hit:
-            messagebox.showerror("預約中", "此時段有人正在預約中，請稍候再送出。")
-            return
+        if self.controller.io.is_busy("fixed_booking"):
+            return  # 上一次送出還在處理中，避免連點
 
-        # ===== 衝突檢查（保留你原本的邏輯） =====
-        fixed_conflicts = find_fixed_conflicts(weekday, selected_slots, room_id)
-        schedule_conflicts = find_schedule_conflicts_by_weekday(weekday, selected_slots, room_id)
+        backend = self.controller.backend
 
-        if fixed_conflicts or schedule_conflicts:
-            conflict_msgs = []
-            for c in fixed_conflicts:
-                conflict_msgs.append(
-                    f"[固定] 星期 {c['weekday']}，時段 {c['slot']}, {c['slot_time']}，會議室 {c['room']}，預約人 {c['user']}（用途：{c['purpose']}）"
-                )
-            for c in schedule_conflicts:
-                conflict_msgs.append(
-                    f"[正式] 日期 {c['date']}，時段 {c['slot']}, {c['slot_time']}，會議室 {c['room']}，預約人 {c['user']}（用途：{c['purpose']}）"
-                )
-            messagebox.showerror(
-                "衝突提醒",
-                "以下預約已存在，請重新選擇時段或會議室：\n\n" + "\n".join(conflict_msgs)
+        def work():
+            # 背景執行緒：不可以碰畫面，只回傳結果
+            # === 新增：TempLock（一般預約進行中）比對，一旦命中就阻擋本次送出 ===
+            hit, _msg = backend.has_templock_conflict_for_fixed(
+                weekday_str=weekday,
+                slot_ids=selected_slots,
+                room_id=room_id,          # 可為字串；函式內會做容錯
             )
-            return
+            if hit:
+                return "locked"
+            # ===== 衝突檢查 + 寫入固定預約 =====
+            return backend.commit_fixed_booking(weekday, selected_slots, room_id, user_id, purpose)
+
+        def done(outcome):
+            # 回到主執行緒才顯示訊息或換頁
+            if outcome == "locked":
+                messagebox.showerror("預約中", "此時段有人正在預約中，請稍候再送出。")
+                return
+            result, conflicts = outcome
+            fixed_conflicts, schedule_conflicts = conflicts["fixed"], conflicts["schedule"]
+
+            if result is None:
+                conflict_msgs = []
+                for c in fixed_conflicts:
+                    conflict_msgs.append(
+                        f"[固定] 星期 {c['weekday']}，時段 {c['slot']}, {c['slot_time']}，會議室 {c['room']}，預約人 {c['user']}（用途：{c['purpose']}）"
+                    )
+                for c in schedule_conflicts:
+                    conflict_msgs.append(
+                        f"[正式] 日期 {c['date']}，時段 {c['slot']}, {c['slot_time']}，會議室 {c['room']}，預約人 {c['user']}（用途：{c['purpose']}）"
+                    )
+                messagebox.showerror(
+                    "衝突提醒",
+                    "以下預約已存在，請重新選擇時段或會議室：\n\n" + "\n".join(conflict_msgs)
+                )
+                return
+            if not result:
+                messagebox.showerror("錯誤", "固定預約儲存失敗，請先關閉 Excel 或檢查檔案權限。")
+                return
 
-        # ===== 寫入固定預約（原本流程） =====
-        wb = load_workbook(FILENAME)
-        ws = wb["FixedBooking"]
-        max_id = 0
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if isinstance(row[0], int):
-                max_id = max(max_id, row[0])
-        for sid in selected_slots:
-            ws.append([max_id + 1, weekday, sid, room_id, user_id, purpose, False])
-            max_id += 1
-        # 初學者註解：固定預約 → 安全存檔
-        if not safe_save(wb, FILENAME):
-            messagebox.showerror("錯誤", "固定預約儲存失敗，請先關閉 Excel 或檢查檔案權限。")
-            return
+            messagebox.showinfo("成功", "固定預約已儲存")
+            self.controller.show_frame("PageDateInput")
 
-        messagebox.showinfo("成功", "固定預約已儲存")
-        self.controller.show_frame("PageDateInput")
+        # 檢查 + 寫入交給背景執行緒，大檔案存檔時視窗不會卡住
+        self.controller.io.submit(work, on_done=done, key="fixed_booking")
 
 # 頁面一：輸入日期
 class PageDateInput(tk.Frame):
@@ -1363,6 +940,7 @@ class PageDateInput(tk.Frame):
             relief="flat"
         ).pack(side="left", padx=10, ipadx=5)
 
+    @tracing.ui_action
     def next_page(self):
         date_input = self.date_entry.get().strip()
         try:
@@ -1375,7 +953,7 @@ class PageDateInput(tk.Frame):
         if parsed_date.date() < today.date():
             messagebox.showerror("錯誤", "只能預約今天或未來的日期")
             return
-        if is_excel_file_locked(FILENAME):
+        if self.controller.store_locked():
             messagebox.showerror("錯誤", "Excel 檔案正在被使用中，請先關閉再試。")
             return
         app_state["selected_date"] = parsed_date.strftime("%Y/%m/%d")
@@ -1393,7 +971,7 @@ class PageTimeSelect(tk.Frame):
         super().__init__(parent, bg="white")
         self.controller = controller
         self.vars = {}
-        self.time_slots = load_time_slots()
+        self.time_slots = controller.backend.load_time_slots()
 
         # 主容器
         main_frame = tk.Frame(self, bg="white")
@@ -1467,19 +1045,27 @@ class PageTimeSelect(tk.Frame):
             relief="flat"
         ).pack(side="left", padx=8, ipadx=5)
 
+    @tracing.ui_action
     def refresh(self):
-        cleanup_expired_locks()
         for widget in self.slot_frame.winfo_children():
             widget.destroy()
         self.vars.clear()
 
         date = app_state["selected_date"]
-        available_slots = []
 
-        for sid, time_str in self.time_slots.items():
-            rooms = get_available_rooms(date, [sid])
-            if rooms:
-                available_slots.append((sid, time_str))
+        # 一次算出整天每個時段的可用會議室，不再逐時段重讀 Excel；在背景讀，讀完才畫勾選框
+        self.controller.io.submit(
+            self.controller.backend.load_day_availability, date, list(self.time_slots.keys()),
+            on_done=lambda day_availability: self._show_slots(date, day_availability),
+            key="time_select",
+        )
+
+    @tracing.traced(cat="render")
+    def _show_slots(self, date, day_availability):
+        available_slots = [
+            (sid, time_str) for sid, time_str in self.time_slots.items()
+            if day_availability.get(sid)
+        ]
 
         if not available_slots:
             messagebox.showinfo("預約已滿", f"{date} 所有時段都已被預約，請選擇其他日期")
@@ -1534,12 +1120,13 @@ class PageTimeSelect(tk.Frame):
             var.set(0)
         app_state["selected_slots"] = []
 
+    @tracing.ui_action
     def next_page(self):
         app_state["selected_slots"] = [sid for sid, var in self.vars.items() if var.get()]
         if not app_state["selected_slots"]:
             messagebox.showwarning("提醒", "請至少選擇一個時段")
             return
-        if is_excel_file_locked(FILENAME):
+        if self.controller.store_locked():
             messagebox.showerror("錯誤", "Excel 檔案正在被使用中，請先關閉再試。")
             return
         self.controller.show_frame("PageRoomSelect")
@@ -1646,31 +1233,41 @@ class PageRoomSelect(tk.Frame):
         ).pack(side="left", padx=8, ipadx=5)
 
     # 同一類別中新增一個方法
+    @tracing.ui_action
     def on_refresh(self):
         """
         初學者註解：
         - 重新整理會做兩件事：
         1) cleanup_expired_locks()：清過期暫鎖，避免清單顯示過時
         2) 重新載入可用會議室：同步正式/固定預約的最新狀態
+        - 讀取在背景進行，清單更新完才跳出「已更新」
         """
-        self.refresh()
-        from tkinter import messagebox
-        messagebox.showinfo("已更新", "已重新整理會議室清單")
-
+        self.refresh(on_done=lambda: messagebox.showinfo("已更新", "已重新整理會議室清單"))
 
-    def refresh(self):
-        # 清除過期暫時鎖定的資料
-        cleanup_expired_locks()
 
-        # 清除 Listbox 舊資料
+    @tracing.ui_action
+    def refresh(self, on_done=None):
+        # 清除 Listbox 舊資料；讀取期間不能選，避免選到舊清單
+        self.listbox.config(state=tk.NORMAL)
         self.listbox.delete(0, tk.END)
+        self.rooms = []
 
         # 取得目前選擇的日期與時段
         date = app_state["selected_date"]
-        slots = app_state["selected_slots"]
-        
-        # 查詢會議室清單（會包含 LOCKING 狀態）
-        self.rooms = get_available_rooms(date, slots)
+        slots = list(app_state["selected_slots"])
+
+        def done(day_availability):
+            self._show_rooms(day_availability, slots)
+            if on_done is not None:
+                on_done()
+
+        # 查詢會議室清單（會包含 LOCKING 狀態）；與時段頁共用同一次整天掃描
+        self.controller.io.submit(self.controller.backend.load_day_availability, date, slots,
+                                  on_done=done, key="room_select")
+
+    @tracing.traced(cat="render")
+    def _show_rooms(self, day_availability, slots):
+        self.rooms = rooms_free_for_slots(day_availability, slots)
 
         # 若沒有任何可用的會議室
         if not self.rooms:
@@ -1696,6 +1293,7 @@ class PageRoomSelect(tk.Frame):
             self.listbox.activate(selected_index)
             self.listbox.see(selected_index)
 
+    @tracing.ui_action
     def next_page(self):
         selection = self.listbox.curselection()
         if not selection:
@@ -1703,42 +1301,45 @@ class PageRoomSelect(tk.Frame):
             return
 
         index = selection[0]
+        if index >= len(self.rooms):
+            return  # 清單還在讀取中
+        if self.controller.io.is_busy("room_lock"):
+            return  # 上一次的檢查 / 上鎖還沒完成，避免連點
         room_id = self.rooms[index][0]
         app_state["selected_room"] = room_id
 
         date = app_state["selected_date"]
-        slot_ids = app_state["selected_slots"]
+        slot_ids = list(app_state["selected_slots"])
         my_token = app_state["lock_token"]
 
-        # ✅ 檢查是否已被正式預約（避免 stale 資訊）
-        if is_conflict(date, slot_ids, room_id):
-            messagebox.showerror("預約失敗", "此會議室已被其他人正式預約，請重新選擇。")
-            self.refresh()
-            return
+        backend = self.controller.backend
 
-        # ✅ TempLock 再次確認是否有人預約中
-        wb = load_workbook(FILENAME)
-        ws = wb["TempLock"]
-        now = datetime.now()
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            token, lock_date, slot_id, locked_room, status, timestamp_str = row
-            if lock_date == date and int(slot_id) in slot_ids and locked_room == room_id:
-                try:
-                    lock_time = datetime.strptime(timestamp_str, "%Y/%m/%d %H:%M:%S")
-                    if (now - lock_time).total_seconds() < LOCK_EXPIRY_SECONDS and token != my_token:
-                        messagebox.showerror("預約中", "此會議室正在被他人預約中，請等待約 3 分鐘後再試。")
-                        return
-                except:
-                    continue
-
-        # ✅ 若沒鎖 → 我來鎖起來
-        lock_room(token=my_token, date=date, slot_ids=slot_ids, room_id=room_id)
-        app_state["has_locked"] = True
-
-        if is_excel_file_locked(FILENAME):
-            messagebox.showerror("錯誤", "Excel 檔案正在被使用中，請先關閉再試。")
-            return
-        self.controller.show_frame("PageConfirm")
+        def work():
+            # ✅ 檢查是否已被正式預約（避免 stale 資訊）
+            if backend.is_conflict(date, slot_ids, room_id):
+                return "booked"
+            # ✅ 確認沒人預約中就鎖起來（檢查與上鎖在同一個交易內完成）
+            return backend.lock_room(token=my_token, date=date, slot_ids=slot_ids, room_id=room_id)
+
+        def done(locked):
+            if locked == "booked":
+                messagebox.showerror("預約失敗", "此會議室已被其他人正式預約，請重新選擇。")
+                self.refresh()
+                return
+            if locked is None:
+                messagebox.showerror("錯誤", "建立暫時鎖定失敗，請稍後再試。")
+                return
+            if not locked:
+                messagebox.showerror("預約中", f"此會議室正在被他人預約中，請等待約 {LOCK_EXPIRY_SECONDS} 秒後再試。")
+                return
+            app_state["has_locked"] = True
+
+            if self.controller.store_locked():
+                messagebox.showerror("錯誤", "Excel 檔案正在被使用中，請先關閉再試。")
+                return
+            self.controller.show_frame("PageConfirm")
+
+        self.controller.io.submit(work, on_done=done, key="room_lock")
 
 
 
@@ -1832,22 +1433,26 @@ class PageConfirm(tk.Frame):
             fg="#111827",
             relief="flat"
         ).pack(side="left", padx=8, ipadx=5)
+    @tracing.ui_action
     def cancel_and_back(self):
         # 如果有鎖定，就釋放
+            self.stop_heartbeat()
             if app_state["has_locked"]:
-             release_token_locks(app_state["lock_token"])
+             self.controller.io.submit(self.controller.backend.release_token_locks, app_state["lock_token"])
             app_state["has_locked"] = False
             self.controller.show_frame("PageRoomSelect")
 
 
+    @tracing.ui_action
     def refresh(self):
-        cleanup_expired_locks()
+        self.controller.io.submit(self.controller.backend.cleanup_expired_locks)
         self.entry_user.delete(0, tk.END)
         self.entry_user.insert(0, app_state.get("user_id", ""))
 
         self.entry_purpose.delete("1.0", tk.END)
         self.entry_purpose.insert("1.0", app_state.get("purpose", ""))
         self.start_timeout_timer()  # ✅ 加這行
+        self.start_heartbeat()
     # 啟動或重設計時器
     def start_timeout_timer(self):
         if hasattr(self, "_timeout_id"):
@@ -1856,10 +1461,59 @@ class PageConfirm(tk.Frame):
         # 啟動新的倒數計時器（180秒 = 180,000 毫秒）
         self._timeout_id = self.after(180000, self.timeout_redirect)
 
+    # 續約心跳：停在這頁的期間，每 HEARTBEAT_SECONDS 秒在背景幫暫時鎖定續約
+    # 初學者註解：租約很短（見 lease_store.LEASE_TTL），這台當機就不會再續約，會議室很快就會釋出；
+    # 正常使用中則一直續約，不會被別台清除過期鎖定時刪掉。
+    def start_heartbeat(self):
+        self.stop_heartbeat()
+        self._heartbeat_id = self.after(HEARTBEAT_SECONDS * 1000, self._heartbeat)
+
+    def stop_heartbeat(self):
+        if getattr(self, "_heartbeat_id", None):
+            self.after_cancel(self._heartbeat_id)
+        self._heartbeat_id = None
+
+    @tracing.ui_action
+    def _heartbeat(self):
+        self._heartbeat_id = None
+        if not app_state["has_locked"]:
+            return
+
+        backend = self.controller.backend
+        token = app_state["lock_token"]
+        date = app_state["selected_date"]
+        slot_ids = list(app_state["selected_slots"])
+        room_id = app_state["selected_room"]
+
+        def work():
+            renewed = backend.renew_lease(token)
+            if renewed is False:
+                # 租約已過期（例如電腦休眠過）→ 會議室若還沒被別人鎖走，就重新鎖回來
+                return backend.lock_room(token=token, date=date, slot_ids=slot_ids, room_id=room_id)
+            return renewed
+
+        # 續約失敗（連線、寫入錯誤）不跳視窗，下一次心跳再試
+        self.controller.io.submit(work, on_done=self._after_heartbeat,
+                                  on_error=lambda e: self.start_heartbeat(), key="lease_renew")
+
+    def _after_heartbeat(self, renewed):
+        if not app_state["has_locked"]:
+            return  # 續約途中已經送出預約或離開這頁
+        if renewed is False:
+            app_state["has_locked"] = False
+            if hasattr(self, "_timeout_id"):
+                self.after_cancel(self._timeout_id)
+            messagebox.showwarning("鎖定已失效", "暫時鎖定已過期，會議室已被其他人選走，請重新選擇。")
+            self.controller.show_frame("PageRoomSelect")
+            return
+        self.start_heartbeat()
+
     # 倒數結束 → 自動跳轉
+    @tracing.ui_action
     def timeout_redirect(self):
+        self.stop_heartbeat()
         if app_state["has_locked"]:
-            release_token_locks(app_state["lock_token"])
+            self.controller.io.submit(self.controller.backend.release_token_locks, app_state["lock_token"])
             app_state["has_locked"] = False
 
         messagebox.showinfo("預約超時", "您停留太久，系統將自動返回首頁，請重新預約。")
@@ -1871,6 +1525,7 @@ class PageConfirm(tk.Frame):
         self.entry_user.delete(0, tk.END)
         self.entry_purpose.delete("1.0", tk.END)
 
+    @tracing.ui_action
     def finish(self):
         uid = self.entry_user.get().strip()
         purpose = self.entry_purpose.get("1.0", tk.END).strip()
@@ -1881,13 +1536,20 @@ class PageConfirm(tk.Frame):
         app_state["user_id"] = uid
         app_state["purpose"] = purpose
 
+        if self.controller.io.is_busy("confirm_slots"):
+            return  # 還在讀時段，避免連點跳出兩個確認視窗
+        # 轉換時段 ID 為時間文字：時段表在背景讀，讀完再跳出確認視窗
+        self.controller.io.submit(self.controller.backend.load_time_slots,
+                                  on_done=self._confirm, key="confirm_slots")
+
+    def _confirm(self, slot_map):
         booking_data = get_booking_data()
+        uid = booking_data["user_id"]
+        purpose = booking_data["purpose"]
         date = booking_data["date"]
         slot_ids = booking_data["time_slots"]
         room_id = booking_data["room_id"]
 
-        # 轉換時段 ID 為時間文字
-        slot_map = load_time_slots()
         slot_texts = [slot_map.get(sid, f"時段 {sid}") for sid in slot_ids]
         slot_display = "，".join(slot_texts)
 
@@ -1904,24 +1566,37 @@ class PageConfirm(tk.Frame):
             return
 
         self.do_booking()
+    @tracing.ui_action
     def do_booking(self):
+        if self.controller.io.is_busy("booking"):
+            return  # 已經送出，還在寫入中
         booking_data = get_booking_data()
-        date = booking_data["date"]
-        slot_ids = booking_data["time_slots"]
-        room_id = booking_data["room_id"]
+        self.stop_heartbeat()  # 寫入時會釋放租約，不要再續約（續約失敗會把它重新鎖回來）
+
+        # 衝突檢查、寫入、釋放暫時鎖定一次完成（在背景執行，畫面不會卡住）
+        self.controller.io.submit(
+            self.controller.backend.commit_booking,
+            booking_data["date"], list(booking_data["time_slots"]), booking_data["room_id"],
+            booking_data["user_id"], booking_data["purpose"], app_state["lock_token"],
+            on_done=lambda result: self._after_booking(result, booking_data["room_id"]),
+            key="booking",
+        )
 
-        if is_conflict(date, slot_ids, room_id):
+    @tracing.traced(cat="render")
+    def _after_booking(self, result, room_id):
+        # None 代表已被別人預約；False 代表寫入失敗
+        if result is None:
             messagebox.showerror(
                 "預約失敗",
                 f"您選擇的會議室（{room_id}）在指定時段已被其他人預約。\n請重新選擇。"
             )
             self.controller.show_frame("PageRoomSelect")
             return
-
-        if not add_booking():   # ✅ 若寫入失敗，不執行後續
+        if not result:   # ✅ 若寫入失敗，不執行後續
+            messagebox.showerror("錯誤", "儲存 Excel 檔案失敗，請先關閉 Excel 或檢查檔案權限。")
+            self.start_heartbeat()  # 還留在這頁，可以再送出一次
             return
 
-        release_token_locks(app_state["lock_token"])
         app_state["has_locked"] = False
         app_state["lock_token"] = str(uuid.uuid4())
 
@@ -2042,8 +1717,6 @@ class PageFixedCancelBooking(tk.Frame):
         self.records = []
         self.vars = []
 
-        self.time_map = self.load_time_slot_mapping()
-
         tk.Label(self, text="固定預約取消", font=("Arial", 18, "bold"), bg="white",fg="red").pack(pady=(30, 10))
 
         # ==== 使用者輸入區 ====
@@ -2099,15 +1772,9 @@ class PageFixedCancelBooking(tk.Frame):
                   command=lambda: controller.show_frame("PageDateInput")).pack(side="left", padx=10)
 
     def load_time_slot_mapping(self):
-        wb = load_workbook(FILENAME)
-        ws = wb["TimeSlots"]
-        mapping = {}
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            sid, time_str, disabled, *_ = row
-            if sid and time_str:
-                mapping[int(sid)] = time_str
-        return mapping
+        return self.controller.backend.load_slot_labels()
 
+    @tracing.ui_action
     def search(self):
         user_id = self.entry_userid.get().strip()
         self.records = []
@@ -2122,21 +1789,22 @@ class PageFixedCancelBooking(tk.Frame):
             messagebox.showwarning("提醒", "請輸入使用者 ID")
             return
 
-        wb = load_workbook(FILENAME)
-        if "FixedBooking" not in wb.sheetnames:
-            messagebox.showinfo("無資料", "目前尚無任何固定預約")
-            return
-
-        ws = wb["FixedBooking"]
-
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if len(row) < 6 or row[4] != user_id:
-                continue
-            if len(row) >= 7 and row[6] is True:
-                continue  # 已取消
-
-            booking_id, wday, sid, rid, uid, purpose = row[:6]
-            time_str = self.time_map.get(sid, f"時段 {sid}")
+        # 時段對照表與固定預約在背景讀，讀完再回主執行緒畫清單
+        self.controller.io.submit(self._fetch_fixed, user_id,
+                                  on_done=lambda data: self._show_fixed(user_id, data),
+                                  key="fixed_cancel_search")
+
+    def _fetch_fixed(self, user_id):
+        # 背景執行緒：只讀資料，不碰畫面
+        # 尚未取消的固定預約（伺服器模式向伺服器要）
+        return self.load_time_slot_mapping(), self.controller.backend.load_user_fixed_bookings(user_id)
+
+    @tracing.traced(cat="render")
+    def _show_fixed(self, user_id, data):
+        time_map, fixed = data
+        for f in fixed:
+            booking_id, wday, sid, rid, purpose = f.booking_id, f.weekday, f.slot_id, f.room_id, f.purpose
+            time_str = time_map.get(sid, f"時段 {sid}")
             text = f"ID: {booking_id}｜{wday}｜會議室 {rid}｜{time_str}｜用途：{purpose}"
             var = tk.BooleanVar()
             self.records.append((booking_id, wday, sid, rid, text))
@@ -2160,38 +1828,33 @@ class PageFixedCancelBooking(tk.Frame):
                                 bg="white", anchor="w", justify="left")
             cb.pack(anchor="w")
 
+    @tracing.ui_action
     def cancel_selected(self):
         selected_ids = [self.records[i][0] for i, var in enumerate(self.vars) if var.get()]
         if not selected_ids:
             messagebox.showwarning("提醒", "請勾選要取消的固定預約")
             return
 
-        try:
-            wb = load_workbook(FILENAME)
-            ws = wb["FixedBooking"]
-            updated = False
-
-            for row in ws.iter_rows(min_row=2):
-                if row[0].value in selected_ids:
-                    if len(row) < 7:
-                        ws.cell(row=row[0].row, column=7, value=True)
-                    else:
-                        row[6].value = True
-                    updated = True
-
-            if updated:
-                # 初學者註解：取消固定預約 → 安全存檔
-                if not safe_save(wb, FILENAME):
-                    messagebox.showerror("錯誤", "儲存 Excel 檔案失敗，請先關閉 Excel 或檢查檔案權限。")
-                    return
-                messagebox.showinfo("成功", "選取的固定預約已成功取消")
-                self.search()
-            else:
+        if self.controller.io.is_busy("cancel_fixed"):
+            return  # 上一次取消還在處理中，避免連點
+
+        def done(result):
+            if result is None:
                 messagebox.showinfo("提示", "找不到要取消的紀錄，可能已被取消")
+                return
+            if not result:
+                messagebox.showerror("錯誤", "儲存 Excel 檔案失敗，請先關閉 Excel 或檢查檔案權限。")
+                return
+            messagebox.showinfo("成功", "選取的固定預約已成功取消")
+            self.search()
 
-        except Exception as e:
+        def failed(e):
             messagebox.showerror("錯誤", f"取消時發生錯誤：\n{e}")
 
+        # 初學者註解：取消固定預約 → 在背景寫入日誌，完成後回到主執行緒顯示結果
+        self.controller.io.submit(self.controller.backend.cancel_fixed_bookings, selected_ids,
+                                  on_done=done, on_error=failed, key="cancel_fixed")
+
 
 
 
@@ -2206,104 +1869,6 @@ def get_booking_data():
     }
 
 
-# 清除 TempLock 中過期的鎖定資料
-def cleanup_expired_locks(filename=FILENAME):
-    wb = load_workbook(filename)
-
-    # ✅ 如果沒有 TempLock 工作表，就自動建立並跳過本次清除
-    if "TempLock" not in wb.sheetnames:
-        ws = wb.create_sheet("TempLock")
-        ws.append(["UserID", "Date", "SlotID", "RoomID", "Status", "Timestamp"])  # 加上欄位列
-        safe_save(wb, FILENAME)
-        print("TempLock 表不存在，自動建立完成，跳過本次清除")
-        return  # 跳出函式，避免處理空資料
-
-    # 若已存在就繼續正常清除過期鎖定
-    ws = wb["TempLock"]
-    now = datetime.now()
-    rows_to_keep = [ws[1]]  # 保留欄位列（標題）
-
-    for row in ws.iter_rows(min_row=2):
-        timestamp_str = row[5].value
-        try:
-            lock_time = datetime.strptime(timestamp_str, "%Y/%m/%d %H:%M:%S")
-            if (now - lock_time).total_seconds() < LOCK_EXPIRY_SECONDS:
-                rows_to_keep.append(row)
-        except:
-            pass  # 無效或壞資料就略過
-
-    # 清除後寫回有效資料
-    ws.delete_rows(2, ws.max_row)
-    for row in rows_to_keep[1:]:
-        ws.append([cell.value for cell in row])
-
-    safe_save(wb, filename)
-
-
-# 將暫時鎖定資料寫入 TempLock 表
-def lock_room(token, date, slot_ids, room_id, filename=FILENAME):
-    wb = load_workbook(filename)
-    ws = wb["TempLock"]
-
-    timestamp_str = datetime.now().strftime("%Y/%m/%d %H:%M:%S")
-
-    for slot_id in slot_ids:
-        ws.append([token, date, slot_id, room_id, "LOCKING", timestamp_str])
-    # 初學者註解：建立暫時鎖也用安全存檔，避免半寫入
-    if not safe_save(wb, filename):
-        messagebox.showerror("錯誤", "建立暫時鎖定失敗，請稍後再試。")
-        return
-
-# 釋放某使用者的所有鎖定資料
-def release_token_locks(token, filename=FILENAME):
-    wb = load_workbook(filename)
-    ws = wb["TempLock"]
-
-    rows_to_keep = [ws[1]]  # 保留欄位列（第1列標題）
-
-    for row in ws.iter_rows(min_row=2):
-        if row[0].value != token:
-            rows_to_keep.append(row)
-
-    # 清空後重建
-    ws.delete_rows(2, ws.max_row)
-    for row in rows_to_keep[1:]:
-        ws.append([cell.value for cell in row])
-
-    safe_save(wb, filename)
-
-# ✅ 啟動時初始化 Excel
-init_excel_file()
-def has_real_data():
-    """確認會議室與時段中至少有一筆不是『範例』的正式資料"""
-    try:
-        wb = load_workbook(FILENAME)
-
-        # 檢查 MeetingRooms 資料列是否非空且用途不是範例
-        ws_rooms = wb["MeetingRooms"]
-        real_rooms = [
-            row for row in ws_rooms.iter_rows(min_row=2, values_only=True)
-            if row and "範例" not in str(row[5])  # 用途欄
-        ]
-
-        # 檢查 TimeSlots 資料列是否非空且備註不是範例
-        ws_slots = wb["TimeSlots"]
-        real_slots = [
-            row for row in ws_slots.iter_rows(min_row=2, values_only=True)
-            if len(row) >= 4 and "範例" not in str(row[3])  # 備註欄
-        ]
-
-        return len(real_rooms) > 0 and len(real_slots) > 0
-
-    except Exception as e:
-        print(f"資料檢查錯誤：{e}")
-        return False
-
-
-# 執行主程式
-if is_excel_file_locked(FILENAME):
-    messagebox.showerror("檔案鎖定", "meeting_schedule.xlsx 正在被 Excel 或其他程式使用，請先關閉檔案再執行。")
-    exit()
 def show_large_error(title, message):
     root = tk.Tk()
     root.title(title)
@@ -2348,10 +1913,49 @@ def show_large_error(title, message):
     root.mainloop()
 
 
+# 執行主程式
 if __name__ == "__main__":
-    init_excel_file()
+    parser = argparse.ArgumentParser(description="會議室預約系統")
+    parser.add_argument("--serve", action="store_true", help="以本機預約伺服器模式啟動（不開畫面）")
+    parser.add_argument("--port", type=int, default=8765, help="伺服器埠號（--serve 用）")
+    parser.add_argument("--server", metavar="URL", help="連到預約伺服器，例如 http://127.0.0.1:8765")
+    parser.add_argument("--trace", metavar="FILE", help="把效能追蹤寫到 FILE（用 chrome://tracing 或 Perfetto 開啟）")
+    args = parser.parse_args()
+    if args.trace:
+        tracing.enable(args.trace)
+
+    if args.serve:
+        from booking_server import serve
+        serve(port=args.port)
+        sys.exit()
+
+    if args.server:
+        # 精簡用戶端：預約、取消、暫時鎖定、總覽都交給伺服器，這台不寫 Excel
+        from booking_client import BookingClient, BookingServerError
+        client = BookingClient(args.server)
+        try:
+            client.health()
+        except BookingServerError as e:
+            messagebox.showerror("無法連線", str(e))
+            sys.exit(1)
+        app = MeetingApp(client)
+        app.mainloop()
+        sys.exit()
+
+    # 資料檔由 BOOKING_STORE 決定（預設 meeting_schedule.xlsx）；SQLite 不會被 Excel 鎖住
+    if not is_sqlite_path(DEFAULT_STORE) and is_excel_file_locked(DEFAULT_STORE):
+        messagebox.showerror("檔案鎖定", f"{DEFAULT_STORE} 正在被 Excel 或其他程式使用，請先關閉檔案再執行。")
+        exit()
+
+    # ✅ 啟動時初始化資料檔（Excel 會建立缺少的工作表）
+    booking_core.prepare()
 
-    if not has_real_data():
+    try:
+        real_data = booking_core.has_real_data()
+    except Exception as e:
+        print(f"資料檢查錯誤：{e}")
+        real_data = False
+    if not real_data:
         show_large_error(
             "尚未設定正式資料",
             "系統偵測到目前 Excel 檔案內仍是範例資料，請依以下說明操作後再重新啟動：\n\n"